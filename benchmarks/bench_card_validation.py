@@ -0,0 +1,86 @@
+"""Benchmark CardValidator.check against the former per-length loop.
+
+Synthetic card numbers are checked by CardValidator, and the former
+DataCleaning length check (one regex and isin pass per length in
+parameters/number_lengths.yaml, then an isin over the list of valid
+numbers) is timed on the same numbers. The rows it kept must be exactly
+those CardValidator finds with a valid length, i.e. "valid" or "luhn".
+
+Usage:
+    python -m benchmarks.bench_card_validation --rows 10000000
+    python -m benchmarks.bench_card_validation --rows 1000000 --skip-legacy
+"""
+import argparse
+import time
+import tracemalloc
+
+import pandas as pd
+import yaml
+
+from benchmarks.synthetic_data import SyntheticData
+from card_validation import CardValidator
+
+
+def card_numbers(rows, seed, block_rows=1000000):
+    """Return synthetic card numbers and providers, generated in blocks."""
+    blocks = []
+    for block, start in enumerate(range(0, rows, block_rows)):
+        card_data = SyntheticData(seed=seed + block).card_data(min(block_rows, rows - start))
+        card_data = card_data.dropna()
+        card_data = card_data.assign(card_number=card_data.card_number.str.strip("? "))
+        blocks.append(card_data[["card_number", "card_provider"]])
+    return(pd.concat(blocks, ignore_index=True))
+
+
+def legacy_length_check(card_data):
+    """Return the rows kept by the former DataCleaning length check."""
+    with open("parameters/number_lengths.yaml", "r") as file:
+        number_lengths = dict(yaml.safe_load(file))
+    valid_numbers = []
+    for card_length in number_lengths.keys():
+        provider_mask = card_data.card_provider.isin(number_lengths[card_length])
+        correct_length_mask = card_data.card_number.str.match(f"^\\d{card_length}$")
+        valid_numbers.extend(card_data.card_number[provider_mask & correct_length_mask])
+    return(card_data[card_data.card_number.isin(valid_numbers)])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=10000000,
+                        help="Card numbers generated.")
+    parser.add_argument("--block-rows", type=int, default=1000000,
+                        help="Rows CardValidator checks at a time.")
+    parser.add_argument("--skip-legacy", action="store_true",
+                        help="Only time CardValidator.")
+    parser.add_argument("--seed", type=int, default=0,
+                        help="Seed for the synthetic card data.")
+    args = parser.parse_args()
+
+    card_data = card_numbers(args.rows, args.seed)
+    validator = CardValidator(block_rows=args.block_rows)
+    start = time.perf_counter()
+    checks = validator.check(card_data.card_number, card_data.card_provider)
+    seconds = time.perf_counter() - start
+    # Peak memory is measured on a second run, as tracing slows the first:
+    tracemalloc.start()
+    validator.check(card_data.card_number, card_data.card_provider)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"CardValidator  {len(card_data):>11,} cards  {seconds:8.2f}s  "
+          f"peak {peak / 2**20:.0f} MiB")
+    print(checks.value_counts().to_string())
+
+    if args.skip_legacy:
+        return
+    start = time.perf_counter()
+    kept = legacy_length_check(card_data)
+    legacy_seconds = time.perf_counter() - start
+    print(f"legacy check   {len(card_data):>11,} cards  {legacy_seconds:8.2f}s  "
+          f"({legacy_seconds / seconds:.1f}x slower)")
+    length_valid = checks.isin(["valid", "luhn"])
+    assert kept.index.equals(card_data.index[length_valid.to_numpy(bool)])
+    print("Legacy and CardValidator length checks agree.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,182 @@
+"""Benchmark the DataCleaning public methods on synthetic data.
+
+Each cleaning method is timed on freshly generated frames of each
+requested size, then run once more under tracemalloc to record its peak
+memory. Results are appended to a JSON file of runs, and each result is
+compared with the same method and size in the previous run so
+regressions show up between runs.
+
+Usage:
+    python -m benchmarks.bench_cleaning --rows 10000 100000 1000000
+    python -m benchmarks.bench_cleaning --methods clean_card_data --repeat 5
+    python -m benchmarks.bench_cleaning --rows 1000000 --workers 1 4 16
+"""
+from datetime import datetime, timezone
+import argparse
+import json
+import os
+import platform
+import time
+import tracemalloc
+import warnings
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.synthetic_data import SyntheticData
+from data_cleaning import DataCleaning
+from partitioned_cleaning import PartitionedCleaning
+
+
+# The SyntheticData method generating the input of each cleaning method:
+GENERATORS = {"clean_user_data": "user_data",
+              "clean_card_data": "card_data",
+              "clean_store_data": "store_data",
+              "clean_product_data": "product_data",
+              "clean_order_data": "order_data",
+              "clean_events_data": "events_data"}
+DEFAULT_OUTPUT = "benchmarks/results/cleaning.json"
+
+
+def time_method(method, data_factory, repeat):
+    """Return the best wall time in seconds of 'repeat' calls of 'method'.
+
+    A fresh input frame is built before every call, outside the timing,
+    because the cleaning methods modify their input.
+    """
+    best = float("inf")
+    for _ in range(repeat):
+        data = data_factory()
+        start = time.perf_counter()
+        method(data)
+        best = min(best, time.perf_counter() - start)
+    return(best)
+
+
+def peak_memory(method, data_factory):
+    """Return the peak bytes allocated by one call of 'method'."""
+    data = data_factory()
+    tracemalloc.start()
+    try:
+        method(data)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return(peak)
+
+
+def run_benchmarks(methods, row_counts, repeat, seed, worker_counts=(1,)):
+    """Return a list of result dictionaries, one per method, row count and
+    worker count.
+
+    With more than one worker the methods run partitioned over a process
+    pool. Peak memory is then that of the parent process only.
+    """
+    generator = SyntheticData(seed=seed)
+    results = []
+    for rows in row_counts:
+        for workers in worker_counts:
+            cleaner = (DataCleaning() if workers == 1
+                       else PartitionedCleaning(max_workers=workers, min_rows=0))
+            for name in methods:
+                method = getattr(cleaner, name)
+                make_data = getattr(generator, GENERATORS[name])
+                data_factory = lambda: make_data(rows)
+                result = {"method": name, "rows": rows, "workers": workers}
+                try:
+                    with warnings.catch_warnings():
+                        warnings.simplefilter("ignore")
+                        seconds = time_method(method, data_factory, repeat)
+                        result["wall_seconds"] = seconds
+                        result["rows_per_second"] = rows / seconds if seconds else None
+                        result["peak_memory_bytes"] = peak_memory(method, data_factory)
+                except Exception as error:
+                    # Record failures so one broken cleaner does not hide 
+                    # the results of the others:
+                    result["error"] = f"{type(error).__name__}: {error}"
+                results.append(result)
+                print(format_result(result))
+            if workers != 1:
+                cleaner.close()
+    return(results)
+
+
+def format_result(result):
+    """Return a one-line summary of a result dictionary."""
+    label = (f"{result['method']:<20} {result['rows']:>10,} rows "
+             f"{result.get('workers', 1):>3} workers")
+    if "error" in result:
+        return(f"{label}  FAILED {result['error']}")
+    return(f"{label}  {result['wall_seconds']:9.3f}s  "
+           f"{result['rows_per_second']:>12,.0f} rows/s  "
+           f"{result['peak_memory_bytes'] / 2**20:9.1f} MiB peak")
+
+
+def compare_runs(previous, current, tolerance):
+    """Print results slower than the previous run by more than 'tolerance'."""
+    earlier = {(result["method"], result["rows"], result.get("workers", 1)): result
+               for result in previous["results"] if "error" not in result}
+    regressions = 0
+    for result in current["results"]:
+        before = earlier.get((result["method"], result["rows"], result["workers"]))
+        if before is None or "error" in result:
+            continue
+        ratio = result["wall_seconds"] / before["wall_seconds"]
+        if ratio > 1 + tolerance:
+            regressions += 1
+            print(f"REGRESSION {result['method']} at {result['rows']:,} rows "
+                  f"and {result['workers']} workers: "
+                  f"{ratio:.2f}x the time of the run at {previous['started']}")
+    return(regressions)
+
+
+def save_run(run, output_path):
+    """Append a run to the JSON results file and return the previous run."""
+    runs = []
+    if os.path.exists(output_path):
+        with open(output_path, "r") as file:
+            runs = json.load(file)
+    previous = runs[-1] if runs else None
+    runs.append(run)
+    os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+    with open(output_path, "w") as file:
+        json.dump(runs, file, indent=2)
+    return(previous)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, nargs="+", default=[10**4, 10**5],
+                        help="Row counts to benchmark (10^4 to 10^7).")
+    parser.add_argument("--methods", nargs="+", default=list(GENERATORS),
+                        choices=list(GENERATORS), help="Cleaning methods to run.")
+    parser.add_argument("--repeat", type=int, default=3,
+                        help="Timed calls per method; the best is kept.")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1],
+                        help="Worker counts to benchmark; more than one runs "
+                             "the methods partitioned over a process pool.")
+    parser.add_argument("--seed", type=int, default=0,
+                        help="Seed for the synthetic data generators.")
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="Slowdown versus the previous run reported as "
+                             "a regression.")
+    parser.add_argument("--output", default=DEFAULT_OUTPUT,
+                        help="JSON file the run is appended to.")
+    args = parser.parse_args()
+
+    run = {"started": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+           "python": platform.python_version(),
+           "pandas": pd.__version__,
+           "numpy": np.__version__,
+           "seed": args.seed,
+           "repeat": args.repeat,
+           "results": run_benchmarks(args.methods, args.rows, args.repeat,
+                                     args.seed, args.workers)}
+    previous = save_run(run, args.output)
+    if previous is not None:
+        compare_runs(previous, run, args.tolerance)
+    print(f"Results saved to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
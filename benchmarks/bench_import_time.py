@@ -0,0 +1,78 @@
+"""Benchmark the cold-start import time of the pipeline modules.
+
+Each module is imported in a fresh interpreter, several times, and the
+median wall time is reported with the heavy libraries (boto3, requests,
+sqlalchemy, tabula and pypdf) that the import loaded. "db_main as worker"
+runs db_main the way spawned worker processes run the main module, under
+the name "__mp_main__". Cleaning-only imports must not load any heavy
+library, and the benchmark fails if they do or, with --max-seconds, if
+they are slower than that.
+
+Usage:
+    python -m benchmarks.bench_import_time --repeat 5
+    python -m benchmarks.bench_import_time --max-seconds 1.5
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+# Libraries only the extraction and loading methods need:
+HEAVY_MODULES = ["boto3", "requests", "sqlalchemy", "tabula", "pypdf"]
+# Statements timed, by label. Those of cleaning-only workers come first:
+IMPORTS = {"data_cleaning": "import data_cleaning",
+           "partitioned_cleaning": "import partitioned_cleaning",
+           "data_extraction": "import data_extraction",
+           "database_utils": "import database_utils",
+           "db_main": "import db_main",
+           "db_main as worker": "import runpy; runpy.run_path('db_main.py', "
+                                "run_name='__mp_main__')"}
+CLEANING_ONLY = ["data_cleaning", "partitioned_cleaning", "db_main as worker"]
+# Run in the fresh interpreter: time the statement and report the heavy
+# libraries loaded:
+TIMER = """import sys, time, json
+start = time.perf_counter()
+{statement}
+seconds = time.perf_counter() - start
+print(json.dumps([seconds, [name for name in {heavy!r} if name in sys.modules]]))
+"""
+
+
+def time_import(statement, root):
+    """Return the seconds and heavy libraries of one import in a new process."""
+    code = TIMER.format(statement=statement, heavy=HEAVY_MODULES)
+    output = subprocess.run([sys.executable, "-W", "ignore", "-c", code], cwd=root,
+                            capture_output=True, text=True, check=True).stdout
+    seconds, loaded = json.loads(output.strip().splitlines()[-1])
+    return(seconds, loaded)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5,
+                        help="Fresh interpreters per import.")
+    parser.add_argument("--max-seconds", type=float, default=None,
+                        help="Fail if a cleaning-only import is slower.")
+    args = parser.parse_args()
+
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    failures = []
+    for label, statement in IMPORTS.items():
+        runs = [time_import(statement, root) for _ in range(args.repeat)]
+        seconds = statistics.median(run[0] for run in runs)
+        loaded = runs[0][1]
+        print(f"{label:<22} {seconds:6.3f}s  heavy: {', '.join(loaded) or '-'}")
+        if label in CLEANING_ONLY:
+            if loaded:
+                failures.append(f"{label} loaded {loaded}")
+            if args.max_seconds is not None and seconds > args.max_seconds:
+                failures.append(f"{label} took {seconds:.3f}s")
+    if failures:
+        sys.exit("Cleaning-only imports are too heavy: " + "; ".join(failures))
+    print("Cleaning-only imports load no heavy libraries.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""Benchmark serial and parallel DataExtractor.retrieve_pdf_data.
+
+A multi-page card details pdf is generated locally from synthetic card
+data, read once serially and once in parallel page ranges, and the two
+frames are checked to be identical. Requires reportlab to write the pdf
+and java for tabula.
+
+Usage:
+    python -m benchmarks.bench_pdf_extraction --pages 40 --pages-per-task 5
+"""
+import argparse
+import os
+import tempfile
+import time
+
+import pandas as pd
+from sqlalchemy import create_engine
+
+from benchmarks.synthetic_data import SyntheticData
+from data_extraction import DataExtractor
+
+
+def write_card_pdf(pdf_path, pages, rows_per_page, seed):
+    """Write a pdf with one table of synthetic card data on each page."""
+    from reportlab.lib.pagesizes import A4
+    from reportlab.platypus import PageBreak, SimpleDocTemplate, Table
+
+    card_data = SyntheticData(seed=seed, dirty_fraction=0).card_data(pages * rows_per_page)
+    card_data = card_data.astype(str)
+    story = []
+    for first in range(0, len(card_data), rows_per_page):
+        page = card_data.iloc[first:first + rows_per_page]
+        story += [Table([list(page.columns)] + page.values.tolist()), PageBreak()]
+    SimpleDocTemplate(pdf_path, pagesize=A4).build(story)
+
+
+def time_extraction(extractor, pdf_path, **kwargs):
+    """Return the extracted frame and wall seconds of one extraction."""
+    start = time.perf_counter()
+    data = extractor.retrieve_pdf_data(pdf_path, **kwargs)
+    return(data, time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--pages", type=int, default=24,
+                        help="Pages of the generated pdf.")
+    parser.add_argument("--rows-per-page", type=int, default=40,
+                        help="Card rows in the table on each page.")
+    parser.add_argument("--pages-per-task", type=int, default=4,
+                        help="Pages read by each worker task.")
+    parser.add_argument("--max-workers", type=int, default=None,
+                        help="Worker processes. Default one per CPU.")
+    parser.add_argument("--subprocess-jvm", action="store_true",
+                        help="Start a java subprocess per call instead of "
+                             "a persistent JVM per process.")
+    parser.add_argument("--seed", type=int, default=0,
+                        help="Seed for the synthetic card data.")
+    args = parser.parse_args()
+
+    # Only the pdf extraction is used, so any engine will do:
+    extractor = DataExtractor(create_engine("sqlite://"))
+    persistent_jvm = not args.subprocess_jvm
+    with tempfile.TemporaryDirectory() as directory:
+        pdf_path = os.path.join(directory, "card_details.pdf")
+        write_card_pdf(pdf_path, args.pages, args.rows_per_page, args.seed)
+        serial, serial_seconds = time_extraction(
+            extractor, pdf_path, persistent_jvm=persistent_jvm)
+        parallel, parallel_seconds = time_extraction(
+            extractor, pdf_path, parallel=True,
+            pages_per_task=args.pages_per_task,
+            max_workers=args.max_workers, persistent_jvm=persistent_jvm)
+        # The second parallel call reuses the worker processes and JVMs:
+        warm, warm_seconds = time_extraction(
+            extractor, pdf_path, parallel=True,
+            pages_per_task=args.pages_per_task,
+            max_workers=args.max_workers, persistent_jvm=persistent_jvm)
+    extractor.close()
+
+    print(f"serial    {len(serial):>8,} rows  {serial_seconds:8.2f}s")
+    print(f"parallel  {len(parallel):>8,} rows  {parallel_seconds:8.2f}s  "
+          f"({serial_seconds / parallel_seconds:.2f}x)")
+    print(f"warm      {len(warm):>8,} rows  {warm_seconds:8.2f}s  "
+          f"({serial_seconds / warm_seconds:.2f}x)")
+    pd.testing.assert_frame_equal(serial, parallel)
+    pd.testing.assert_frame_equal(serial, warm)
+    print("Serial and parallel extractions are identical.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,255 @@
+import numpy as np
+import pandas as pd
+
+
+MONTH_NAMES = np.array(["January", "February", "March", "April", "May", "June",
+                        "July", "August", "September", "October", "November",
+                        "December"])
+# Card number length and leading digit of each provider:
+CARD_PROVIDERS = {"VISA 16 digit": (16, 4), "JCB 16 digit": (16, 3), 
+                  "VISA 13 digit": (13, 4), "JCB 15 digit": (15, 3),
+                  "VISA 19 digit": (19, 4), "Diners Club / Carte Blanche": (14, 3),
+                  "American Express": (15, 3), "Maestro": (12, 6),
+                  "Discover": (16, 6), "Mastercard": (16, 5)}
+COUNTRIES = {"GB": ("United Kingdom", "Europe"), "DE": ("Germany", "Europe"),
+             "US": ("United States", "America")}
+STORE_TYPES = np.array(["Local", "Super Store", "Mall Kiosk", "Outlet"])
+CATEGORIES = np.array(["toys-and-games", "sports-and-leisure", "pets", "homeware",
+                       "health-and-beauty", "food-and-drink", "diy"])
+PRODUCT_NAMES = np.array(["Aspen Cushion - Sage", "Antler Tealight Holder",
+                          "Spaceways 2 Tier Garment Rail", "Cosatto Cosy Dolls Pram",
+                          "Russell Hobbs Kettle", "Breville 2 Slice Toaster",
+                          "FurReal Dazzlin' Dimples My Playful Dolphin"])
+TIME_PERIODS = np.array(["Morning", "Midday", "Evening", "Late_Hours"])
+
+
+class SyntheticData:
+    """Contains methods generating seeded, dirty copies of the source data.
+
+    Each method returns a dataframe shaped like the raw output of the 
+    DataExtractor method for that source (see archive_data/*.csv), 
+    including its dirty cases: null rows, corrupted rows of random 
+    10-character codes, mixed date formats, '?'-prefixed card numbers,
+    'eeEurope' continents, '3 x 100g' weights and single-digit date parts.
+    Generation is vectorised so frames of 10^7 rows can be built.
+
+    Public Methods:
+     - user_data(rows)
+     - card_data(rows)
+     - store_data(rows)
+     - product_data(rows)
+     - order_data(rows)
+     - events_data(rows)
+
+    Instance Variables:
+     - seed (int): Seed for the random generator. The same seed and row
+       count always give the same frame.
+     - dirty_fraction (float): Fraction of rows given each dirty case.
+
+    Attributes:
+     - As instance variables.
+    """
+
+    def __init__(self, seed=0, dirty_fraction=0.01):
+        """Initialise the SyntheticData instance.
+
+        Keyword Arguments:
+         - seed (int): See class docstring. Default 0.
+         - dirty_fraction (float): See class docstring. Default 0.01.
+        """
+        self.seed = seed
+        self.dirty_fraction = dirty_fraction
+
+    def __rng(self, name):
+        """Return a random generator seeded per source."""
+        return(np.random.default_rng([self.seed, sum(map(ord, name))]))
+
+    def __pick(self, rng, values, rows):
+        """Return an object array of 'rows' values drawn from 'values'."""
+        return(np.asarray(values, dtype=object)[rng.integers(0, len(values), rows)])
+
+    def __codes(self, rng, rows, length=10):
+        """Return an array of random upper case alphanumeric codes."""
+        alphabet = np.frombuffer(b"ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789", np.uint8)
+        chars = alphabet[rng.integers(0, len(alphabet), (rows, length))]
+        return(chars.view(f"S{length}").ravel().astype(str).astype(object))
+
+    def __uuids(self, rng, rows):
+        """Return an array of random version-4-shaped uuid strings."""
+        hex_digits = np.frombuffer(rng.bytes(16 * rows).hex().encode(), np.uint8)
+        uuids = np.full((rows, 36), ord("-"), np.uint8)
+        hex_columns = [i for i in range(36) if i not in (8, 13, 18, 23)]
+        uuids[:, hex_columns] = hex_digits.reshape(rows, 32)
+        return(uuids.view("S36").ravel().astype(str).astype(object))
+
+    def __dates(self, rng, rows, start="1940-01-01", end="2022-12-31"):
+        """Return ISO date strings, some in the other formats of the sources."""
+        first, last = np.datetime64(start), np.datetime64(end)
+        days = rng.integers(0, (last - first).astype(int), rows)
+        dates = first + days.astype("timedelta64[D]")
+        strings = np.datetime_as_string(dates, unit="D").astype(object)
+        # Rewrite a fraction of dates as 'YYYY/MM/DD', 'Month YYYY DD'
+        # and 'YYYY Month DD':
+        layout = np.digitize(rng.random(rows), 
+                             [self.dirty_fraction * step for step in (1, 2, 3)])
+        for rows_to_change in map(np.flatnonzero, (layout == 0, layout == 1, layout == 2)):
+            if len(rows_to_change) == 0:
+                continue
+            parts = pd.Series(strings[rows_to_change]).str.split("-", expand=True)
+            month = MONTH_NAMES[parts[1].astype(int).to_numpy() - 1]
+            if layout[rows_to_change[0]] == 0:
+                changed = parts[0] + "/" + parts[1] + "/" + parts[2]
+            elif layout[rows_to_change[0]] == 1:
+                changed = month + " " + parts[0] + " " + parts[2]
+            else:
+                changed = parts[0] + " " + month + " " + parts[2]
+            strings[rows_to_change] = changed.to_numpy(object)
+        return(strings)
+
+    def __dirty_rows(self, rng, frame, columns):
+        """Null some rows and fill others with random codes, in place."""
+        rows = len(frame)
+        null_rows = np.flatnonzero(rng.random(rows) < self.dirty_fraction)
+        corrupt_rows = np.flatnonzero(rng.random(rows) < self.dirty_fraction)
+        for name in columns:
+            position = frame.columns.get_loc(name)
+            values = frame[name].to_numpy(object, copy=True)
+            values[null_rows] = None
+            values[corrupt_rows] = self.__codes(rng, len(corrupt_rows))
+            frame.isetitem(position, values)
+        return(frame)
+
+    def user_data(self, rows):
+        """Return raw user data as extracted from the 'legacy_users' table."""
+        rng = self.__rng("users")
+        country_codes = rng.integers(0, len(COUNTRIES), rows)
+        country_code = np.array(list(COUNTRIES), dtype=object)[country_codes]
+        country = np.array([country for country, _ in COUNTRIES.values()],
+                           dtype=object)[country_codes]
+        country_code[rng.random(rows) < self.dirty_fraction] = "GGB"
+        user_data = pd.DataFrame({
+            "index": np.arange(rows),
+            "first_name": self.__pick(rng, ["Sigfried", "Lydia", "Laura", "Kim"], rows),
+            "last_name": self.__pick(rng, ["Noack", "Goodwin", "Wall", "Koch II"], rows),
+            "date_of_birth": self.__dates(rng, rows, "1940-01-01", "2006-12-31"),
+            "company": self.__pick(rng, ["Butler PLC", "Bachmann KG"], rows),
+            "email_address": self.__pick(rng, ["susan73@booth.info", 
+                                               "kbolander@tschentscher.com"], rows),
+            "address": self.__pick(rng, ["Flat 96\nHolt path\nLake Justin\nSY3X 7ZY",
+                                         "Kostolzinplatz 815\n26972 Uelzen"], rows),
+            "country": country,
+            "country_code": country_code,
+            "phone_number": self.__pick(rng, ["+441414960141", "(09724) 715332"], rows),
+            "join_date": self.__dates(rng, rows, "1992-01-01", "2022-12-31"),
+            "user_uuid": self.__uuids(rng, rows)})
+        return(self.__dirty_rows(rng, user_data, user_data.columns[1:]))
+
+    def card_data(self, rows):
+        """Return raw card data as extracted from the card details pdf."""
+        rng = self.__rng("cards")
+        providers = np.array(list(CARD_PROVIDERS), dtype=object)
+        provider_codes = rng.integers(0, len(providers), rows)
+        lengths, leading_digits = np.array(list(CARD_PROVIDERS.values()))[provider_codes].T
+        # Each provider's leading digit followed by random digits:
+        scale = 10 ** (lengths - 1).astype(np.int64)
+        numbers = leading_digits * scale + rng.integers(0, scale)
+        card_number = numbers.astype(str).astype(object)
+        prefixed = np.flatnonzero(rng.random(rows) < self.dirty_fraction)
+        card_number[prefixed] = "?" + card_number[prefixed]
+        expiry = (pd.Series(rng.integers(1, 13, rows)).astype(str).str.zfill(2) + "/"
+                  + pd.Series(rng.integers(22, 32, rows)).astype(str))
+        card_data = pd.DataFrame({
+            "card_number": card_number,
+            "expiry_date": expiry.to_numpy(object),
+            "card_provider": providers[provider_codes],
+            "date_payment_confirmed": self.__dates(rng, rows, "1990-01-01", 
+                                                   "2022-12-31")})
+        return(self.__dirty_rows(rng, card_data, card_data.columns))
+
+    def store_data(self, rows):
+        """Return raw store data as retrieved from the store details API."""
+        rng = self.__rng("stores")
+        country_codes = rng.integers(0, len(COUNTRIES), rows)
+        country_code = np.array(list(COUNTRIES), dtype=object)[country_codes]
+        continent = np.array([continent for _, continent in COUNTRIES.values()],
+                             dtype=object)[country_codes]
+        typos = np.flatnonzero(rng.random(rows) < self.dirty_fraction)
+        continent[typos] = "ee" + continent[typos]
+        staff_numbers = rng.integers(5, 150, rows).astype(str).astype(object)
+        typos = np.flatnonzero(rng.random(rows) < self.dirty_fraction)
+        staff_numbers[typos] = "J" + staff_numbers[typos]
+        store_data = pd.DataFrame({
+            "index": np.arange(rows),
+            "address": self.__pick(rng, ["1 Moore shore\nSmithmouth\nBT6 6LR, Chapletown",
+                                         "Cosimo-Rose-Ring 1/5\n86826 Dieburg"], rows),
+            "longitude": rng.uniform(-10, 15, rows).round(5).astype(str).astype(object),
+            "lat": None,
+            "locality": self.__pick(rng, ["Chapletown", "Trossingen", "High Wycombe"], rows),
+            "store_code": self.__codes(rng, rows, 11),
+            "staff_numbers": staff_numbers,
+            "opening_date": self.__dates(rng, rows, "1990-01-01", "2022-12-31"),
+            "store_type": self.__pick(rng, STORE_TYPES, rows),
+            "latitude": rng.uniform(30, 60, rows).round(5).astype(str).astype(object),
+            "country_code": country_code,
+            "continent": continent})
+        store_data = self.__dirty_rows(rng, store_data, store_data.columns[1:])
+        return(store_data.set_index("index"))
+
+    def product_data(self, rows):
+        """Return raw product data as extracted from the products csv."""
+        rng = self.__rng("products")
+        amounts = rng.integers(1, 1000, rows).astype(str).astype(object)
+        weight = np.select([rng.random(rows) < 0.4, rng.random(rows) < 0.5,
+                            rng.random(rows) < 0.5, rng.random(rows) < 0.5],
+                           [amounts + "g", "0." + amounts + "kg", 
+                            amounts + "ml", amounts + "oz"],
+                           default=rng.integers(1, 20, rows).astype(str) + " x "
+                                   + amounts + "g")
+        weight = weight.astype(object)
+        typos = np.flatnonzero(rng.random(rows) < self.dirty_fraction)
+        weight[typos] = weight[typos] + " ."
+        product_data = pd.DataFrame({
+            "product_name": self.__pick(rng, PRODUCT_NAMES, rows),
+            "product_price": ("£" + pd.Series(rng.uniform(1, 500, rows).round(2))
+                              .map("{:.2f}".format)).to_numpy(object),
+            "weight": weight,
+            "category": self.__pick(rng, CATEGORIES, rows),
+            "EAN": rng.integers(10**11, 10**13, rows).astype(str).astype(object),
+            "date_added": self.__dates(rng, rows, "1990-01-01", "2022-12-31"),
+            "uuid": self.__uuids(rng, rows),
+            "removed": self.__pick(rng, ["Still_avaliable"] * 19 + ["Removed"], rows),
+            "product_code": self.__codes(rng, rows, 11)})
+        return(self.__dirty_rows(rng, product_data, product_data.columns))
+
+    def order_data(self, rows):
+        """Return raw order data as extracted from the 'orders_table' table."""
+        rng = self.__rng("orders")
+        order_data = pd.DataFrame({
+            "level_0": np.arange(rows),
+            "index": np.arange(rows),
+            "date_uuid": self.__uuids(rng, rows),
+            "first_name": None,
+            "last_name": None,
+            "user_uuid": self.__uuids(rng, rows),
+            "card_number": rng.integers(10**11, 10**16, rows),
+            "store_code": self.__codes(rng, rows, 11),
+            "product_code": self.__codes(rng, rows, 11),
+            "1": None,
+            "product_quantity": rng.integers(1, 14, rows)})
+        return(order_data)
+
+    def events_data(self, rows):
+        """Return raw sales events as extracted from the date details json."""
+        rng = self.__rng("events")
+        seconds = rng.integers(0, 86400, rows)
+        timestamp = (pd.Series(seconds // 3600).astype(str).str.zfill(2) + ":"
+                     + pd.Series(seconds // 60 % 60).astype(str).str.zfill(2) + ":"
+                     + pd.Series(seconds % 60).astype(str).str.zfill(2))
+        events_data = pd.DataFrame({
+            "timestamp": timestamp.to_numpy(object),
+            "month": rng.integers(1, 13, rows).astype(str).astype(object),
+            "year": rng.integers(1992, 2023, rows).astype(str).astype(object),
+            "day": rng.integers(1, 29, rows).astype(str).astype(object),
+            "time_period": self.__pick(rng, TIME_PERIODS, rows),
+            "date_uuid": self.__uuids(rng, rows)})
+        return(self.__dirty_rows(rng, events_data, events_data.columns))
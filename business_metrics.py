@@ -0,0 +1,285 @@
+import time
+import pandas as pd
+
+
+# Summary tables of the star schema, with the columns they are grouped
+# by and the query aggregating them. "{orders}" is the table of orders
+# aggregated: orders_table when a summary is built, or a staging table of
+# new orders when it is refreshed incrementally. Orders are only counted
+# if their date, store and product are in the dimension tables.
+SUMMARY_TABLES = {
+    "agg_store_counts": {
+        "group_by": ["country_code", "locality", "store_type"],
+        "incremental": False,
+        "sql": """
+            SELECT country_code, locality, store_type,
+                   COUNT(*) AS total_no_stores,
+                   SUM(staff_numbers) AS total_staff_numbers
+            FROM dim_store_details
+            GROUP BY country_code, locality, store_type"""},
+    "agg_sales": {
+        "group_by": ["year", "month", "store_type", "country_code"],
+        "incremental": True,
+        "sql": """
+            SELECT CAST(date_part('year', datetimes.datetime) AS INTEGER) AS "year",
+                   CAST(date_part('month', datetimes.datetime) AS INTEGER) AS "month",
+                   stores.store_type, stores.country_code,
+                   COUNT(orders.date_uuid) AS number_of_sales,
+                   SUM(orders.product_quantity) AS product_quantity,
+                   SUM(orders.product_quantity * products.product_price) AS total_sales
+            FROM "{orders}" AS orders
+            JOIN dim_datetimes AS datetimes ON orders.date_uuid = datetimes.date_uuid
+            JOIN dim_store_details AS stores ON orders.store_code = stores.store_code
+            JOIN dim_products AS products ON orders.product_code = products.product_code
+            GROUP BY 1, 2, 3, 4"""},
+    # The mean gap from each sale to the next, over the sales of a year,
+    # is the time from its first sale to the first sale of the next year
+    # divided by its number of sales, so only these are kept per year:
+    "agg_sale_intervals": {
+        "group_by": ["year"],
+        "incremental": False,
+        "sql": """
+            SELECT CAST(date_part('year', datetime) AS INTEGER) AS "year",
+                   COUNT(*) AS number_of_sales,
+                   MIN(CAST(datetime AS TIMESTAMP)) AS first_datetime,
+                   MAX(CAST(datetime AS TIMESTAMP)) AS last_datetime
+            FROM dim_datetimes
+            WHERE datetime IS NOT NULL
+            GROUP BY 1"""},
+}
+# The business questions of SQL/info_queries.txt, answered from the
+# summary tables. Parameters are bound by name, e.g. :country_code:
+METRICS = {
+    "stores_by_country": """
+        SELECT country_code, CAST(SUM(total_no_stores) AS BIGINT) AS total_no_stores
+        FROM agg_store_counts
+        GROUP BY country_code
+        ORDER BY total_no_stores DESC""",
+    "stores_by_locality": """
+        SELECT locality, CAST(SUM(total_no_stores) AS BIGINT) AS total_no_stores
+        FROM agg_store_counts
+        GROUP BY locality
+        ORDER BY total_no_stores DESC""",
+    "sales_by_month": """
+        SELECT ROUND(CAST(SUM(total_sales) AS NUMERIC), 2) AS total_cost_of_orders,
+               "month"
+        FROM agg_sales
+        GROUP BY "month"
+        ORDER BY total_cost_of_orders DESC""",
+    "sales_by_location": """
+        SELECT CAST(SUM(number_of_sales) AS BIGINT) AS number_of_sales,
+               CAST(SUM(product_quantity) AS BIGINT) AS product_quantity_count,
+               CASE WHEN store_type = 'Web Portal' THEN 'Web' ELSE 'Offline' END
+                   AS "location"
+        FROM agg_sales
+        GROUP BY "location"
+        ORDER BY number_of_sales""",
+    "sales_by_store_type": """
+        SELECT store_type,
+               ROUND(CAST(SUM(total_sales) AS NUMERIC), 2) AS total_sales,
+               ROUND(CAST(SUM(total_sales) / SUM(SUM(total_sales)) OVER () * 100
+                          AS NUMERIC), 2) AS "percentage_total(%)"
+        FROM agg_sales
+        GROUP BY store_type
+        ORDER BY "percentage_total(%)" DESC""",
+    "sales_by_year_and_month": """
+        SELECT ROUND(CAST(SUM(total_sales) AS NUMERIC), 2) AS total_sales,
+               "year", "month"
+        FROM agg_sales
+        GROUP BY "year", "month"
+        ORDER BY total_sales DESC""",
+    "staff_headcount": """
+        SELECT CAST(SUM(total_staff_numbers) AS BIGINT) AS total_staff_numbers, country_code
+        FROM agg_store_counts
+        GROUP BY country_code
+        ORDER BY total_staff_numbers DESC""",
+    "sales_by_store_type_in_country": """
+        SELECT ROUND(CAST(SUM(total_sales) AS NUMERIC), 2) AS total_sales,
+               store_type, country_code
+        FROM agg_sales
+        WHERE country_code = :country_code
+        GROUP BY store_type, country_code
+        ORDER BY total_sales DESC""",
+    # The last sale of all has no next sale, so the last year has one gap
+    # fewer than sales:
+    "time_between_sales": """
+        WITH years AS (
+            SELECT "year", number_of_sales, first_datetime, last_datetime,
+                   LEAD(first_datetime) OVER (ORDER BY "year") AS next_datetime
+            FROM agg_sale_intervals
+        )
+        SELECT "year",
+               (COALESCE(next_datetime, last_datetime) - first_datetime)
+               / NULLIF(number_of_sales
+                        - CASE WHEN next_datetime IS NULL THEN 1 ELSE 0 END, 0)
+                   AS actual_time_taken
+        FROM years
+        ORDER BY actual_time_taken DESC""",
+}
+
+
+class BusinessMetrics:
+    """Contains methods for answering the business questions from summaries.
+
+    The questions of SQL/info_queries.txt are answered by the queries of
+    METRICS, which read the small summary tables of SUMMARY_TABLES rather
+    than scanning and joining orders_table, so their cost depends on the
+    number of groups (years, months, store types, countries) rather than
+    the number of orders.
+
+    'refresh' builds the summary tables after the star schema is loaded.
+    Given the orders just appended to orders_table, it instead adds those
+    orders to the incremental summaries: they are staged in a table and
+    aggregated by the same query, and each group is added to the row of
+    the same group, compared with IS NOT DISTINCT FROM so groups with a
+    NULL key (e.g. stores without a country code) are matched too, or
+    inserted if it is new. Summaries of the dimension tables alone are
+    always rebuilt, which only reads those tables. IncrementalLoader
+    refreshes the summaries this way after each load when given a
+    BusinessMetrics instance.
+
+    The orders are appended before the summaries are refreshed, in a
+    transaction of their own, so a refresh that fails would leave the
+    summaries short of those orders for good. Incremental refreshes are
+    therefore given the watermark of the orders before and after the
+    append, and save the latter under "metrics:<source>" in the same
+    transaction as the summaries. If the saved watermark is not the one
+    before the append, the summaries missed an earlier append and are
+    rebuilt from orders_table instead.
+
+    Public Methods:
+     - refresh(orders, watermark)
+     - metric(name, **params)
+
+    Instance Variables:
+     - connector (DatabaseConnector): Connector of the database holding
+       the star schema.
+
+    Attributes:
+     - staging_table (str): Table new orders are staged in.
+     - refresh_seconds (dict): Seconds taken to build or refresh each
+       summary table in the last refresh.
+    """
+
+    staging_table = "stg_metrics_orders"
+
+    def __init__(self, connector):
+        """Initialise the BusinessMetrics instance.
+
+        Arguments:
+         - connector (DatabaseConnector): See class docstring.
+        """
+        self.connector = connector
+        self.refresh_seconds = {}
+
+    def __build(self, connection, table_name, summary):
+        """Replace a summary table with one aggregated from orders_table."""
+        from sqlalchemy import text
+        query = summary["sql"].format(orders="orders_table")
+        connection.execute(text(f'DROP TABLE IF EXISTS "{table_name}"'))
+        connection.execute(text(f'CREATE TABLE "{table_name}" AS {query}'))
+
+    def __add_orders(self, connection, table_name, summary):
+        """Add the aggregates of the staged orders to a summary table."""
+        from sqlalchemy import text
+        query = summary["sql"].format(orders=self.staging_table)
+        added = f"{table_name}_added"
+        connection.execute(text(f'CREATE TEMP TABLE "{added}" ON COMMIT DROP AS {query}'))
+        value_columns = [name for name in connection.execute(text(
+            f'SELECT * FROM "{table_name}" LIMIT 0')).keys()
+                         if name not in summary["group_by"]]
+        # A unique index would never match NULL keys, so groups are
+        # matched with IS NOT DISTINCT FROM instead of ON CONFLICT:
+        same_group = " AND ".join(f'"{table_name}"."{name}" IS NOT DISTINCT FROM added."{name}"'
+                                  for name in summary["group_by"])
+        updates = ", ".join(f'"{name}" = "{table_name}"."{name}" + added."{name}"'
+                            for name in value_columns)
+        connection.execute(text(f'UPDATE "{table_name}" SET {updates} '
+                                f'FROM "{added}" AS added WHERE {same_group}'))
+        connection.execute(text(f'INSERT INTO "{table_name}" '
+                                f'SELECT * FROM "{added}" AS added '
+                                f'WHERE NOT EXISTS (SELECT 1 FROM "{table_name}" '
+                                f'WHERE {same_group})'))
+
+    def refresh(self, orders=None, watermark=None):
+        """Build the summary tables, or add newly appended orders to them.
+
+        Arguments:
+         - None.
+
+        Keyword Arguments:
+         - orders (DataFrame): Orders just appended to orders_table, in
+           its format. Default None builds every summary from the tables.
+           Incremental summaries that do not exist yet are built, which
+           already includes these orders. An empty frame, e.g. after
+           loading new events but no orders, only rebuilds the summaries
+           of the dimension tables.
+         - watermark (tuple): (source, previous, new) watermarks of the
+           orders source before and after 'orders' were appended. The
+           orders are only added if the summaries were last refreshed at
+           'previous'; otherwise every summary is rebuilt. Either way
+           'new' is saved with the summaries. Default None adds the
+           orders unchecked.
+
+        Returns:
+         - refresh_seconds (dict): Seconds taken by each summary table.
+        """
+        from sqlalchemy import inspect
+        existing = set(inspect(self.connector.engine).get_table_names())
+        if watermark is not None:
+            source, previous, new = watermark
+            refreshed = self.connector.read_watermark(f"metrics:{source}")
+            if previous is None or refreshed != str(previous):
+                print(f"Summaries were last refreshed at {source} watermark "
+                      f"{refreshed}, not {previous}; rebuilding them.")
+                orders = None
+        staged = False
+        if orders is not None and len(orders):
+            # The staging table has the column types of orders_table but
+            # none of its keys:
+            columns = self.connector.schemas.get("orders_table", {}).get("columns", {})
+            self.connector.upload_to_db(orders, self.staging_table, if_exists="replace",
+                                        schema={"columns": columns})
+            staged = True
+        self.refresh_seconds = {}
+        try:
+            # One transaction, so readers never see a partial refresh:
+            with self.connector.engine.begin() as connection:
+                for table_name, summary in SUMMARY_TABLES.items():
+                    start = time.perf_counter()
+                    if (orders is not None and summary["incremental"]
+                            and table_name in existing):
+                        if staged:
+                            self.__add_orders(connection, table_name, summary)
+                    else:
+                        self.__build(connection, table_name, summary)
+                    self.refresh_seconds[table_name] = time.perf_counter() - start
+                if watermark is not None:
+                    self.connector.write_watermark(f"metrics:{source}", new,
+                                                   connection=connection)
+        finally:
+            if staged:
+                from sqlalchemy import text
+                with self.connector.engine.begin() as connection:
+                    connection.execute(text(f'DROP TABLE IF EXISTS "{self.staging_table}"'))
+        return(self.refresh_seconds)
+
+    def metric(self, name, **params):
+        """Return the answer to one of the business questions.
+
+        Arguments:
+         - name (str): A key of METRICS, e.g. "sales_by_store_type".
+
+        Keyword Arguments:
+         - Values of the query's parameters, e.g. country_code="DE" for
+           "sales_by_store_type_in_country".
+
+        Returns:
+         - metric (DataFrame): The rows of the answer, ordered as the
+           question ranks them.
+        """
+        from sqlalchemy import text
+        if name not in METRICS:
+            raise ValueError(f"Unknown metric '{name}'.")
+        with self.connector.engine.connect() as connection:
+            return(pd.read_sql(text(METRICS[name]), connection, params=params))
@@ -0,0 +1,124 @@
+import numpy as np
+import pandas as pd
+
+from config_store import load_config
+
+
+# Result of each check, in the order they are applied. A row gets the
+# first check it fails, or "valid":
+CARD_CHECKS = ["valid", "missing", "non_digit", "unknown_provider", "length", "luhn"]
+# Longest card number checked; longer numbers fail the length check:
+MAX_CARD_LENGTH = 19
+# Value of each digit of a card number when doubled by the Luhn algorithm:
+LUHN_DOUBLED = np.array([0, 2, 4, 6, 8, 1, 3, 5, 7, 9], dtype=np.uint8)
+
+
+class CardValidator:
+    """Contains methods for checking card numbers against their providers.
+
+    Each card number is checked, in the order of CARD_CHECKS, for being
+    present, having only digits, having a known provider, having one of
+    that provider's lengths in parameters/number_lengths.yaml and passing
+    the Luhn checksum. The lengths are read once, into a table of the
+    lengths allowed for each provider, and the checks run over the digit
+    codes of the whole column in NumPy, one block of rows at a time.
+
+    Public Methods:
+     - check(card_numbers, card_providers)
+
+    Instance Variables:
+     - lengths_path (str): Path to the card number lengths of each
+       provider. Default "parameters/number_lengths.yaml".
+     - block_rows (int): Rows checked at a time, which bounds the memory
+       used by the digit arrays. Default 1000000.
+
+    Attributes:
+     - providers (list): The known card providers.
+     - allowed_lengths (ndarray): Boolean table of the lengths allowed for
+       each provider, by provider position and length.
+    """
+
+    def __init__(self, lengths_path="parameters/number_lengths.yaml",
+                 block_rows=1000000):
+        """Initialise the CardValidator instance.
+
+        Keyword Arguments:
+         - lengths_path (str): See class docstring.
+         - block_rows (int): See class docstring.
+        """
+        self.lengths_path = lengths_path
+        self.block_rows = block_rows
+        # Lengths are keyed by regex quantifiers, e.g. "{16}":
+        number_lengths = load_config(self.lengths_path)
+        lengths_by_provider = {}
+        for quantifier, providers in number_lengths.items():
+            for provider in providers:
+                lengths_by_provider.setdefault(provider, []).append(int(quantifier.strip("{}")))
+        self.providers = list(lengths_by_provider)
+        # One row per provider plus a last row, allowing no lengths, for
+        # unknown providers:
+        self.allowed_lengths = np.zeros((len(self.providers) + 1, MAX_CARD_LENGTH + 1),
+                                        dtype=bool)
+        for position, provider in enumerate(self.providers):
+            self.allowed_lengths[position, lengths_by_provider[provider]] = True
+
+    def __check_block(self, card_numbers, provider_codes):
+        """Return the CARD_CHECKS position of each card number of a block."""
+        # UTF-32 code of each character, with 0 after the end of the number:
+        codes = card_numbers.to_numpy(f"U{MAX_CARD_LENGTH}").view(np.uint32)\
+                            .reshape(-1, MAX_CARD_LENGTH)
+        lengths = (codes > 0).sum(axis=1)
+        # Numbers longer than MAX_CARD_LENGTH were cut short above:
+        full = lengths == MAX_CARD_LENGTH
+        lengths[full] = card_numbers[full].str.len().to_numpy()
+        is_digit = (codes >= ord("0")) & (codes <= ord("9"))
+        non_digit = ((codes > 0) & ~is_digit).any(axis=1)
+        digits = np.where(is_digit, codes - ord("0"), 0).astype(np.uint8)
+        # Luhn: every second digit counted from the last one is doubled,
+        # i.e. those at an even position from the start for numbers of 
+        # even length and at an odd position for odd lengths:
+        plain = [digits[:, parity::2].sum(axis=1, dtype=np.int64) for parity in (0, 1)]
+        doubled = [LUHN_DOUBLED[digits[:, parity::2]].sum(axis=1, dtype=np.int64)
+                   for parity in (0, 1)]
+        odd_length = lengths % 2 == 1
+        luhn_sums = np.where(odd_length, plain[0] + doubled[1], doubled[0] + plain[1])
+        luhn_valid = luhn_sums % 10 == 0
+        known = provider_codes < len(self.providers)
+        length_valid = self.allowed_lengths[provider_codes,
+                                            np.minimum(lengths, MAX_CARD_LENGTH)]
+        length_valid &= lengths <= MAX_CARD_LENGTH
+        return(np.select([non_digit, ~known, ~length_valid, ~luhn_valid],
+                         [CARD_CHECKS.index("non_digit"),
+                          CARD_CHECKS.index("unknown_provider"),
+                          CARD_CHECKS.index("length"),
+                          CARD_CHECKS.index("luhn")],
+                         CARD_CHECKS.index("valid")))
+
+    def check(self, card_numbers, card_providers):
+        """Return the result of the card number checks for each row.
+
+        Arguments:
+         - card_numbers (Series): Card numbers as strings, e.g. with any
+           '?' prefixes already stripped.
+         - card_providers (Series): The provider of each card, as named
+           in the lengths file.
+
+        Keyword Arguments:
+         - None.
+
+        Returns:
+         - checks (Series): Categorical of CARD_CHECKS, with the first
+           check each card number fails or "valid", on the same index.
+        """
+        missing = card_numbers.isna().to_numpy(bool)
+        # Unknown and missing providers get the row of unknown providers:
+        provider_codes = pd.Index(self.providers).get_indexer(card_providers)
+        provider_codes[provider_codes == -1] = len(self.providers)
+        results = np.full(len(card_numbers), CARD_CHECKS.index("missing"), dtype=np.int8)
+        for start in range(0, len(card_numbers), self.block_rows):
+            stop = start + self.block_rows
+            block = ~missing[start:stop]
+            results[start:stop][block] = self.__check_block(
+                card_numbers.iloc[start:stop][block], provider_codes[start:stop][block])
+        checks = pd.Categorical.from_codes(results, categories=CARD_CHECKS)
+        return(pd.Series(checks, index=card_numbers.index, name="card_number_check"))
@@ -0,0 +1,181 @@
+import copy
+import fnmatch
+import os
+import threading
+import yaml
+
+
+# Directory of the parameter files shipped with the pipeline, which
+# relative config paths are resolved against whatever the working
+# directory is:
+PARAMETERS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "parameters")
+# Keys each parameter file must have, by file name pattern:
+REQUIRED_KEYS = {"db_creds_*.yaml": ["HOST", "PASSWORD", "USER", "DATABASE", "PORT"],
+                 "url_dict.yaml": ["retrieve-store", "number-stores"],
+                 "headers_dict.yaml": [],
+                 "number_lengths.yaml": [],
+                 "pipeline.yaml": [],
+                 "table_schemas.yaml": []}
+
+
+class ConfigStore:
+    """Contains methods for loading the yaml parameter files once.
+
+    Each file is parsed on first use and cached by its absolute path with
+    its modification time and size. Later loads only stat the file, and
+    parse it again if it has changed since, so a long-lived process picks
+    up edited files without repeated yaml I/O. Every load returns a copy,
+    so callers can't change the cached config.
+
+    Relative paths are resolved against 'parameters_dir' rather than the
+    working directory; a leading "parameters/" is dropped, so the paths
+    used throughout the pipeline, e.g. "parameters/pipeline.yaml", work
+    from any directory.
+
+    Any key of a mapping file can be overridden by an environment variable
+    named '<env_prefix><FILE>__<KEY>[__<KEY>...]', with the file name
+    without extension and the keys in upper case and dashes as
+    underscores, e.g. MRDC_DB_CREDS_RDS__PASSWORD or
+    MRDC_URL_DICT__NUMBER_STORES. Values are parsed as yaml, so numbers
+    and lists keep their type.
+
+    Files whose names match REQUIRED_KEYS are checked to be mappings with
+    the required keys, and a ValueError names any that are not.
+
+    Public Methods:
+     - resolve(path)
+     - load(path)
+     - load_all()
+
+    Instance Variables:
+     - parameters_dir (str): Directory of the parameter files. Default
+       None reads the MRDC_PARAMETERS_DIR environment variable, or uses
+       PARAMETERS_DIR.
+     - env_prefix (str): Prefix of the overriding environment variables.
+       Default "MRDC_".
+
+    Attributes:
+     - loads (int): Number of files parsed, including reloads.
+    """
+
+    def __init__(self, parameters_dir=None, env_prefix="MRDC_"):
+        """Initialise the ConfigStore instance.
+
+        Keyword Arguments:
+         - parameters_dir (str): See class docstring.
+         - env_prefix (str): See class docstring.
+        """
+        if parameters_dir is None:
+            parameters_dir = os.environ.get("MRDC_PARAMETERS_DIR", PARAMETERS_DIR)
+        self.parameters_dir = parameters_dir
+        self.env_prefix = env_prefix
+        self.loads = 0
+        self.__cache = {}
+        self.__lock = threading.Lock()
+
+    def resolve(self, path):
+        """Return the absolute path of a parameter file.
+
+        Arguments:
+         - path (str): An absolute path, or one relative to the parameters
+           directory, optionally starting "parameters/".
+
+        Keyword Arguments:
+         - None.
+
+        Returns:
+         - path (str): The absolute path.
+        """
+        path = os.path.expanduser(path)
+        if os.path.isabs(path):
+            return(path)
+        parts = os.path.normpath(path).split(os.sep)
+        if parts[0] == "parameters" and len(parts) > 1:
+            parts = parts[1:]
+        return(os.path.abspath(os.path.join(self.parameters_dir, *parts)))
+
+    def __validate(self, path, config):
+        """Raise a ValueError if a parameter file lacks required keys."""
+        name = os.path.basename(path)
+        for pattern, keys in REQUIRED_KEYS.items():
+            if not fnmatch.fnmatch(name, pattern):
+                continue
+            if not isinstance(config, dict):
+                raise ValueError(f"Config file '{path}' is not a mapping.")
+            missing = [key for key in keys if key not in config]
+            if missing:
+                raise ValueError(f"Config file '{path}' is missing keys {missing}.")
+
+    def __override(self, path, config):
+        """Apply the environment variable overrides of a file's config."""
+        stem = os.path.splitext(os.path.basename(path))[0]
+        prefix = f"{self.env_prefix}{stem}__".upper().replace("-", "_")
+        for name, value in os.environ.items():
+            if not name.startswith(prefix) or not isinstance(config, dict):
+                continue
+            keys = name[len(prefix):].split("__")
+            level = config
+            for position, key in enumerate(keys):
+                # Match the existing key whatever its case and dashes:
+                matches = [existing for existing in level
+                           if str(existing).upper().replace("-", "_") == key]
+                key = matches[0] if matches else key
+                if position == len(keys) - 1:
+                    level[key] = yaml.safe_load(value)
+                else:
+                    level = level.setdefault(key, {})
+        return(config)
+
+    def load(self, path):
+        """Return the parsed config of a yaml parameter file.
+
+        Arguments:
+         - path (str): Path of the file (see 'resolve').
+
+        Keyword Arguments:
+         - None.
+
+        Returns:
+         - config (object): A copy of the parsed file, with environment
+           overrides applied.
+        """
+        path = self.resolve(path)
+        stat = os.stat(path)
+        version = (stat.st_mtime_ns, stat.st_size)
+        with self.__lock:
+            cached = self.__cache.get(path)
+        if cached is None or cached[0] != version:
+            with open(path, "r") as file:
+                config = yaml.safe_load(file)
+            self.__validate(path, config)
+            with self.__lock:
+                self.__cache[path] = (version, config)
+                self.loads += 1
+            cached = (version, config)
+        # Overrides are applied per load so changed variables take effect:
+        return(self.__override(path, copy.deepcopy(cached[1])))
+
+    def load_all(self):
+        """Load and validate every yaml file in the parameters directory.
+
+        Arguments:
+         - None.
+
+        Keyword Arguments:
+         - None.
+
+        Returns:
+         - configs (dict): The config of each file, by file name.
+        """
+        names = sorted(name for name in os.listdir(self.parameters_dir)
+                       if name.endswith((".yaml", ".yml")))
+        return({name: self.load(name) for name in names})
+
+
+# The store shared by every module of the pipeline:
+CONFIG_STORE = ConfigStore()
+
+
+def load_config(path):
+    """Return a parameter file's config from the shared ConfigStore."""
+    return(CONFIG_STORE.load(path))
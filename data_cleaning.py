@@ -1,6 +1,45 @@
 import pandas as pd
 import numpy as np
-import yaml
+import re
+import time
+
+from card_validation import CardValidator
+
+
+# One pattern for every weight format in the product data, tried in order:
+# multipacks of grams ("3 x 100g"), ounces ("16oz"), grams or millilitres 
+# ("100g", "500ml", "77g .") and kilograms ("1.6kg"):
+WEIGHT_PATTERN = re.compile(r"^(?:(?P<count>\d+) x (?P<each>\d+)"
+                            r"|(?P<oz>\d+\.?\d+)oz+$"
+                            r"|(?P<g_ml>\d+\.?\d*)[^k]?(?P<g_ml_unit>[g|ml]).*$"
+                            r"|(?P<kg>\d*\.?\d+)kg$)")
+# Units a weight can be parsed from, in unit code order:
+WEIGHT_UNITS = ["unknown", "multipack", "oz", "g", "ml", "kg"]
+# Date layouts found in the sources: ISO, 'YYYY/MM/DD', 'Month YYYY DD'
+# and 'YYYY Month DD'. Dates in none of these layouts are left to dateutil:
+DATE_PATTERNS = [re.compile(r"^(?P<year>\d{4})-(?P<month>\d{2})-(?P<day>\d{2})$"),
+                 re.compile(r"^(?P<year>\d{4})/(?P<month>\d{2})/(?P<day>\d{2})$"),
+                 re.compile(r"^(?P<month>[A-Za-z]+) (?P<year>\d{4}) (?P<day>\d{2})$"),
+                 re.compile(r"^(?P<year>\d{4}) (?P<month>[A-Za-z]+) (?P<day>\d{2})$")]
+# Two-digit month of each full and abbreviated month name, as accepted
+# by dateutil:
+MONTH_NUMBERS = {name: f"{number:02d}"
+                 for number, names in enumerate(
+                     [("january", "jan"), ("february", "feb"), ("march", "mar"),
+                      ("april", "apr"), ("may",), ("june", "jun"),
+                      ("july", "jul"), ("august", "aug"),
+                      ("september", "sep", "sept"), ("october", "oct"),
+                      ("november", "nov"), ("december", "dec")], start=1)
+                 for name in names}
+# Valid event timestamps, 'HH:MM:SS' on a 24 hour clock:
+TIMESTAMP_PATTERN = r"(?:[01][0-9]|2[0-3]):[0-5][0-9]:[0-5][0-9]"
+# Seconds per unit of each character of 'HH:MM:SS' (none for the colons):
+TIMESTAMP_SECONDS = np.array([36000, 3600, 0, 600, 60, 0, 10, 1])
+# Availability of a product by its 'removed' value, including the
+# misspelling of the source data:
+REMOVED_VALUES = {"Still_avaliable": True, "Still_available": True, "Removed": False}
+# Lower bounds in kg of each product weight class:
+WEIGHT_CLASSES = {"Light": 0, "Mid_Sized": 2, "Heavy": 40, "Truck_Required": 140}
 
 
 class DataCleaning:
@@ -14,6 +53,11 @@ class DataCleaning:
     Private methods called in the public methods are organised above 
     the method which calls them.
 
+    Every rule that drops rows is named "<source>.<rule>" (e.g. 
+    "cards.card_number_digits"). If a RejectsSink is given, it counts
+    and times the rows each rule checks and rejects, and keeps the 
+    rejected rows.
+
     Public Methods:
      - clean_user_data(user_data)
      - clean_card_data(card_data)
@@ -22,10 +66,75 @@ class DataCleaning:
      - clean_order_data(order_data)
      - clean_events_data(events_data)
      
+    Instance Variables:
+     - rejects (RejectsSink): Sink for the rows dropped by each rule.
+       Default None drops them without a record.
+
     Attributes:
-     - None
+     - As instance variables.
     """
 
+    def __init__(self, rejects=None):
+        """Initialise the DataCleaning instance.
+
+        Keyword Arguments:
+         - rejects (RejectsSink): See class docstring.
+        """
+        self.rejects = rejects
+        # Created on the first card number check:
+        self.__card_validator = None
+
+    def __drop_rows(self, data, rule, keep):
+        """
+        Return the rows of 'data' kept by a named rule.
+
+        'keep' takes the frame and returns a boolean mask of the rows to
+        keep, in which missing values count as False. The rows it drops
+        are recorded under 'rule' by the rejects sink, if there is one.
+        """
+        start = time.perf_counter()
+        mask = keep(data)
+        if isinstance(mask, pd.Series):
+            mask = mask.fillna(False).to_numpy(bool)
+        kept = data[mask]
+        if self.rejects is not None:
+            self.rejects.record(rule, data, mask, time.perf_counter() - start)
+        return(kept)
+
+    def __parse_dates(self, dates, errors="coerce"):
+        """
+        Return a series of date strings in mixed formats as datetime64.
+
+        Gives the same result as pd.to_datetime(dates, format="mixed"),
+        but each distinct string is parsed once, and strings in one of
+        the DATE_PATTERNS layouts are rewritten as ISO dates and parsed
+        together with a fixed format. Only strings in no known layout are
+        parsed one by one by dateutil, with 'errors' as in pd.to_datetime.
+        """
+        # Codes index into 'uniques'; missing dates get code -1:
+        codes, uniques = pd.factorize(dates)
+        uniques = pd.Series(uniques, dtype="string")
+        # Most dates are already ISO, which pandas parses fastest:
+        parsed = pd.to_datetime(uniques, format="%Y-%m-%d", errors="coerce")
+        for pattern in DATE_PATTERNS[1:]:
+            unparsed = parsed.isna() & uniques.notna()
+            parts = uniques[unparsed].str.extract(pattern)
+            # Month names become numbers; unknown names stay missing:
+            month = parts["month"].where(parts["month"].str.isdigit(),
+                                         parts["month"].str.lower().map(MONTH_NUMBERS))
+            iso_dates = parts["year"] + "-" + month + "-" + parts["day"]
+            parsed[unparsed] = pd.to_datetime(iso_dates, format="%Y-%m-%d",
+                                              errors="coerce")
+        # Strings in no known layout, or not valid dates in their layout
+        # (e.g. '2005-02-30'), are left to dateutil:
+        unparsed = parsed.isna() & uniques.notna()
+        if unparsed.any():
+            parsed[unparsed] = pd.to_datetime(uniques[unparsed], format="mixed",
+                                              errors=errors)
+        # Append NaT for missing dates so code -1 selects it:
+        values = np.append(parsed.to_numpy("datetime64[ns]"), np.datetime64("NaT", "ns"))
+        return(pd.Series(values[codes], index=dates.index, name=dates.name))
+
     def clean_user_data(self, user_data):
         """Clean user data dataframe.
         
@@ -45,53 +154,44 @@ class DataCleaning:
         # Converting all column types based on pandas defaults:
         user_data = user_data.convert_dtypes()
         # Converting 'date_of_birth' and 'join_date' to datetime format:
-        user_data.date_of_birth = pd.to_datetime(user_data.date_of_birth,
-                                               format="mixed",
-                                               errors="coerce")
-        user_data.join_date = pd.to_datetime(user_data.join_date,
-                                           format="mixed",
-                                           errors="coerce")
+        user_data.date_of_birth = self.__parse_dates(user_data.date_of_birth)
+        user_data.join_date = self.__parse_dates(user_data.join_date)
         # Dropping rows with null values both previously existing 
-        # and those generated by to_datetime() where no date format was found:
-        user_data.dropna(inplace=True)
+        # and those generated by date parsing where no date format was found:
+        user_data = self.__drop_rows(user_data, "users.missing_values",
+                                     lambda frame: frame.notna().all(axis=1))
         # Replacing mistyped country code from 'GGB' to 'GB':
-        user_data["country_code"].replace({"GGB":"GB"}, inplace=True)
+        user_data["country_code"] = user_data["country_code"].replace({"GGB":"GB"})
         # Filtering out rows with user age outside of reasonable range 
         # (there aren't any removed in this case). 
         # 'min_user_age' and 'max_user_age' can be adjusted as desired:
         now = pd.Timestamp.now()
-        min_user_age = np.timedelta64(16, "Y")
-        max_user_age = np.timedelta64(120, "Y")
-        user_data = user_data[(user_data.date_of_birth + min_user_age < now) 
-                              | (user_data.date_of_birth + max_user_age > now)]
+        min_user_age = pd.DateOffset(years=16)
+        max_user_age = pd.DateOffset(years=120)
+        user_data = self.__drop_rows(user_data, "users.user_age",
+                                     lambda frame: (frame.date_of_birth + min_user_age < now)
+                                                   | (frame.date_of_birth + max_user_age > now))
         # Filtering out rows where 'join_date' is in the future or 'join_date' 
         # is earlier than 'date_of_birth'. Not currently in use. 
         #user_data = user_data[(user_data.join_date < now)
         #                      & (user_data.join_date > user_data.date_of_birth)]
         return user_data
     
-    def __card_number_length_check(self, card_data):
-        """Drop rows with incorrect card number lengths."""
-        # Load dictionary relating card lengths to providers:
-        with open("parameters/number_lengths.yaml", "r") as file:
-            number_lengths = dict(yaml.safe_load(file))
-        # Initialise list:
-        valid_numbers = []
-        # Create a list of series of card numbers of invalid length:
-        # Create two boolean masks per iteration:
-        #  - 'provider_mask' is true when the card provider matches the 
-        #     loop iteration's current card number length. 
-        #  - 'correct_length_mask' is true when the length of the card number
-        #     matches the iteration's current card number length.  
-        # Create a new list of card numbers where both these masks are true.
-        # Append this list to the list 'valid_numbers' each iteration.  
-        for card_length in number_lengths.keys():
-            provider_mask = card_data.card_provider.isin(number_lengths[card_length])
-            correct_length_mask = card_data.card_number.str.match(f"^\d{card_length}$")
-            valid_numbers.extend(card_data.card_number[provider_mask & correct_length_mask])
-
-        # Drop rows where card numbers are invalid:
-        card_data = card_data[card_data.card_number.isin(valid_numbers)]
+    def __check_card_numbers(self, card_data, check_numbers):
+        """Flag or drop card numbers failing the CardValidator checks."""
+        if check_numbers not in ("flag", "drop"):
+            raise ValueError(f"Unknown check_numbers option '{check_numbers}'.")
+        # The provider length table is read once per DataCleaning instance:
+        if self.__card_validator is None:
+            self.__card_validator = CardValidator()
+        checks = self.__card_validator.check(card_data.card_number,
+                                             card_data.card_provider)
+        card_data = card_data.assign(card_number_check=checks)
+        if check_numbers == "drop":
+            # Rejected rows keep the check they failed:
+            card_data = self.__drop_rows(card_data, "cards.card_number_check",
+                                         lambda frame: frame.card_number_check == "valid")
+            return(card_data.drop(columns="card_number_check"))
         return(card_data)
 
     def __card_data_reformat(self, card_data):
@@ -101,12 +201,11 @@ class DataCleaning:
                                        format="%m/%y",
                                        errors="raise",)
         card_data.card_provider = card_data.card_provider.astype("string")
-        card_data.date_payment_confirmed = pd.to_datetime(card_data.date_payment_confirmed,
-                                                  format="mixed",
-                                                  errors="raise")
+        card_data.date_payment_confirmed = self.__parse_dates(card_data.date_payment_confirmed,
+                                                              errors="raise")
         return(card_data)
     
-    def clean_card_data(self, card_data):
+    def clean_card_data(self, card_data, check_numbers=None):
         """Clean card data dataframe.
         
         Changes formatting to appropriate datatypes. Drops null rows
@@ -116,22 +215,29 @@ class DataCleaning:
          - card_data (DataFrame): Dataframe of card data to be cleaned.
          
         Keyword Arguments: 
-         - None
+         - check_numbers (str): Check each card number has a length of
+           its provider and passes the Luhn checksum (see CardValidator).
+           "flag" adds a 'card_number_check' column with the first check
+           each number fails, or "valid". "drop" drops the rows that fail
+           any check. Default None skips the checks, as the numbers of the
+           practice data are not real card numbers.
         
         Returns:
          - card_data (DataFrame): Cleaned dataframe of card data.
         """
         # Drop rows with null values:
-        card_data = card_data.dropna()
+        card_data = self.__drop_rows(card_data, "cards.missing_values",
+                                     lambda frame: frame.notna().all(axis=1))
         # Change datatype to string for easier manipulation:
         card_data.loc[:, "card_number"] = card_data.card_number.astype("string")
         # Strip invalid characters from beginning and end:
         card_data.loc[:, "card_number"] = card_data.card_number.str.strip("? ")
         # Drop rows where card number have other invalid characters:
-        card_data = card_data[card_data.card_number.str.match("^\d+$")] 
-        # Drop rows with invalid card number lengths (Currently not in
-        # use due to the realities of the practical exercise):
-        ## card_data = self.__card_number_length_check(card_data)
+        card_data = self.__drop_rows(card_data, "cards.card_number_digits",
+                                     lambda frame: frame.card_number.str.match("^\d+$"))
+        # Check card number lengths and checksums, if asked to:
+        if check_numbers is not None:
+            card_data = self.__check_card_numbers(card_data, check_numbers)
         # Change columns to appropriate data types:
         card_data = self.__card_data_reformat(card_data)
         # Correct index:
@@ -159,8 +265,8 @@ class DataCleaning:
     def __store_data_reformat(self, store_data):
         """Change store data dataframe columns to appropriate data types."""
         store_data = store_data.convert_dtypes()
-        store_data.opening_date = pd.to_datetime(store_data.opening_date,
-                                                 format="mixed")
+        store_data.opening_date = self.__parse_dates(store_data.opening_date,
+                                                     errors="raise")
         store_data.latitude = pd.to_numeric(store_data.latitude,
                                             errors="coerce")
         store_data.longitude = pd.to_numeric(store_data.longitude,
@@ -194,7 +300,9 @@ class DataCleaning:
                                     ["Europe", "America"],
                                     inplace=True)
         # Remove corrupted rows in dataframe based on continents column:
-        store_data = store_data[store_data.continent.str.fullmatch("^Europe$|^America$")]        
+        store_data = self.__drop_rows(store_data, "stores.continent",
+                                      lambda frame: frame.continent.str.fullmatch(
+                                          "^Europe$|^America$"))
         # Fix staff numbers column to remove any non-digit characters. 
         # Using .loc instead of the series attribute to assign because 
         # the 'copy of a view' error is thrown otherwise:
@@ -213,45 +321,36 @@ class DataCleaning:
         store_data.address = store_data.address.str.replace("(\n)", ", ", regex=True)
         return(store_data)
 
-    def __multipack_to_kg(self, product_data):
-        """Add column "multipack" with mulitpack items in kg as type float."""
-        product_data[["multipack_1", "multipack_2"]] = product_data.weight\
-                                                       .str.extract("^(\d+) x (\d+)")
-        product_data.multipack_1 = product_data.multipack_1.astype("float32")
-        product_data.multipack_2 = product_data.multipack_2.astype("float32")
-        product_data["multipack"] = product_data.multipack_1 * product_data.multipack_2
-        product_data.drop(["multipack_1", "multipack_2"], axis=1, inplace=True)
-        product_data.multipack = product_data.multipack\
-                                 .divide(1000)\
-                                 .fillna(value=0)
-        return(product_data)
-
-    def __oz_to_kg(self, product_data):
-        """Add column "weight_oz" with items in ounces to kg as type float."""
-        product_data["weight_oz"] = product_data.weight.str.extract("^(\d+\.?\d+)oz+$")
-        product_data.weight_oz = product_data.weight_oz\
-                                 .astype("float32")\
-                                 .divide(35.27)\
-                                 .fillna(value=0)
-        return(product_data)
+    def __parse_weights(self, weights):
+        """
+        Return weights in kg as float32 and the unit each was parsed from.
 
-    def __g_ml_to_kg(self, product_data):
-        """Add Column "weight_g_ml" with items in g and ml to kg as type float."""
-        product_data["weight_g_ml"] = product_data.weight\
-                                      .str.extract("^(\d+\.?\d*)[^k]?[g|ml].*$")\
-                                      .astype("float32")\
-                                      .divide(1000)\
-                                      .fillna(value=0)
-        return(product_data)
+        Each distinct weight string is matched against WEIGHT_PATTERN 
+        once and the results are mapped back onto every row. Weights that
+        match no format, including missing ones, are 0 with unit "unknown".
+        """
+        # Codes index into 'uniques'; missing weights get code -1:
+        codes, uniques = pd.factorize(weights)
+        parsed = pd.Series(uniques, dtype="string").str.extract(WEIGHT_PATTERN)
+        multipack = (parsed["count"].astype("float32") 
+                     * parsed["each"].astype("float32")).divide(1000)
+        oz = parsed["oz"].astype("float32").divide(35.27)
+        g_ml = parsed["g_ml"].astype("float32").divide(1000)
+        kg = parsed["kg"].astype("float32")
+        unique_kg = multipack.fillna(oz).fillna(g_ml).fillna(kg).fillna(0)
+        unique_units = np.select([multipack.notna(), 
+                                  oz.notna(),
+                                  g_ml.notna() & (parsed["g_ml_unit"] == "g"),
+                                  g_ml.notna(),
+                                  kg.notna()],
+                                 [1, 2, 3, 4, 5],
+                                 default=0)
+        # Append the values for missing weights so code -1 selects them:
+        weights_kg = np.append(unique_kg.to_numpy("float32"), np.float32(0))[codes]
+        unit_codes = np.append(unique_units, 0)[codes]
+        units = pd.Categorical.from_codes(unit_codes, categories=WEIGHT_UNITS)
+        return(weights_kg, units)
 
-    def __format_kg(self, product_data):
-        """Reformat weight column to be compatible with column addition."""
-        product_data.weight = product_data.weight[product_data.weight.str.contains("kg")]\
-                              .str.strip("kg")\
-                              .astype("float32")
-        product_data.weight.fillna(value=0, inplace=True)
-        return(product_data)
-    
     def __correct_homeware_situation(self, product_data):
         """
         Correct Toaster and Kettle weights.
@@ -261,43 +360,61 @@ class DataCleaning:
         rather than just incorrect unit errors.
         """
         product_data.product_name = product_data.product_name.astype("string")
-        product_data.weight.mask((product_data.product_name.str.contains("Toaster|Kettle"))
-                                 & (product_data.weight < 0.050),
-                                 product_data.weight * 1000,
-                                 inplace=True)
+        # Only search the names of the (few) too-light products:
+        too_light = np.flatnonzero(product_data.weight < 0.050)
+        homeware = product_data.product_name.iloc[too_light]\
+                   .str.contains("Toaster|Kettle")\
+                   .fillna(False)\
+                   .to_numpy(bool)
+        weight_column = product_data.columns.get_loc("weight")
+        product_data.iloc[too_light[homeware], weight_column] *= 1000
         return(product_data)
     
     def __convert_product_weights(self, product_data):
-        """Convert product data weight column to kg as float values."""
-        # Change weight column dtype to string:
-        product_data.weight = product_data.weight.astype("string")
-        # Deal with multipack values:
-        product_data = self.__multipack_to_kg(product_data)
-        # Deal with values in ounces:
-        product_data = self.__oz_to_kg(product_data)
-        # Deal with values in grams or millilitres:
-        product_data = self.__g_ml_to_kg(product_data)
-        # Reformat weight column:
-        product_data = self.__format_kg(product_data)
-        # Recombine columns:
-        product_data.weight = product_data.multipack\
-                              + product_data.weight_oz\
-                              + product_data.weight_g_ml\
-                              + product_data.weight
-        # Drop obselete columns:
-        product_data.drop(["multipack", "weight_oz", "weight_g_ml"],
-                           axis=1,
-                           inplace=True)
+        """
+        Convert product data weight column to kg as float values.
+
+        The unit each weight was given in is kept in a 'weight_unit'
+        column after it.
+        """
+        # Parse all weight formats in a single pass:
+        weights_kg, units = self.__parse_weights(product_data.weight)
+        product_data.weight = pd.Series(weights_kg, index=product_data.index)
+        product_data.insert(product_data.columns.get_loc("weight") + 1,
+                            "weight_unit", pd.Series(units, index=product_data.index))
         # Correct kettle and toaster weight values where unreasonably small:
         product_data = self.__correct_homeware_situation(product_data)
         return(product_data)
 
+    def __format_product_columns(self, product_data):
+        """Derive the product price, weight class and availability columns."""
+        # Strip the pound sign from prices and convert to float:
+        product_data.product_price = pd.to_numeric(product_data.product_price
+                                                   .str.lstrip("£"),
+                                                   errors="coerce")
+        # Classify weights into the bands set by WEIGHT_CLASSES:
+        product_data["weight_class"] = pd.cut(product_data.weight,
+                                              bins=[*WEIGHT_CLASSES.values(), np.inf],
+                                              labels=list(WEIGHT_CLASSES),
+                                              right=False)
+        # Replace 'removed' with a boolean 'still_available' column. Values
+        # other than those of REMOVED_VALUES are unknown, i.e. missing:
+        product_data = product_data.rename(columns={"removed": "still_available"})
+        product_data.still_available = product_data.still_available\
+                                       .map(REMOVED_VALUES).astype("boolean")
+        return(product_data)
+
     def clean_product_data(self, product_data):
         """Clean product data dataframe.
         
         Changes formatting to appropriate datatypes. Drops null rows
         and those with invalid or nonsensical data. Converts all weights
-        to kg and type float. Corrects some incorrectly-entered weights.
+        to kg and type float, keeping the unit each weight was given in
+        as a categorical 'weight_unit' column. Corrects some 
+        incorrectly-entered weights.
+        Converts prices to float, adds a 'weight_class' column and 
+        replaces 'removed' with a boolean 'still_available' column, which
+        is missing where 'removed' has none of the REMOVED_VALUES.
         
         Arguments:
          - product_data (DataFrame): Dataframe of product data to be cleaned.
@@ -311,11 +428,14 @@ class DataCleaning:
         # Return weights column in kg as float values:
         product_data = self.__convert_product_weights(product_data)
         # Drop rows where weight is zero - all contain only corrupt or missing data:
-        product_data = product_data[product_data.weight != 0]
+        product_data = self.__drop_rows(product_data, "products.zero_weight",
+                                        lambda frame: frame.weight != 0)
         # Convert object dtypes to string:
         product_data = product_data.convert_dtypes()
         # Convert date_added to datetime64 format:
-        product_data.date_added = pd.to_datetime(product_data.date_added, format="mixed")
+        product_data.date_added = self.__parse_dates(product_data.date_added, errors="raise")
+        # Add the columns otherwise derived in the database:
+        product_data = self.__format_product_columns(product_data)
         return(product_data)
 
     def clean_order_data(self, order_data):
@@ -342,15 +462,80 @@ class DataCleaning:
         order_data = order_data.convert_dtypes()
         return(order_data)
     
+    def __map_distinct(self, column, function, missing):
+        """Return 'function' of a column's distinct values, for each row.
+
+        'function' takes a series of the distinct values and returns an
+        array of results; missing values get 'missing'.
+        """
+        codes, uniques = pd.factorize(column)
+        results = np.asarray(function(pd.Series(uniques, dtype=object)))
+        # Append the missing result so code -1 selects it:
+        return(np.append(results, np.array(missing, dtype=results.dtype))[codes])
+
+    def __timestamp_seconds(self, timestamps):
+        """Return the seconds of the day of each timestamp, or -1 for
+        those not matching TIMESTAMP_PATTERN (e.g. missing or corrupt)."""
+        valid = timestamps.astype("string").str.fullmatch(TIMESTAMP_PATTERN)\
+                                           .fillna(False).to_numpy(bool)
+        # Each valid timestamp is 8 ASCII bytes, whose digits give the seconds:
+        chars = timestamps[valid].to_numpy("S8").view(np.uint8).reshape(-1, 8)
+        seconds = np.full(len(timestamps), -1)
+        seconds[valid] = (chars.astype(np.int64) - ord("0")) @ TIMESTAMP_SECONDS
+        return(seconds)
+
+    def __event_datetimes(self, events_data):
+        """Return the datetime of each event from its date parts and timestamp,
+        or NaT where these are not a valid date and time."""
+        year, month, day = [self.__map_distinct(events_data[name], 
+                                                lambda parts: pd.to_numeric(
+                                                    parts, errors="coerce").to_numpy(float),
+                                                np.nan)
+                            for name in ("year", "month", "day")]
+        seconds = self.__map_distinct(events_data["timestamp"], 
+                                      self.__timestamp_seconds, -1)
+        valid = ((year % 1 == 0) & (month % 1 == 0) & (day % 1 == 0)
+                 & (year > pd.Timestamp.min.year) & (year < pd.Timestamp.max.year)
+                 & (month >= 1) & (month <= 12) & (day >= 1) & (seconds >= 0))
+        # Count months then days from the epoch, with 0 for invalid rows:
+        months = np.where(valid, (year - 1970) * 12 + month - 1, 0).astype("datetime64[M]")
+        dates = months.astype("datetime64[D]") + np.where(valid, day - 1, 0).astype(int)
+        # Days past the end of their month (e.g. 30 February) are invalid:
+        valid &= dates < (months + 1).astype("datetime64[D]")
+        datetimes = dates.astype("datetime64[ns]") + seconds.astype("timedelta64[s]")
+        datetimes[~valid] = np.datetime64("NaT")
+        return(pd.Series(datetimes, index=events_data.index))
+
+    def __clean_events_chunk(self, events_data):
+        """Clean one frame of events data (see clean_events_data)."""
+        # Combine the date parts and timestamp into one datetime64(ns)
+        # column, and drop the rows where they are missing or invalid
+        # (rejects keep the raw columns):
+        datetimes = self.__event_datetimes(events_data)
+        valid = datetimes.notna().to_numpy(bool)
+        events_data = self.__drop_rows(events_data, "events.datetime",
+                                       lambda frame: valid)
+        events_data = pd.DataFrame({"datetime": datetimes[valid],
+                                    "time_period": events_data["time_period"],
+                                    "date_uuid": events_data["date_uuid"]})
+        return(events_data.astype({"time_period": "string", "date_uuid": "string"}))
+
     def clean_events_data(self, events_data):
         """Clean events data dataframe.
         
-        Changes formatting to appropriate datatypes. Drops null rows
-        and those with invalid or nonsensical data. Combines the seperate 
-        datetime data columns into a single column with type datetime64(ns).
+        Drops null rows and those with invalid or nonsensical data. 
+        Combines the seperate date and time columns into a single column 
+        with type datetime64(ns), built from the numeric date parts and 
+        the seconds of each timestamp.
+
+        Events may also be passed as an iterable of dataframes, e.g. the
+        chunks of DataExtractor.extract_json_from_s3(lines=True, 
+        chunk_size=...). Each chunk is cleaned as it is read, so only the
+        cleaned columns of earlier chunks are held in memory.
         
         Arguments:
-         - events_data (DataFrame): Dataframe of events data to be cleaned.
+         - events_data (DataFrame or iterable of DataFrames): Dataframe 
+           of events data to be cleaned.
          
         Keyword Arguments: 
          - None
@@ -358,23 +543,6 @@ class DataCleaning:
         Returns:
          - events_data (DataFrame): Cleaned dataframe of events data.
         """
-        # Convert all datatypes to string:
-        events_data = events_data.convert_dtypes()
-        # Create new column "datetime":
-        # - Create list "digits" of single digits in string format.
-        # - When any dataframe item matches an item in the list
-        #   then the value is replaced with itself and a leading zero.
-        # - Combine the four date/time data columns into one string per row 
-        # that "to_datetime()" can parse. 
-        digits = map(str, list(range(0,10)))
-        events_data = events_data.mask(events_data.isin(digits), "0" + events_data)
-        events_data = events_data[events_data.timestamp.str.match("^\d\d:\d\d:\d\d$")]
-        events_data["datetime"] = events_data.year\
-                                + events_data.month\
-                                + events_data.day\
-                                + " " + events_data.timestamp                  
-        # Format datetime column as pandas datetime(ns).
-        events_data.datetime = pd.to_datetime(events_data.datetime)
-        # Drop obselete rows:                                    
-        events_data = events_data.iloc[:, [6,4,5]]
-        return(events_data)
\ No newline at end of file
+        if isinstance(events_data, pd.DataFrame):
+            return(self.__clean_events_chunk(events_data))
+        return(pd.concat([self.__clean_events_chunk(chunk) for chunk in events_data]))
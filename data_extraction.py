@@ -1,12 +1,46 @@
-from sqlalchemy import inspect, text
-from tabula import read_pdf
-import boto3
-import requests
-import yaml
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
+from config_store import load_config
+import codecs
+import io
 import json
+import multiprocessing
+import os
 import re
+import tempfile
+import threading
 import pandas as pd
 
+# boto3, requests, sqlalchemy, tabula and pypdf take about half a second
+# to import between them, so each is imported by the methods that use
+# it. Processes that only clean data, or only read from one kind of
+# source, never load the others.
+
+
+def _read_pdf_pages(pdf_path, pages, persistent_jvm):
+    """Return the tables on a list of pages of a local pdf.
+
+    Defined at module level so it can be sent to worker processes.
+    """
+    from tabula import read_pdf
+    return(read_pdf(pdf_path, pages=pages, force_subprocess=not persistent_jvm))
+
+
+class _ArchivingReader:
+    """Wraps a binary stream, copying every block read to an archive file."""
+
+    def __init__(self, stream, archive):
+        self.stream = stream
+        self.archive = archive
+
+    def read(self, size=-1):
+        block = self.stream.read(None if size is None or size < 0 else size)
+        self.archive.write(block)
+        return(block)
+
+    def readable(self):
+        return(True)
+
 
 class DataExtractor:
     """Contains methods for extract data from databases.
@@ -18,91 +52,340 @@ class DataExtractor:
 
     Public Methods:
      - list_db_tables(engine)
-     - read_rds_table()
-     - retrieve_pdf_data()
+     - s3_object_version(address)
+     - read_rds_table(table_name, columns, where, params, chunk_size)
+     - retrieve_pdf_data(pdf_address, parallel, pages_per_task,
+       max_workers, persistent_jvm)
      - list_number_of_stores()
-     - retrieve_stores_data(stores_number)
-     - extract_csv_from_s3(s3_address, file_path)
-     - extract_json_from_s3(web_address, file_path)
+     - retrieve_stores_data(store_number, concurrent, max_workers, 
+       retries, backoff_factor, progress_path)
+     - extract_csv_from_s3(s3_address, file_path, stream, chunk_size,
+       max_concurrency, part_size)
+     - extract_json_from_s3(web_address, file_path, stream, lines,
+       chunk_size, max_concurrency, part_size)
+     - close()
      
     Instance Variables:
      - engine (sqlalchemy engine object): Initialised using the 
        DatabaseConnector class.
+     - cache (ExtractionCache): Optional on-disk cache of raw 
+       extractions. When given, the RDS, pdf and s3 extraction methods
+       return the cached frame while the source is unchanged instead of
+       re-extracting it. Sources without a validator are only cached if
+       the cache has a TTL. Store data is not cached here; see 
+       http_cache.
+     - http_cache (HttpCache): Optional on-disk cache of store API
+       responses. When given, each store is requested conditionally and
+       unchanged stores are served from disk.
 
     Attributes:
+     - header_dict_path (str): path to the store API headers dictionary.
+     - url_dict_path (str): path to the store API url dictionary. Both
+       paths can be overridden, e.g. to point at a local stub server.
      - engine  (sqlalchemy engine object): as above.
-     - insp (sqlalchemy inspector object): Created during class 
-       initialisation. Used to extract information about the 
-       associated database.
+     - insp (sqlalchemy inspector object): Created when first used, so
+       extractors that never list tables never inspect the database. 
+       Used to extract information about the associated database.
      """
+
+    header_dict_path = "parameters/headers_dict.yaml"
+    url_dict_path = "parameters/url_dict.yaml"
+    # Response codes worth retrying when crawling the store API:
+    retry_status_codes = (429, 500, 502, 503, 504)
     
-    def __init__(self,engine):
+    def __init__(self,engine, cache=None, http_cache=None):
         """Initialise the DataExtractor Instance.
         
         Arguments:
          - engine (sqlalchemy engine object): This object is initialised
            using the DatabaseConnector class and associates the 
            DataExtractor class with a database.
+
+        Keyword Arguments:
+         - cache (ExtractionCache): See class docstring. Default None.
+         - http_cache (HttpCache): See class docstring. Default None.
         """
         self.engine = engine
-        self.insp = inspect(self.engine)
+        self.cache = cache
+        self.http_cache = http_cache
+        self.__insp = None
+        self.__pdf_pool = None
+        self.__pdf_pool_workers = None
+        self.__pdf_pool_lock = threading.Lock()
+
+    @property
+    def insp(self):
+        """The inspector of the associated database, created on first use."""
+        if self.__insp is None:
+            from sqlalchemy import inspect
+            self.__insp = inspect(self.engine)
+        return(self.__insp)
+
+    def __cached(self, source, validator, extract):
+        """Return the cached extraction of a source, extracting on a miss.
+        
+        'validator' and 'extract' are functions returning the current 
+        validator of the source and its freshly extracted data.
+        """
+        if self.cache is None:
+            return(extract())
+        validator = validator()
+        # A source without a validator could change unseen, so it is only
+        # cached when entries expire:
+        if validator is None and self.cache.ttl_seconds is None:
+            return(extract())
+        data = self.cache.get(source, validator)
+        if data is None:
+            data = extract()
+            self.cache.put(source, validator, data)
+        return(data)
+
+    def __http_validator(self, url, headers=None):
+        """Return the ETag or Last-Modified header of a web resource."""
+        import requests
+        response = requests.head(url, headers=headers, allow_redirects=True)
+        response.raise_for_status()
+        return(response.headers.get("ETag") 
+               or response.headers.get("Last-Modified"))
+
+    def __s3_validator(self, bucket, key):
+        """Return the ETag and modification time of an s3 object."""
+        import boto3
+        s3 = boto3.client("s3")
+        head = s3.head_object(Bucket=bucket, Key=key)
+        return(f"{head['ETag']}|{head['LastModified'].isoformat()}")
+
+    def s3_object_version(self, address):
+        """Return the ETag and modification time of an s3 object.
+
+        Only the object's metadata is requested, so a caller can tell
+        whether the object has changed before downloading it.
+
+        Arguments:
+        - address (str): The s3 address ("s3://bucket/key") or web address
+        ("https://bucket.s3...amazonaws.com/key") of the object.
+
+        Keyword Arguments:
+        - None
+
+        Returns:
+        - version (str): "<ETag>|<LastModified>", which changes whenever
+        the object does.
+        """
+        bucket_info = (re.match(r"^s3://(.*)/(.*)$", address)
+                       or re.match(r"^https://([^.]+).*/(.*)$", address))
+        return(self.__s3_validator(bucket_info.group(1), bucket_info.group(2)))
 
     def list_db_tables(self):
         """Print the table names of all tables in the associated database."""
         tables = self.insp.get_table_names()
         print(tables)
     
-    def read_rds_table(self, table_name):
+    def __table_query(self, table_name, columns, where):
+        """Return a SELECT statement with optional projection and filter."""
+        from sqlalchemy import column, select, table, text
+        # Quote identifiers through sqlalchemy rather than the f-string so
+        # only the requested columns are fetched by the database. A schema
+        # qualified name, e.g. "public.orders_table", is quoted in parts:
+        schema, _, unqualified_name = table_name.rpartition(".")
+        source = table(unqualified_name, schema=schema or None)
+        if columns is None:
+            query = select(text("*")).select_from(source)
+        else:
+            query = select(*[column(name) for name in columns]).select_from(source)
+        if where is not None:
+            query = query.where(text(where))
+        return(query)
+
+    def __stream_rds_table(self, query, params, chunk_size):
+        """Yield query results as DataFrames of at most 'chunk_size' rows."""
+        # 'stream_results' asks the driver for a server-side cursor so 
+        # only one chunk of rows is held in memory at a time:
+        with self.engine.connect() as connection:
+            result = connection.execution_options(stream_results=True,
+                                                  max_row_buffer=chunk_size)\
+                               .execute(query, params or {})
+            keys = list(result.keys())
+            for partition in result.partitions(chunk_size):
+                yield pd.DataFrame(partition, columns=keys)
+
+    def read_rds_table(self, table_name, columns=None, where=None, 
+                       params=None, chunk_size=None):
         """Return a specificed table from an RDS database as a pandas DataFrame.
         
-        Convenient to use in conjuction with list_db_tables.
+        Convenient to use in conjuction with list_db_tables. When 
+        'chunk_size' is given the table is streamed through a server-side
+        cursor and an iterator of DataFrames is returned instead, so memory
+        use is proportional to the chunk size rather than the table size.
 
         Arguments:
-         - table_name(str): The name of a table in the associated database.
+         - table_name(str): The name of a table in the associated database,
+           optionally qualified by its schema, e.g. "public.orders_table".
 
         Keyword Arguments:
-         - None
+         - columns (list): Names of the columns to fetch. Default None
+           fetches every column.
+         - where (str): An SQL predicate applied by the database, e.g. 
+           "index > :last_index". Default None.
+         - params (dict): Values for any bound parameters in 'where'.
+           Default None.
+         - chunk_size (int): Number of rows per DataFrame when streaming.
+           Default None reads the whole table at once.
 
         Returns:
          - data (DataFrame): A pandas DataFrame of data from 
-           the table specified.
+           the table specified. If 'chunk_size' is given, an iterator of
+           DataFrames with at most 'chunk_size' rows each.
         """
-        with self.engine.connect() as connection:
-            table_data = connection.execute(text(f"SELECT * FROM {table_name}"))
-        data = pd.DataFrame(table_data)
+        query = self.__table_query(table_name, columns, where)
+        if chunk_size is not None:
+            return(self.__stream_rds_table(query, params, chunk_size))
+
+        def row_count():
+            from sqlalchemy import func, select
+            count_query = select(func.count()).select_from(query.subquery())
+            with self.engine.connect() as connection:
+                return(connection.execute(count_query, params or {}).scalar())
+
+        def extract():
+            with self.engine.connect() as connection:
+                table_data = connection.execute(query, params or {})
+            return(pd.DataFrame(table_data))
+
+        # Cached tables are validated against their current row count:
+        source = {"method": "read_rds_table", "database": str(self.engine.url),
+                  "query": str(query), "params": params}
+        data = self.__cached(source, row_count, extract)
         return data
     
-    def retrieve_pdf_data(self, pdf_address):
+    def __download_pdf(self, pdf_address, pdf_path):
+        """Stream a pdf from its web address to a local file."""
+        import requests
+        with requests.get(pdf_address, stream=True) as response:
+            response.raise_for_status()
+            with open(pdf_path, "wb") as file:
+                for block in response.iter_content(chunk_size=1 << 20):
+                    file.write(block)
+
+    def __count_pdf_pages(self, pdf_path):
+        """Return the number of pages of a local pdf, or 0 if unknown."""
+        try:
+            from pypdf import PdfReader
+        except ImportError:
+            # Without pypdf pages are counted from the raw pdf objects.
+            PdfReader = None
+        if PdfReader is not None:
+            return(len(PdfReader(pdf_path).pages))
+        # Page objects inside compressed object streams are not found, in
+        # which case 0 is returned and the pdf is read serially:
+        with open(pdf_path, "rb") as file:
+            return(len(re.findall(rb"/Type\s*/Page\b", file.read())))
+
+    def __pdf_worker_pool(self, max_workers):
+        """Return the pdf worker pool, starting it on first use.
+
+        The pool is restarted if a call asks for a different number of
+        workers.
+        """
+        with self.__pdf_pool_lock:
+            if self.__pdf_pool is not None and self.__pdf_pool_workers != max_workers:
+                self.__pdf_pool.shutdown()
+                self.__pdf_pool = None
+            if self.__pdf_pool is None:
+                # Spawn rather than fork the workers, as a JVM already 
+                # running in this process does not survive a fork:
+                self.__pdf_pool = ProcessPoolExecutor(
+                    max_workers=max_workers,
+                    mp_context=multiprocessing.get_context("spawn"))
+                self.__pdf_pool_workers = max_workers
+            return(self.__pdf_pool)
+
+    def close(self):
+        """Shut down the pdf worker processes, if they were started."""
+        with self.__pdf_pool_lock:
+            if self.__pdf_pool is not None:
+                self.__pdf_pool.shutdown()
+                self.__pdf_pool = None
+
+    def __read_pdf_parallel(self, pdf_path, pages_per_task, max_workers,
+                            persistent_jvm):
+        """Read page ranges of a local pdf in worker processes."""
+        page_count = self.__count_pdf_pages(pdf_path)
+        if page_count == 0:
+            return(_read_pdf_pages(pdf_path, "all", persistent_jvm))
+        page_ranges = [list(range(first, min(first + pages_per_task, page_count + 1)))
+                       for first in range(1, page_count + 1, pages_per_task)]
+        if max_workers is None:
+            max_workers = os.cpu_count() or 1
+        range_tables = self.__pdf_worker_pool(max_workers).map(
+            _read_pdf_pages,
+            [pdf_path] * len(page_ranges),
+            page_ranges,
+            [persistent_jvm] * len(page_ranges))
+        # map yields in submission order, so tables stay in page order:
+        return([table for tables in range_tables for table in tables])
+
+    def retrieve_pdf_data(self, pdf_address, parallel=False, pages_per_task=4,
+                          max_workers=None, persistent_jvm=True):
         """Return a pdf as a pandas DataFrame.
         
-        Handles multiple pages of pdf data.
+        Handles multiple pages of pdf data. In parallel mode the pdf is
+        downloaded once to a temporary file, split into ranges of pages,
+        and the ranges are read by tabula in separate worker processes.
+        The tables are concatenated in page order, so the result is the
+        same as reading the whole pdf at once.
         
         Arguments:
-        - pdf_address (str): The web address of the pdf data to be extracted.
+        - pdf_address (str): The web address of the pdf data to be extracted,
+          or the path of a local pdf.
 
         Keyword Arguments:
-        - None
+        - parallel (bool): Read page ranges in worker processes. Default False.
+        - pages_per_task (int): Pages read by each worker task. Default 4.
+        - max_workers (int): The number of worker processes. Default None
+          uses one per CPU.
+        - persistent_jvm (bool): Run tabula in a JVM kept alive in each
+          process (requires jpype1) and reused for every call, rather than
+          starting a java subprocess per call. Default True. The worker
+          processes, and so their JVMs, are kept by the instance and 
+          reused by later parallel calls until 'close' is called.
 
         Returns:
         - data (DataFrame): A pandas DataFrame of the pdf data.
         """
-        pdf_data = read_pdf(pdf_address, pages="all")
-        data = pd.concat(pdf_data)
+        local = os.path.exists(pdf_address)
+
+        def extract():
+            if not parallel:
+                pdf_data = _read_pdf_pages(pdf_address, "all", persistent_jvm)
+            elif local:
+                pdf_data = self.__read_pdf_parallel(pdf_address, pages_per_task,
+                                                    max_workers, persistent_jvm)
+            else:
+                with tempfile.TemporaryDirectory() as directory:
+                    pdf_path = os.path.join(directory, "data.pdf")
+                    self.__download_pdf(pdf_address, pdf_path)
+                    pdf_data = self.__read_pdf_parallel(pdf_path, pages_per_task,
+                                                        max_workers, persistent_jvm)
+            return(pd.concat(pdf_data))
+
+        if local:
+            stat = os.stat(pdf_address)
+            validator = lambda: f"{stat.st_size}|{stat.st_mtime_ns}"
+        else:
+            validator = lambda: self.__http_validator(pdf_address)
+        data = self.__cached({"method": "retrieve_pdf_data", "url": pdf_address},
+                             validator, extract)
         return(data) 
 
     def __open_api_info(self):
-        """Open header and url dictionaries."""
-
-        header_dict_path = "parameters/headers_dict.yaml"
-        url_dict_path = "parameters/url_dict.yaml"
-        with open(header_dict_path, "r") as file1,\
-             open(url_dict_path, "r") as file2:
-            header_dict = yaml.safe_load(file1)
-            url_dict = yaml.safe_load(file2)
+        """Return the header and url dictionaries, parsed once per process."""
+        header_dict = load_config(self.header_dict_path)
+        url_dict = load_config(self.url_dict_path)
         return(header_dict, url_dict)
 
     def list_number_of_stores(self):
-        """List the number of stores in the business.
+        """Return the number of stores in the business.
         
         Arguments:
         - None
@@ -114,87 +397,321 @@ class DataExtractor:
         - number_stores (int): The number of stores stored at 
         the location provided.
         """
+        import requests
         header_dict, url_dict = self.__open_api_info()
-        number_stores = requests.get(url_dict["number-stores"],
-                                     headers=header_dict)
-        number_stores = eval(number_stores.text)
-        print(number_stores["number_stores"])
+        response = requests.get(url_dict["number-stores"], headers=header_dict)
+        response.raise_for_status()
+        number_stores = int(json.loads(response.text)["number_stores"])
+        return(number_stores)
     
-    def retrieve_stores_data(self, store_number):
+    def __api_session(self, header_dict, pool_size, retries, backoff_factor):
+        """Return a keep-alive requests session that retries failed calls."""
+        from requests.adapters import HTTPAdapter
+        from urllib3.util.retry import Retry
+        import requests
+        # Retry on rate limiting and server errors, backing off 
+        # exponentially and honouring any 'Retry-After' header:
+        retry = Retry(total=retries,
+                      backoff_factor=backoff_factor,
+                      status_forcelist=self.retry_status_codes,
+                      allowed_methods=["GET"],
+                      respect_retry_after_header=True)
+        # One connection pool sized to the number of worker threads so 
+        # connections are reused rather than reopened per store:
+        adapter = HTTPAdapter(pool_connections=1,
+                              pool_maxsize=pool_size,
+                              max_retries=retry)
+        session = requests.Session()
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        session.headers.update(header_dict)
+        return(session)
+
+    def __fetch_store(self, session, store_url, header_dict):
+        """Return the json data of a single store as a dictionary."""
+        if self.http_cache is not None:
+            return(json.loads(self.http_cache.get(store_url, headers=header_dict,
+                                                  session=session)))
+        response = session.get(store_url, headers=header_dict)
+        response.raise_for_status()
+        return(json.loads(response.text))
+
+    def __read_progress(self, progress_path):
+        """Return the stores already fetched to a progress log, by url."""
+        fetched = {}
+        if progress_path is None or not os.path.exists(progress_path):
+            return(fetched)
+        with open(progress_path, "r") as file:
+            for line in file:
+                # The last line is cut short if a crawl was killed while
+                # writing it; that store is simply fetched again:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                fetched[entry["url"]] = entry["data"]
+        return(fetched)
+
+    def __crawl_stores(self, header_dict, url_dict, store_number, concurrent,
+                       max_workers, retries, backoff_factor, progress_path):
+        """Request every store and return the stores as a dataframe."""
+        store_urls = [f"{url_dict['retrieve-store']}{num}" 
+                      for num in range(store_number)]
+        fetched = self.__read_progress(progress_path)
+        missing_urls = [url for url in store_urls if url not in fetched]
+        progress = None
+        if progress_path is not None:
+            os.makedirs(os.path.dirname(os.path.abspath(progress_path)), exist_ok=True)
+            # Stores with a blank line before them, in case the log ends 
+            # with a line cut short:
+            progress = open(progress_path, "a")
+            progress.write("\n")
+        lock = threading.Lock()
+
+        def record(store_url, store):
+            # Each store is logged as soon as it arrives, so a failed
+            # crawl keeps every store fetched before the failure:
+            with lock:
+                fetched[store_url] = store
+                if progress is not None:
+                    progress.write(json.dumps({"url": store_url, "data": store}) + "\n")
+                    progress.flush()
+
+        try:
+            if concurrent:
+                session = self.__api_session(header_dict, max_workers,
+                                             retries, backoff_factor)
+                with session, ThreadPoolExecutor(max_workers=max_workers) as pool:
+                    futures = {pool.submit(self.__fetch_store, session, url,
+                                           header_dict): url
+                               for url in missing_urls}
+                    errors = []
+                    # Stores that fail don't stop the others being logged:
+                    for future in as_completed(futures):
+                        if future.exception() is not None:
+                            errors.append(future.exception())
+                        else:
+                            record(futures[future], future.result())
+                    if errors:
+                        raise errors[0]
+            else:
+                import requests
+                for store_url in missing_urls:
+                    record(store_url, self.__fetch_store(requests, store_url,
+                                                         header_dict))
+        finally:
+            if progress is not None:
+                progress.close()
+        # Every store arrived, so the next crawl starts afresh:
+        if progress_path is not None:
+            os.remove(progress_path)
+
+        # Stores are reassembled in index order:
+        store_data = pd.DataFrame([fetched[url] for url in store_urls])
+        store_data.set_index("index", inplace=True)
+        return(store_data)
+
+    def retrieve_stores_data(self, store_number=None, concurrent=False, 
+                             max_workers=8, retries=3, backoff_factor=0.5,
+                             progress_path=None):
         """Retrieve dataframe of information on stores.
         
         Variable execution time depeneding on number of stores retrieved.
+        By default stores are requested one at a time. When 'concurrent'
+        is True, stores are requested by a bounded pool of threads sharing
+        one keep-alive session, and failed requests (429/5xx) are retried
+        with exponential backoff. Either way the stores are returned in 
+        store index order.
+
+        When 'progress_path' is given, the crawl can be resumed: each store
+        is appended to that JSON lines log as it arrives, and stores
+        already in the log are not requested again. If the crawl fails, 
+        running it again only fetches the missing stores. The log is 
+        removed once every store has been fetched. With an 'http_cache',
+        stores unchanged since the last crawl are served from disk.
 
         Arguments:
-        - store_number (int): The number of stores to retrieve data on.
-        The maximum value of this integer can be found by calling 
-        "list_number_of_stores".
+        - None
         
         Keyword Arguments:
-        - None
+        - store_number (int): The number of stores to retrieve data on.
+        Default None retrieves every store, as counted by 
+        "list_number_of_stores".
+        - concurrent (bool): Request stores concurrently. Default False.
+        - max_workers (int): The maximum number of requests in flight at
+        once when 'concurrent' is True. Default 8.
+        - retries (int): The number of times a failed request is retried
+        when 'concurrent' is True. Default 3.
+        - backoff_factor (float): Base delay in seconds between retries,
+        doubled on each attempt. Default 0.5.
+        - progress_path (str): Path of the progress log of a resumable
+        crawl. Default None keeps no log.
         
         Returns:
         - store_data (DataFrame): a pandas dataframe of the collated 
         store data."""
 
-        store_data = []
         header_dict, url_dict = self.__open_api_info()
-        for num in range(store_number):
-            loop_data = requests.get(f"{url_dict['retrieve-store']}{num}",
-                                  headers=header_dict)
-            loop_data = json.loads(loop_data.text)
-            store_data.append(loop_data)
-        
-        store_data = pd.DataFrame(store_data)
-        store_data.set_index("index", inplace=True)
-        return(store_data)
+        if store_number is None:
+            store_number = self.list_number_of_stores()
+        # Stores are cached per response by the http_cache rather than as
+        # one frame, so each is checked for changes and a failed crawl is
+        # resumed from its progress log:
+        return(self.__crawl_stores(header_dict, url_dict, store_number,
+                                   concurrent, max_workers, retries,
+                                   backoff_factor, progress_path))
     
-    def extract_csv_from_s3(self, s3_address, file_path):
+
+    @contextmanager
+    def __s3_source(self, name, key, file_path, stream, max_concurrency,
+                    part_size):
+        """Yield an s3 object as a downloaded file path or a readable stream.
+
+        Streams are read straight from the object body, or from memory
+        after a parallel ranged download when max_concurrency > 1. They
+        are copied to file_path as they are read, if one is given.
+        """
+        from boto3.s3.transfer import TransferConfig
+        import boto3
+        s3 = boto3.client("s3")
+        if not stream:
+            if file_path is None:
+                raise ValueError("file_path is required unless stream=True.")
+            s3.download_file(name, key, file_path)
+            yield(file_path)
+            return
+        if max_concurrency > 1:
+            # Objects larger than part_size are fetched as ranged GETs
+            # of part_size bytes on max_concurrency threads:
+            body = io.BytesIO()
+            config = TransferConfig(multipart_threshold=part_size,
+                                    multipart_chunksize=part_size,
+                                    max_concurrency=max_concurrency)
+            s3.download_fileobj(name, key, body, Config=config)
+            body.seek(0)
+        else:
+            body = s3.get_object(Bucket=name, Key=key)["Body"]
+        try:
+            if file_path is None:
+                yield(body)
+            else:
+                with open(file_path, "wb") as archive:
+                    yield(_ArchivingReader(body, archive))
+        finally:
+            body.close()
+
+    def __s3_chunks(self, source_args, read_chunks):
+        """Yield the chunks parsed from an s3 object, closing it after."""
+        with self.__s3_source(*source_args) as source,\
+             read_chunks(source) as reader:
+            yield from reader
+
+    def extract_csv_from_s3(self, s3_address, file_path=None, stream=False,
+                            chunk_size=None, max_concurrency=1,
+                            part_size=8 * 1024**2):
         """Retrieve csv data from s3 bucket and return as DataFrame.
         
         Must be called with an s3 address that contains csv data only.
+        By default the object is downloaded to file_path and read back.
+        With stream=True it is parsed straight from the response body,
+        and only written to file_path as an archive copy if one is given.
 
         Arguments: 
         - s3_address (str): The s3 address of the bucket for information
         to be retrieved from.
-        - file_path (str): a directory for the downloaded file to be saved
-        to. 
+
         Keyword Arguments:
-        - None
+        - file_path (str): a directory for the downloaded file to be saved
+        to. Required unless stream is True. Default None.
+        - stream (bool): Parse the object without a local file. Default
+        False.
+        - chunk_size (int): If given, return an iterator of DataFrames of 
+        up to chunk_size rows, parsed as the object is read. These are
+        not cached. Default None.
+        - max_concurrency (int): Threads downloading ranges of the object
+        in parallel when streaming. Default 1 streams the body with a
+        single GET.
+        - part_size (int): Bytes per ranged GET. Default 8 MiB.
         
         Returns: 
-        - data (DataFrame): A pandas dataframe of csv data. Also saves
-         a csv to file. 
+        - data (DataFrame): A pandas dataframe of csv data, or an 
+        iterator of DataFrames if chunk_size is given. Also saves a csv
+        to file if file_path is given, unless the frame is served from
+        the cache, in which case no file is written.
         """
-        bucket_info = re.match("^s3:\/\/(.*)\/(.*)$", s3_address)
+        bucket_info = re.match(r"^s3://(.*)/(.*)$", s3_address)
         name = bucket_info.group(1)
         key = bucket_info.group(2)
-        s3 = boto3.client("s3")
-        s3.download_file(name, key, file_path)
-        data = pd.read_csv(file_path, index_col=[0])
+        source_args = (name, key, file_path, stream, max_concurrency, part_size)
+
+        if chunk_size is not None:
+            return(self.__s3_chunks(source_args, lambda source: pd.read_csv(
+                source, index_col=[0], chunksize=chunk_size)))
+
+        def extract():
+            with self.__s3_source(*source_args) as source:
+                return(pd.read_csv(source, index_col=[0]))
+
+        data = self.__cached({"method": "extract_csv_from_s3", "address": s3_address},
+                             lambda: self.__s3_validator(name, key),
+                             extract)
         return(data)
     
-    def extract_json_from_s3(self, web_address, file_path):
+    def extract_json_from_s3(self, web_address, file_path=None, stream=False,
+                             lines=False, chunk_size=None, max_concurrency=1,
+                             part_size=8 * 1024**2):
         """Retrieve json data from s3 bucket and return as DataFrame.
         
-        Must be called with a web address that contains csv data only.
+        Must be called with a web address that contains json data only.
+        By default the object is downloaded to file_path and read back.
+        With stream=True it is parsed straight from the response body,
+        and only written to file_path as an archive copy if one is given.
 
         Arguments: 
         - web_address (str): The web address of the s3 bucket with information
         to be retrieved from.
-        - file_path (str): a directory for the downloaded file to be saved
-        to. 
+
         Keyword Arguments:
-        - None
+        - file_path (str): a directory for the downloaded file to be saved
+        to. Required unless stream is True. Default None.
+        - stream (bool): Parse the object without a local file. Default
+        False.
+        - lines (bool): The object is line-delimited json, one record per
+        line. Default False reads a single json document.
+        - chunk_size (int): If given with lines=True, return an iterator 
+        of DataFrames of up to chunk_size records, parsed as the object
+        is read. These are not cached. Default None.
+        - max_concurrency (int): Threads downloading ranges of the object
+        in parallel when streaming. Default 1 streams the body with a
+        single GET.
+        - part_size (int): Bytes per ranged GET. Default 8 MiB.
         
         Returns: 
-        - data (DataFrame): A pandas dataframe of the json data. Also saves
-         a json to file. 
+        - data (DataFrame): A pandas dataframe of the json data, or an
+        iterator of DataFrames if chunk_size is given. Also saves a json
+        to file if file_path is given, unless the frame is served from
+        the cache, in which case no file is written.
         """
-        bucket_info = re.match("^https:\/\/([^\.]+).*\/(.*)$", web_address)
+        bucket_info = re.match(r"^https://([^.]+).*/(.*)$", web_address)
         name = bucket_info.group(1)
         key = bucket_info.group(2)
-        s3 = boto3.client("s3")
-        s3.download_file(name, key, file_path)
-        data = pd.read_json(file_path)
-        return(data)
\ No newline at end of file
+        source_args = (name, key, file_path, stream, max_concurrency, part_size)
+
+        if chunk_size is not None:
+            if not lines:
+                raise ValueError("chunk_size requires line-delimited json, "
+                                 "lines=True.")
+            # The reader iterates lines of text, so streams are decoded:
+            return(self.__s3_chunks(source_args, lambda source: pd.read_json(
+                source if isinstance(source, str) else codecs.getreader("utf-8")(source),
+                lines=True, chunksize=chunk_size)))
+
+        def extract():
+            with self.__s3_source(*source_args) as source:
+                return(pd.read_json(source, lines=lines))
+
+        data = self.__cached({"method": "extract_json_from_s3", "address": web_address,
+                              "lines": lines},
+                             lambda: self.__s3_validator(name, key),
+                             extract)
+        return(data)
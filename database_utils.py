@@ -1,46 +1,93 @@
-from sqlalchemy import create_engine
-import yaml
+from config_store import load_config
+from dtype_planner import binary_to_uuids, is_binary_uuid
+from io import StringIO
+import time
+import pandas as pd
 
 class DatabaseConnector:
     """Contains utility methods for connecting to databases.
     
     Public methods:
-     - upload_to_db()
+     - upload_to_db(df, table_name, if_exists, key, method, chunk_size,
+       watermark, schema)
+     - read_watermark(source)
+     - write_watermark(source, watermark, connection)
 
      Instance variables:
-     - 'cred_dict_path' (str): the relative or absolute path 
-       to a dictionary of credentials to a database. Dictionary must
-       be in the format laid out in the file parameters/db_creds_xxx.yaml 
-       and of type yaml.
+     - 'cred_dict_path' (str): the absolute path, or the path relative
+       to the parameters directory (see ConfigStore), to a dictionary of
+       credentials to a database. Dictionary must be in the format laid 
+       out in the file parameters/db_creds_xxx.yaml and of type yaml.
+     - 'schema_path' (str): optional path to table schemas in the format
+       of parameters/table_schemas.yaml. Tables with a schema are created
+       with its column types and constraints before they are loaded.
+     - 'registry' (EngineRegistry): the registry the engine is taken 
+       from. Connectors with the same credentials share one engine and
+       connection pool. The credentials file may also set the pool with
+       the optional keys POOL_SIZE, MAX_OVERFLOW, POOL_TIMEOUT, 
+       POOL_PRE_PING and POOL_RECYCLE.
+
+    Attributes:
+     - watermark_table (str): name of the table in the associated 
+       database that holds the high-water mark of each incremental source.
+     - copy_null (str): the field written for missing values when
+       loading with COPY, distinct from an empty string.
     """
 
-    def __init__(self, cred_dict_path):
+    watermark_table = "etl_watermarks"
+    # Field written for missing values in the csv sent to COPY:
+    copy_null = "\\N"
+
+    # Optional credentials keys and the pool settings they set:
+    pool_keys = {"POOL_SIZE": "pool_size", "MAX_OVERFLOW": "max_overflow",
+                 "POOL_TIMEOUT": "pool_timeout", "POOL_PRE_PING": "pool_pre_ping",
+                 "POOL_RECYCLE": "pool_recycle"}
+
+    def __init__(self, cred_dict_path, schema_path=None, registry=None):
         """Class constructor.
         
         Uses private method '__read_db_creds()' to define attribute 
-        'cred_dict'. Subsequently uses this attribute to initialise an 
-        sqlalchemy engine linking it to the database specified in the 
-        credentials file.
+        'cred_dict'. The sqlalchemy engine linking it to the database 
+        specified in the credentials file is initialised from this 
+        attribute when 'engine' is first used.
         
         Attributes:
          - self.cred_dict_path (str): should be passed at initialisation. 
            See class docstring.
+         - self.schema_path (str): See class docstring. Default None.
+         - self.registry (EngineRegistry): See class docstring. Default
+           None uses the process-wide ENGINE_REGISTRY.
+         - self.schemas (dict): table schemas by table name, empty if no
+           'schema_path' is given.
          - self.cred_dict (dict): python dictionary of database credentials.
-         - self.engine (engine): sqlalchemy engine assigned when method 
-           'init_db_engine' is called.
+         - self.engine (engine): sqlalchemy engine created by method 
+           '__init_db_engine' when first used.
         """
         self.cred_dict_path = cred_dict_path
+        self.schema_path = schema_path
+        self.registry = registry
+        self.schemas = {}
+        if self.schema_path is not None:
+            self.schemas = load_config(self.schema_path)
         self.cred_dict = self.__read_db_creds()
-        self.engine = self.__init_db_engine()
+        self.__engine = None
+
+    @property
+    def engine(self):
+        """The sqlalchemy engine of the database, created on first use."""
+        if self.__engine is None:
+            self.__engine = self.__init_db_engine()
+        return(self.__engine)
 
     def __read_db_creds(self):
         """Returns the file ""db_creds.yaml"" as a python dictionary."""
-        with open(f'{self.cred_dict_path}', 'r') as cred_file:
-            cred_dict = yaml.safe_load(cred_file)
+        # Parsed once per process, and overridable by environment 
+        # variables such as MRDC_DB_CREDS_RDS__PASSWORD:
+        cred_dict = load_config(self.cred_dict_path)
         return cred_dict
         
     def __init_db_engine(self):
-        """Initialise and return an sqlalchemy 'engine' object.
+        """Return the shared sqlalchemy 'engine' object of the database.
         
         Arguments: 
          - None.
@@ -51,7 +98,9 @@ class DatabaseConnector:
         Returns:
          - sqlalchemy 'engine' object. 'engine' object is associated with the 
            database whose credentials were used to initialise the class and 
-           becomes an attribute of the class.
+           becomes an attribute of the class. It is created by the registry
+           on first use and shared with every connector of the same 
+           database and pool settings.
         """
         DATABASE_TYPE = 'postgresql'
         DBAPI = 'psycopg2'
@@ -60,13 +109,257 @@ class DatabaseConnector:
         PASSWORD = self.cred_dict["PASSWORD"]
         DATABASE = self.cred_dict["DATABASE"]
         PORT = self.cred_dict["PORT"]
-        engine = create_engine(f"{DATABASE_TYPE}+{DBAPI}://{USER}" + \
-                               f":{PASSWORD}@{HOST}:{PORT}/{DATABASE}")
-        self.engine = engine
+        # sqlalchemy is only imported once a connector is used:
+        from sqlalchemy import URL
+        from engine_registry import ENGINE_REGISTRY
+        if self.registry is None:
+            self.registry = ENGINE_REGISTRY
+        # URL.create quotes any special characters in the credentials:
+        url = URL.create(f"{DATABASE_TYPE}+{DBAPI}", username=USER,
+                         password=PASSWORD, host=HOST, port=PORT,
+                         database=DATABASE)
+        pool_options = {option: self.cred_dict[key] 
+                        for key, option in self.pool_keys.items()
+                        if key in self.cred_dict}
+        engine = self.registry.engine(url, **pool_options)
         return engine
     
-    def upload_to_db(self, df, table_name):
+    def __uuid_text(self, frame):
+        """Return a frame with any 16-byte binary UUID columns as text."""
+        uuid_columns = [name for name in frame.columns if is_binary_uuid(frame[name].dtype)]
+        if not uuid_columns:
+            return(frame)
+        return(frame.assign(**{name: binary_to_uuids(frame[name]) 
+                               for name in uuid_columns}))
+
+    def __copy_frame(self, cursor, frame, table_name, chunk_size):
+        """Stream a dataframe into a table with COPY FROM STDIN in csv chunks."""
+        columns = ", ".join(f'"{name}"' for name in frame.columns)
+        copy_sql = (f'COPY "{table_name}" ({columns}) FROM STDIN '
+                    f"WITH (FORMAT csv, NULL '{self.copy_null}')")
+        # Only one chunk of csv text is held in memory at a time. Missing
+        # values are written as the NULL marker, so empty strings are 
+        # loaded as empty strings, as they are by to_sql:
+        for start in range(0, len(frame), chunk_size):
+            buffer = StringIO()
+            chunk = self.__uuid_text(frame.iloc[start:start + chunk_size])
+            chunk.to_csv(buffer, header=False, index=False, na_rep=self.copy_null)
+            buffer.seek(0)
+            cursor.copy_expert(copy_sql, buffer)
+
+    def __upsert_frame(self, cursor, frame, table_name, key, chunk_size):
+        """COPY a dataframe into a staging table and merge it on 'key'."""
+        staging_name = f"{table_name}_staging"
+        cursor.execute(f'CREATE TEMP TABLE "{staging_name}" '
+                       f'(LIKE "{table_name}" INCLUDING DEFAULTS) ON COMMIT DROP')
+        self.__copy_frame(cursor, frame, staging_name, chunk_size)
+        columns = ", ".join(f'"{name}"' for name in frame.columns)
+        key_columns = ", ".join(f'"{name}"' for name in key)
+        updates = ", ".join(f'"{name}" = EXCLUDED."{name}"' 
+                            for name in frame.columns if name not in key)
+        conflict_action = f"DO UPDATE SET {updates}" if updates else "DO NOTHING"
+        cursor.execute(f'INSERT INTO "{table_name}" ({columns}) '
+                       f'SELECT {columns} FROM "{staging_name}" '
+                       f'ON CONFLICT ({key_columns}) {conflict_action}')
+
+    def __watermark_table_sql(self):
+        """Return the statement creating the watermark table if missing."""
+        return(f'CREATE TABLE IF NOT EXISTS "{self.watermark_table}" '
+               "(source VARCHAR(255) PRIMARY KEY, "
+               "watermark TEXT NOT NULL, "
+               "updated_at TIMESTAMP NOT NULL DEFAULT now())")
+
+    def __write_watermark(self, cursor, source, watermark):
+        """Insert or update the high-water mark of a source."""
+        cursor.execute(self.__watermark_table_sql())
+        cursor.execute(f'INSERT INTO "{self.watermark_table}" (source, watermark) '
+                       "VALUES (%s, %s) "
+                       "ON CONFLICT (source) DO UPDATE "
+                       "SET watermark = EXCLUDED.watermark, updated_at = now()",
+                       (source, str(watermark)))
+
+    def write_watermark(self, source, watermark, connection=None):
+        """Save the high-water mark of a source without uploading rows.
+
+        Arguments:
+         - source (str): The name the watermark is saved under.
+         - watermark (str): The new watermark.
+
+        Keyword Arguments:
+         - connection (sqlalchemy connection): A connection in a
+           transaction the watermark is saved in, so it only moves if the
+           transaction commits. Default None saves it in a transaction
+           of its own.
+
+        Returns:
+         - None.
+        """
+        if connection is None:
+            with self.engine.begin() as connection:
+                self.write_watermark(source, watermark, connection)
+            return
+        cursor = connection.connection.cursor()
+        self.__write_watermark(cursor, source, watermark)
+        cursor.close()
+
+    def read_watermark(self, source):
+        """Return the stored high-water mark of an incremental source.
+        
+        Arguments:
+         - source (str): The name the source's watermark was saved under.
+
+        Keyword Arguments:
+         - None.
+
+        Returns:
+         - watermark (str): The last watermark written for the source by
+           'upload_to_db', or None if the source has never been loaded.
+        """
+        from sqlalchemy import text
+        with self.engine.begin() as connection:
+            connection.execute(text(self.__watermark_table_sql()))
+            watermark = connection.execute(
+                text(f'SELECT watermark FROM "{self.watermark_table}" '
+                     "WHERE source = :source"),
+                {"source": source}).scalar()
+        return(watermark)
+
+    def __column_type(self, dtype):
+        """Return the PostgreSQL type of a column not typed by its schema."""
+        if is_binary_uuid(dtype):
+            return("UUID")
+        if pd.api.types.is_bool_dtype(dtype):
+            return("BOOLEAN")
+        if pd.api.types.is_integer_dtype(dtype):
+            return({1: "SMALLINT", 2: "SMALLINT", 4: "INTEGER"}.get(dtype.itemsize,
+                                                                  "BIGINT"))
+        if pd.api.types.is_float_dtype(dtype):
+            return("DOUBLE PRECISION")
+        if isinstance(dtype, pd.DatetimeTZDtype):
+            return("TIMESTAMP WITH TIME ZONE")
+        if pd.api.types.is_datetime64_dtype(dtype):
+            return("TIMESTAMP")
+        return("TEXT")
+
+    def __create_table_sql(self, frame, table_name, schema):
+        """Return the CREATE TABLE statement of a frame's table and schema."""
+        column_types = schema.get("columns", {})
+        not_null = set(schema.get("not_null", []))
+        definitions = [f'"{name}" {column_types.get(name) or self.__column_type(dtype)}'
+                       + (" NOT NULL" if name in not_null else "")
+                       for name, dtype in frame.dtypes.items()]
+        if schema.get("primary_key"):
+            key_columns = ", ".join(f'"{name}"' for name in schema["primary_key"])
+            definitions.append(f'CONSTRAINT "pk_{table_name}" '
+                               f'PRIMARY KEY ({key_columns})')
+        for name, reference in schema.get("foreign_keys", {}).items():
+            definitions.append(f'CONSTRAINT "fk_{table_name}_{name}" '
+                               f'FOREIGN KEY ("{name}") REFERENCES '
+                               f'"{reference["table"]}" ("{reference["column"]}")')
+        return(f'CREATE TABLE "{table_name}" ({", ".join(definitions)})')
+
+    def __constraint_sql(self, table_name, schema):
+        """Return the statements adding a schema's keys to a loaded table.
+
+        Foreign keys marked 'not_valid' are not checked against the rows
+        already loaded. Each foreign key column is also indexed.
+        """
+        statements = []
+        if schema.get("primary_key"):
+            key_columns = ", ".join(f'"{name}"' for name in schema["primary_key"])
+            statements.append(f'ALTER TABLE "{table_name}" ADD CONSTRAINT '
+                              f'"pk_{table_name}" PRIMARY KEY ({key_columns})')
+        for name, reference in schema.get("foreign_keys", {}).items():
+            statements.append(f'ALTER TABLE "{table_name}" ADD CONSTRAINT '
+                              f'"fk_{table_name}_{name}" FOREIGN KEY ("{name}") '
+                              f'REFERENCES "{reference["table"]}" ("{reference["column"]}")'
+                              + (" NOT VALID" if reference.get("not_valid") else ""))
+            statements.append(f'CREATE INDEX IF NOT EXISTS "ix_{table_name}_{name}" '
+                              f'ON "{table_name}" ("{name}")')
+        return(statements)
+
+    def __create_table(self, cursor, frame, table_name, if_exists, schema):
+        """Create a table with the final types and constraints of its schema.
+        
+        Returns True if the table was created, False if it already existed.
+        """
+        cursor.execute("SELECT 1 FROM information_schema.tables "
+                       "WHERE table_schema = current_schema() AND table_name = %s",
+                       (table_name,))
+        if cursor.fetchone() is not None:
+            if if_exists == "fail":
+                raise ValueError(f"Table '{table_name}' already exists.")
+            if if_exists != "replace":
+                return(False)
+            # CASCADE also drops foreign keys of other tables referencing
+            # this one; they are recreated when those tables are reloaded:
+            cursor.execute(f'DROP TABLE "{table_name}" CASCADE')
+        cursor.execute(self.__create_table_sql(frame, table_name, schema))
+        return(True)
+
+    def __bulk_load(self, frame, table_name, if_exists, key, chunk_size,
+                    watermark, schema, defer_constraints):
+        """Create the target table if needed and bulk load it in one transaction."""
+        with self.engine.begin() as connection:
+            table_action = "append" if if_exists == "upsert" else if_exists
+            created = False
+            if schema is not None:
+                cursor = connection.connection.cursor()
+                # Deferred keys are added once the rows are loaded:
+                table_schema = schema
+                if defer_constraints:
+                    table_schema = {name: value for name, value in schema.items()
+                                    if name not in ("primary_key", "foreign_keys")}
+                created = self.__create_table(cursor, frame, table_name,
+                                              table_action, table_schema)
+            else:
+                # Create (or replace) the table from the frame's column 
+                # types without inserting any rows:
+                self.__uuid_text(frame.head(0)).to_sql(table_name, connection,
+                                                       if_exists=table_action,
+                                                       index=False)
+                cursor = connection.connection.cursor()
+            if if_exists == "upsert":
+                # ON CONFLICT needs a unique constraint on the key. Add it
+                # as the primary key if the table does not have one yet:
+                cursor.execute("SELECT 1 FROM information_schema.table_constraints "
+                               "WHERE table_schema = current_schema() "
+                               "AND table_name = %s "
+                               "AND constraint_type = 'PRIMARY KEY'",
+                               (table_name,))
+                if cursor.fetchone() is None:
+                    key_columns = ", ".join(f'"{name}"' for name in key)
+                    cursor.execute(f'ALTER TABLE "{table_name}" '
+                                   f'ADD PRIMARY KEY ({key_columns})')
+                self.__upsert_frame(cursor, frame, table_name, key, chunk_size)
+            else:
+                self.__copy_frame(cursor, frame, table_name, chunk_size)
+            # Building the key indexes and checking the foreign keys once
+            # over the loaded rows is faster than maintaining them during
+            # the COPY:
+            if created and defer_constraints:
+                for statement in self.__constraint_sql(table_name, schema):
+                    cursor.execute(statement)
+            # Saving the watermark in the same transaction means it only 
+            # moves forward if the rows it covers were loaded:
+            if watermark is not None:
+                self.__write_watermark(cursor, *watermark)
+            cursor.close()
+
+    def upload_to_db(self, df, table_name, if_exists="fail", key=None,
+                     method="copy", chunk_size=100000, watermark=None,
+                     schema=None, defer_constraints=False):
         """Upload a DataFrame to the class-associated database.
+
+        By default the dataframe (including its index) is streamed into
+        PostgreSQL with COPY FROM STDIN in csv chunks, all within a single
+        transaction, so a failed upload leaves the database unchanged.
+        UUID columns compacted to binary by DtypePlanner are written as
+        UUID text, one chunk at a time. If the table has a schema, it is
+        created with the schema's final column types and constraints 
+        before the load, so no ALTER TABLE pass is needed afterwards.
+        Set 'method' to "to_sql" to use pandas' INSERT-based upload, 
+        e.g. for databases other than PostgreSQL.
         
         Arguments:
          - df (DataFrame): The dataframe to be uploaded.
@@ -74,9 +367,55 @@ class DatabaseConnector:
            should appear in the new database.
         
         Keyword Arguments:
-         - None.
+         - if_exists (str): What to do if the table already exists:
+           "fail", "replace", "append" or "upsert". "upsert" updates 
+           rows whose 'key' matches an existing row and inserts the rest.
+           Default "fail".
+         - key (list): Column names identifying a row for "upsert". The
+           table's primary key must be on these columns, or it is added
+           when the table has no primary key. Default None.
+         - method (str): "copy" or "to_sql". Default "copy".
+         - chunk_size (int): Number of rows sent per COPY. Default 100000.
+         - watermark (tuple): A (source, watermark) pair saved in the
+           same transaction as the upload, for incremental loads. Read 
+           it back with 'read_watermark'. Default None.
+         - schema (dict): Column types and constraints of the table, in
+           the format of one table of parameters/table_schemas.yaml. 
+           Default None uses the table's entry in 'schemas', if any,
+           with the copy method.
+         - defer_constraints (bool): Create the table without its primary
+           and foreign keys, and add them, with an index on each foreign
+           key column, after the rows are loaded in the same transaction.
+           Foreign keys marked 'not_valid' in the schema are not checked
+           against the loaded rows. Default False.
 
         Returns:
-         - None.
+         - load_stats (dict): The number of rows uploaded, the time taken
+           in seconds and the upload rate in rows per second.
          """
-        df.to_sql(f"{table_name}", self.engine)
\ No newline at end of file
+        if if_exists not in ("fail", "replace", "append", "upsert"):
+            raise ValueError(f"Unknown if_exists option '{if_exists}'.")
+        if if_exists == "upsert" and (not key or method != "copy"):
+            raise ValueError("'upsert' requires a 'key' and the copy method.")
+        if schema is None and method == "copy":
+            schema = self.schemas.get(table_name)
+        if (watermark is not None or schema is not None) and method != "copy":
+            raise ValueError("'watermark' and 'schema' require the copy method.")
+        start = time.perf_counter()
+        if method == "copy":
+            # Write the index as a column, labelled as to_sql would:
+            frame = df.reset_index()
+            self.__bulk_load(frame, f"{table_name}", if_exists, key, 
+                             chunk_size, watermark, schema, defer_constraints)
+        elif method == "to_sql":
+            self.__uuid_text(df).to_sql(f"{table_name}", self.engine, 
+                                        if_exists=if_exists)
+        else:
+            raise ValueError(f"Unknown upload method '{method}'.")
+        seconds = time.perf_counter() - start
+        load_stats = {"rows": len(df),
+                      "seconds": seconds,
+                      "rows_per_second": len(df) / seconds if seconds else 0.0}
+        print(f"Uploaded {load_stats['rows']} rows to {table_name} in "
+              f"{seconds:.2f}s ({load_stats['rows_per_second']:.0f} rows/s)")
+        return(load_stats)
@@ -1,9 +1,116 @@
+from business_metrics import BusinessMetrics
+from config_store import CONFIG_STORE
 from database_utils import DatabaseConnector
 from data_extraction import DataExtractor
 from data_cleaning import DataCleaning
+from dtype_planner import DtypePlanner
+from extraction_cache import ExtractionCache
+from http_cache import HttpCache
+from instrumentation import PipelineInstrumentation
+from partitioned_cleaning import PartitionedCleaning
+from pipeline_runner import PipelineRunner
+from rejects import RejectsSink
+from star_schema import StarSchemaBuilder
+import atexit
+import threading
 import pandas as pd
 
-Connector_RDS = DatabaseConnector("parameters/db_creds_rds.yaml")
-Connector_PG4 = DatabaseConnector("parameters/db_creds_pg4.yaml")
-Extractor_RDS = DataExtractor(Connector_RDS.engine)
-Cleaner = DataCleaning()
\ No newline at end of file
+# Parse and validate every parameter file up front; later loads are
+# served from memory until a file changes:
+CONFIG_STORE.load_all()
+
+
+def _dispose_engines():
+    """Close the pooled database connections, if any engines were made."""
+    from engine_registry import ENGINE_REGISTRY
+    ENGINE_REGISTRY.dispose()
+
+
+def _close_worker_pools():
+    """Shut down the worker processes of any pipeline objects built."""
+    for name in ["Extractor_RDS", "Partitioned_Cleaner"]:
+        if name in _objects:
+            _objects[name].close()
+
+
+# Close the pooled database connections and worker processes on shutdown:
+atexit.register(_dispose_engines)
+atexit.register(_close_worker_pools)
+
+# Set MRDC_INSTRUMENT=1 to time every extract, clean and load call:
+Instrumentation = PipelineInstrumentation(log_path="pipeline_calls.jsonl")
+atexit.register(Instrumentation.print_summary)
+
+# The pipeline objects are built when first used, rather than on import,
+# so importing db_main (as spawned worker processes do with the main
+# module) opens no engines or sessions. They are module attributes, e.g.
+# db_main.Connector_RDS, through the module __getattr__ below.
+BUILDERS = {
+    "Connector_RDS": lambda: Instrumentation.instrument(
+        DatabaseConnector("parameters/db_creds_rds.yaml")),
+    "Connector_PG4": lambda: Instrumentation.instrument(
+        DatabaseConnector("parameters/db_creds_pg4.yaml",
+                          schema_path="parameters/table_schemas.yaml")),
+    # Store API responses are revalidated or served from disk for a day:
+    "Http_Cache": lambda: HttpCache(),
+    "Extractor_RDS": lambda: Instrumentation.instrument(
+        DataExtractor(pipeline_object("Connector_RDS").engine,
+                      cache=ExtractionCache(),
+                      http_cache=pipeline_object("Http_Cache"))),
+    # Set MRDC_REJECTS=0 to drop rows without recording them:
+    "Rejects": lambda: RejectsSink(),
+    "Cleaner": lambda: Instrumentation.instrument(
+        DataCleaning(rejects=pipeline_object("Rejects"))),
+    # Cleans frames of 100000 rows or more across a pool of processes:
+    "Partitioned_Cleaner": lambda: Instrumentation.instrument(
+        PartitionedCleaning(rejects=pipeline_object("Rejects"))),
+    "Planner": lambda: Instrumentation.instrument(DtypePlanner()),
+    # Loads the star schema, adding its keys after the rows are loaded:
+    "Star_Builder": lambda: Instrumentation.instrument(
+        StarSchemaBuilder(pipeline_object("Connector_PG4"),
+                          rejects=pipeline_object("Rejects"))),
+    # Answers the questions of SQL/info_queries.txt from summary tables:
+    "Metrics": lambda: Instrumentation.instrument(
+        BusinessMetrics(pipeline_object("Connector_PG4"))),
+}
+_objects = {}
+_objects_lock = threading.RLock()
+
+
+def pipeline_object(name):
+    """Return a pipeline object of BUILDERS, building it on first use."""
+    with _objects_lock:
+        if name not in _objects:
+            _objects[name] = BUILDERS[name]()
+        return(_objects[name])
+
+
+def __getattr__(name):
+    """Return the pipeline objects as attributes of the module."""
+    if name in BUILDERS:
+        return(pipeline_object(name))
+    raise AttributeError(f"module '{__name__}' has no attribute '{name}'")
+
+
+def run_pipeline(tables=None):
+    """Extract, clean and load the given tables (default all) in parallel."""
+    runner = PipelineRunner({name: pipeline_object(name)
+                             for name in ["Connector_RDS", "Connector_PG4",
+                                          "Extractor_RDS", "Cleaner",
+                                          "Partitioned_Cleaner", "Planner",
+                                          "Star_Builder", "Metrics"]})
+    results = runner.run(tables)
+    # Save the rows each cleaning rule dropped and report the counts:
+    rejects = pipeline_object("Rejects")
+    rejects.flush()
+    rejects.print_summary()
+    # Report connection pool checkouts and waits per database:
+    from engine_registry import ENGINE_REGISTRY
+    ENGINE_REGISTRY.print_metrics()
+    # Report store API responses served from disk and bytes saved:
+    pipeline_object("Http_Cache").print_summary()
+    return(results)
+
+
+if __name__ == "__main__":
+    run_pipeline()
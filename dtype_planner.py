@@ -0,0 +1,215 @@
+import uuid
+import numpy as np
+import pandas as pd
+
+from config_store import load_config
+
+try:
+    import pyarrow
+    import pyarrow.compute
+except ImportError:
+    # Without pyarrow UUIDs are held as uuid.UUID objects and text as
+    # python strings.
+    pyarrow = None
+
+
+UUID_PATTERN = (r"^[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}"
+                r"-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}$")
+# Positions of the 32 hex digits in the 36 character text of a UUID:
+UUID_DIGIT_POSITIONS = np.array([position for position in range(36)
+                                 if position not in (8, 13, 18, 23)])
+# ASCII code of each hex digit, and the value of each hex digit by its
+# ASCII code:
+HEX_DIGITS = np.frombuffer(b"0123456789abcdef", dtype=np.uint8)
+HEX_VALUES = np.zeros(256, dtype=np.uint8)
+HEX_VALUES[np.frombuffer(b"0123456789abcdef", dtype=np.uint8)] = np.arange(16)
+HEX_VALUES[np.frombuffer(b"ABCDEF", dtype=np.uint8)] = np.arange(10, 16)
+# Integer widths tried, narrowest first:
+INTEGER_DTYPES = ["int8", "int16", "int32", "int64"]
+
+
+def is_binary_uuid(dtype):
+    """Return True if a dtype is the 16-byte binary used for UUIDs."""
+    return(pyarrow is not None
+           and isinstance(dtype, pd.ArrowDtype)
+           and dtype.pyarrow_dtype == pyarrow.binary(16))
+
+
+def uuids_to_binary(uuids):
+    """Return a series of UUID strings as 16-byte binary values.
+
+    Every non-missing value must already match UUID_PATTERN.
+    """
+    valid = uuids.notna().to_numpy(bool)
+    text = uuids[valid].to_numpy(dtype="U36").astype("S36")
+    digits = HEX_VALUES[text.view(np.uint8).reshape(-1, 36)[:, UUID_DIGIT_POSITIONS]]
+    packed = np.zeros((len(uuids), 16), dtype=np.uint8)
+    packed[valid] = (digits[:, 0::2] << 4) | digits[:, 1::2]
+    array = pyarrow.FixedSizeBinaryArray.from_buffers(
+        pyarrow.binary(16), len(uuids), [None, pyarrow.py_buffer(packed.tobytes())])
+    if not valid.all():
+        array = pyarrow.compute.if_else(pyarrow.array(valid), array,
+                                        pyarrow.scalar(None, pyarrow.binary(16)))
+    return(pd.Series(pd.arrays.ArrowExtensionArray(array), index=uuids.index,
+                     name=uuids.name))
+
+
+def binary_to_uuids(column):
+    """Return a series of 16-byte binary UUIDs as their 36 character text."""
+    array = pyarrow.array(column.array)
+    # Columns joined by pd.concat or read in chunks hold several arrays:
+    if isinstance(array, pyarrow.ChunkedArray):
+        array = array.combine_chunks()
+    packed = np.frombuffer(array.buffers()[1], dtype=np.uint8,
+                           count=16 * len(array), offset=16 * array.offset)
+    packed = packed.reshape(-1, 16)
+    text = np.full((len(array), 36), ord("-"), dtype=np.uint8)
+    text[:, UUID_DIGIT_POSITIONS[0::2]] = HEX_DIGITS[packed >> 4]
+    text[:, UUID_DIGIT_POSITIONS[1::2]] = HEX_DIGITS[packed & 15]
+    uuids = pd.Series(text.view("S36").ravel().astype("U36"), dtype="string",
+                      index=column.index, name=column.name)
+    return(uuids.mask(column.isna()))
+
+
+class DtypePlanner:
+    """Contains methods for storing cleaned frames in compact dtypes.
+
+    The cleaners leave most columns as the defaults of convert_dtypes(),
+    so text is held as python strings and integers as 64-bit. Before a
+    frame is uploaded, 'optimise' moves each column to the most compact
+    dtype that still loads into its target type in
+    parameters/table_schemas.yaml (taken from SQL/formatting_queries.txt):
+
+     - UUID columns become 16-byte binary (or uuid.UUID objects without
+       pyarrow). DatabaseConnector writes them back out as UUID text.
+     - Text columns with few distinct values, such as country codes or
+       store types, become category.
+     - Other text becomes pyarrow-backed strings, if pyarrow is installed.
+     - Integers become the narrowest width that holds their values.
+
+    Columns not in the schema are planned from their values alone, with
+    columns named "...uuid" treated as UUIDs. Columns whose values do not
+    fit their target type, e.g. malformed UUIDs, are left as they are.
+
+    Public Methods:
+     - plan(frame, table_name)
+     - optimise(frame, table_name)
+
+    Instance Variables:
+     - schema_path (str): Path to the table schemas. Default
+       "parameters/table_schemas.yaml".
+     - category_threshold (float): The largest ratio of distinct values
+       to rows for which a text column becomes category. Default 0.5.
+
+    Attributes:
+     - schemas (dict): The parsed table schemas.
+     - savings (dict): Memory in bytes before and after each optimised
+       table, by table name.
+    """
+
+    def __init__(self, schema_path="parameters/table_schemas.yaml",
+                 category_threshold=0.5):
+        """Initialise the DtypePlanner instance.
+
+        Keyword Arguments:
+         - schema_path (str): See class docstring.
+         - category_threshold (float): See class docstring.
+        """
+        self.schema_path = schema_path
+        self.category_threshold = category_threshold
+        self.schemas = load_config(self.schema_path)
+        self.savings = {}
+
+    def __is_text(self, column):
+        """Return True if a column holds only strings and missing values."""
+        if isinstance(column.dtype, pd.StringDtype):
+            return(True)
+        return(column.dtype == object
+               and pd.api.types.infer_dtype(column, skipna=True) == "string")
+
+    def __integer_dtype(self, column):
+        """Return the narrowest integer dtype holding a column's values."""
+        values = column.dropna()
+        if values.empty:
+            return(None)
+        low, high = values.min(), values.max()
+        for dtype in INTEGER_DTYPES:
+            if np.iinfo(dtype).min <= low and high <= np.iinfo(dtype).max:
+                break
+        # Missing values need the nullable dtype:
+        return(dtype.capitalize() if column.hasnans else dtype)
+
+    def __plan_column(self, column, sql_type):
+        """Return the compact dtype of a column, or None to leave it as is."""
+        if isinstance(column.dtype, pd.CategoricalDtype) or is_binary_uuid(column.dtype):
+            return(None)
+        if (pd.api.types.is_integer_dtype(column.dtype)
+                and not pd.api.types.is_bool_dtype(column.dtype)):
+            dtype = self.__integer_dtype(column)
+            return(None if dtype == str(column.dtype) else dtype)
+        if not self.__is_text(column):
+            return(None)
+        if sql_type == "UUID" or (sql_type is None and str(column.name).endswith("uuid")):
+            if column.dropna().str.fullmatch(UUID_PATTERN).all():
+                return("binary16" if pyarrow is not None else "uuid")
+        values = column.dropna()
+        if len(values) and values.nunique() / len(values) <= self.category_threshold:
+            return("category")
+        if pyarrow is not None and column.dtype != "string[pyarrow]":
+            return("string[pyarrow]")
+        return(None)
+
+    def plan(self, frame, table_name=None):
+        """Return the compact dtype chosen for each column of a frame.
+
+        Arguments:
+         - frame (DataFrame): A cleaned dataframe.
+
+        Keyword Arguments:
+         - table_name (str): The table the frame will be uploaded to,
+           whose target types are used. Default None plans from the
+           values alone.
+
+        Returns:
+         - plan (dict): The new dtype of each column that changes, e.g.
+           {"country_code": "category", "user_uuid": "binary16"}.
+        """
+        sql_types = self.schemas.get(table_name, {}).get("columns", {})
+        plan = {}
+        for name in frame.columns:
+            dtype = self.__plan_column(frame[name], sql_types.get(name))
+            if dtype is not None:
+                plan[name] = dtype
+        return(plan)
+
+    def __convert(self, column, dtype):
+        """Convert a column to a planned dtype."""
+        if dtype == "binary16":
+            return(uuids_to_binary(column))
+        if dtype == "uuid":
+            return(column.map(uuid.UUID, na_action="ignore").astype(object))
+        return(column.astype(dtype))
+
+    def optimise(self, frame, table_name=None):
+        """Convert a frame to its planned dtypes and report the memory saved.
+
+        Arguments:
+         - frame (DataFrame): A cleaned dataframe.
+
+        Keyword Arguments:
+         - table_name (str): See 'plan'. Default None.
+
+        Returns:
+         - frame (DataFrame): A copy of the frame with compact dtypes.
+        """
+        before = int(frame.memory_usage(index=True, deep=True).sum())
+        plan = self.plan(frame, table_name)
+        frame = frame.assign(**{name: self.__convert(frame[name], dtype)
+                                for name, dtype in plan.items()})
+        after = int(frame.memory_usage(index=True, deep=True).sum())
+        label = table_name or "frame"
+        self.savings[label] = {"before": before, "after": after}
+        saved = 1 - after / before if before else 0.0
+        print(f"Compacted {label}: {before / 2**20:.1f} MiB -> "
+              f"{after / 2**20:.1f} MiB ({saved:.0%} saved)")
+        return(frame)
@@ -0,0 +1,183 @@
+import threading
+import time
+import pandas as pd
+
+
+# Pool settings of every engine unless overridden. Connections are
+# tested before use and replaced after 30 minutes, which outlives the
+# idle timeouts of managed databases such as RDS:
+POOL_DEFAULTS = {"pool_size": 5,
+                 "max_overflow": 10,
+                 "pool_timeout": 30,
+                 "pool_pre_ping": True,
+                 "pool_recycle": 1800}
+# The pool class of server engines, defined by '_timed_queue_pool' when
+# the first one is created:
+_TimedQueuePool = None
+
+
+def _timed_queue_pool():
+    """Return the _TimedQueuePool class, defining it on first use.
+
+    It subclasses sqlalchemy's QueuePool, so sqlalchemy is only imported
+    once an engine is created rather than with the registry.
+    """
+    global _TimedQueuePool
+    if _TimedQueuePool is not None:
+        return(_TimedQueuePool)
+    from sqlalchemy.pool import QueuePool
+
+    class TimedQueuePool(QueuePool):
+        """A QueuePool reporting how long each checkout took to get a connection.
+
+        The time includes waiting for a free connection and opening a new
+        one. 'on_checkout' is kept when the pool is recreated by dispose().
+        """
+
+        on_checkout = None
+
+        def _do_get(self):
+            start = time.perf_counter()
+            try:
+                return(super()._do_get())
+            finally:
+                if self.on_checkout is not None:
+                    self.on_checkout(time.perf_counter() - start)
+
+        def recreate(self):
+            pool = super().recreate()
+            pool.on_checkout = self.on_checkout
+            return(pool)
+
+    _TimedQueuePool = TimedQueuePool
+    return(_TimedQueuePool)
+
+
+class EngineRegistry:
+    """Contains methods for sharing one pooled engine per database.
+
+    'engine' returns the same sqlalchemy engine for every caller with the
+    same database URL (including its credentials) and pool settings, so
+    several connectors, extractors and pipelines in one process share one
+    connection pool per database instead of opening one each. Engines of
+    server databases get a QueuePool with the settings of POOL_DEFAULTS,
+    overridden per registry or per engine, and record for each engine the
+    number of checkouts and the seconds spent getting a connection.
+
+    Public Methods:
+     - engine(url, **pool_options)
+     - dispose()
+     - metrics()
+     - print_metrics()
+
+    Instance Variables:
+     - pool_options (dict): Pool settings of every engine, over those of
+       POOL_DEFAULTS. Default None.
+
+    Attributes:
+     - engines (dict): The engines created, by registry key.
+    """
+
+    def __init__(self, pool_options=None):
+        """Initialise the EngineRegistry instance.
+
+        Keyword Arguments:
+         - pool_options (dict): See class docstring.
+        """
+        self.pool_options = {**POOL_DEFAULTS, **(pool_options or {})}
+        self.engines = {}
+        self.__metrics = {}
+        self.__lock = threading.Lock()
+
+    def __record_checkout(self, key, seconds):
+        """Add one checkout and its wait to the metrics of an engine."""
+        with self.__lock:
+            metrics = self.__metrics[key]
+            metrics["checkouts"] += 1
+            metrics["wait_seconds"] += seconds
+            metrics["max_wait_seconds"] = max(metrics["max_wait_seconds"], seconds)
+
+    def engine(self, url, **pool_options):
+        """Return the shared engine of a database, creating it on first use.
+
+        Arguments:
+         - url (str or URL): The sqlalchemy database URL.
+
+        Keyword Arguments:
+         - Pool settings of this engine, over those of the registry, e.g.
+           pool_size=10. Ignored for sqlite, whose engines are not pooled
+           this way.
+
+        Returns:
+         - engine (sqlalchemy engine object): The shared engine.
+        """
+        from sqlalchemy import create_engine
+        from sqlalchemy.engine import make_url
+        url = make_url(url)
+        options = {**self.pool_options, **pool_options}
+        key = (url.render_as_string(hide_password=False),
+               tuple(sorted(options.items())))
+        with self.__lock:
+            if key in self.engines:
+                return(self.engines[key])
+            if url.get_backend_name() == "sqlite":
+                engine = create_engine(url)
+            else:
+                engine = create_engine(url, poolclass=_timed_queue_pool(), **options)
+                engine.pool.on_checkout = lambda seconds: self.__record_checkout(key, seconds)
+            self.engines[key] = engine
+            self.__metrics[key] = {"checkouts": 0, "wait_seconds": 0.0,
+                                   "max_wait_seconds": 0.0}
+            return(engine)
+
+    def dispose(self):
+        """Close the pooled connections of every engine.
+
+        The engines stay usable and open new connections when next used,
+        so this is safe to call at shutdown or between pipeline runs.
+        """
+        with self.__lock:
+            engines = list(self.engines.values())
+        for engine in engines:
+            engine.dispose()
+
+    def metrics(self):
+        """Return a DataFrame of the pool metrics of each engine.
+
+        Arguments:
+         - None.
+
+        Keyword Arguments:
+         - None.
+
+        Returns:
+         - metrics (DataFrame): Per engine (by URL without password):
+           checkouts, total, mean and largest seconds to get a connection,
+           and connections currently checked out and idle in the pool.
+        """
+        rows = []
+        with self.__lock:
+            items = [(key, engine, dict(self.__metrics[key]))
+                     for key, engine in self.engines.items()]
+        for key, engine, metrics in items:
+            # sqlalchemy is already imported once there are engines:
+            from sqlalchemy.pool import QueuePool
+            pool = engine.pool
+            queued = isinstance(pool, QueuePool)
+            rows.append({"engine": engine.url.render_as_string(hide_password=True),
+                         **metrics,
+                         "mean_wait_seconds": (metrics["wait_seconds"] / metrics["checkouts"]
+                                               if metrics["checkouts"] else 0.0),
+                         "checked_out": pool.checkedout() if queued else None,
+                         "idle": pool.checkedin() if queued else None})
+        return(pd.DataFrame(rows))
+
+    def print_metrics(self):
+        """Print the pool metrics, if any engines were created."""
+        metrics = self.metrics()
+        if not metrics.empty:
+            print(metrics.to_string(index=False))
+
+
+# The registry shared by every DatabaseConnector of the process:
+ENGINE_REGISTRY = EngineRegistry()
@@ -0,0 +1,184 @@
+import hashlib
+import json
+import os
+import threading
+import time
+import pandas as pd
+
+try:
+    import pyarrow
+except ImportError:
+    # Without pyarrow every entry is stored as a pickle.
+    pyarrow = None
+
+
+class ExtractionCache:
+    """Contains methods for caching raw extracted DataFrames on disk.
+
+    Each entry is keyed by a hash of its source identity (e.g. the
+    extraction method and its arguments) and stored as Parquet, read back
+    through a memory map. Raw frames that Arrow cannot store, such as
+    object columns mixing numbers and strings, are pickled instead.
+
+    An entry is served only if it is younger than the TTL and its
+    validator (e.g. an S3 ETag, HTTP Last-Modified header or source row
+    count) matches the validator of the source now. When the cache grows
+    past its size limit, the least recently used entries are evicted.
+
+    Public Methods:
+     - get(source, validator)
+     - put(source, validator, data)
+     - clear()
+
+    Instance Variables:
+     - cache_dir (str): Directory the entries are saved to. Default
+       "archive_data/cache".
+     - ttl_seconds (float): Age after which entries are re-extracted
+       even if their validator matches. Default None never expires.
+     - max_bytes (int): Size limit of the cache. Default 2 GiB.
+
+    Attributes:
+     - hits (int): Number of entries served from the cache.
+     - misses (int): Number of lookups that had to re-extract.
+    """
+
+    def __init__(self, cache_dir="archive_data/cache", ttl_seconds=None,
+                 max_bytes=2 * 1024**3):
+        """Initialise the ExtractionCache instance.
+
+        Keyword Arguments:
+         - cache_dir (str): See class docstring.
+         - ttl_seconds (float): See class docstring.
+         - max_bytes (int): See class docstring.
+        """
+        self.cache_dir = cache_dir
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.__lock = threading.Lock()
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def __key(self, source):
+        """Return the hex digest identifying a source."""
+        identity = json.dumps(source, sort_keys=True, default=str)
+        return(hashlib.sha256(identity.encode()).hexdigest())
+
+    def __paths(self, key):
+        """Return the data and metadata paths of an entry."""
+        base = os.path.join(self.cache_dir, key)
+        return(f"{base}.data", f"{base}.json")
+
+    def __read_metadata(self, metadata_path):
+        """Return an entry's metadata, or None if it is missing."""
+        try:
+            with open(metadata_path, "r") as file:
+                return(json.load(file))
+        except (FileNotFoundError, json.JSONDecodeError):
+            return(None)
+
+    def __write_metadata(self, metadata_path, metadata):
+        """Write an entry's metadata atomically."""
+        with open(f"{metadata_path}.tmp", "w") as file:
+            json.dump(metadata, file)
+        os.replace(f"{metadata_path}.tmp", metadata_path)
+
+    def get(self, source, validator=None):
+        """Return a cached DataFrame if the entry is fresh and valid.
+
+        Arguments:
+         - source (dict or str): Identity of the extracted source.
+
+        Keyword Arguments:
+         - validator (str): Current validator of the source, compared with
+           the one saved with the entry. Default None skips the check.
+
+        Returns:
+         - data (DataFrame): The cached frame, or None on a miss.
+        """
+        data_path, metadata_path = self.__paths(self.__key(source))
+        metadata = self.__read_metadata(metadata_path)
+        fresh = (metadata is not None
+                 and (self.ttl_seconds is None
+                      or time.time() - metadata["created"] < self.ttl_seconds)
+                 and (validator is None
+                      or metadata["validator"] == str(validator)))
+        if not fresh or not os.path.exists(data_path):
+            with self.__lock:
+                self.misses += 1
+            return(None)
+        if metadata["format"] == "parquet":
+            data = pd.read_parquet(data_path, memory_map=True)
+        else:
+            data = pd.read_pickle(data_path)
+        metadata["last_access"] = time.time()
+        self.__write_metadata(metadata_path, metadata)
+        with self.__lock:
+            self.hits += 1
+        return(data)
+
+    def put(self, source, validator, data):
+        """Save a DataFrame to the cache, evicting old entries if needed.
+
+        Arguments:
+         - source (dict or str): Identity of the extracted source.
+         - validator (str): Current validator of the source, or None.
+         - data (DataFrame): The raw extracted frame.
+
+        Keyword Arguments:
+         - None.
+
+        Returns:
+         - None.
+        """
+        data_path, metadata_path = self.__paths(self.__key(source))
+        temporary_path = f"{data_path}.tmp"
+        data_format = "pickle"
+        if pyarrow is not None:
+            try:
+                data.to_parquet(temporary_path)
+                data_format = "parquet"
+            except (pyarrow.ArrowException, ValueError, TypeError):
+                pass
+        if data_format == "pickle":
+            data.to_pickle(temporary_path)
+        os.replace(temporary_path, data_path)
+        now = time.time()
+        self.__write_metadata(metadata_path, {
+            "source": json.loads(json.dumps(source, default=str)),
+            "validator": None if validator is None else str(validator),
+            "format": data_format,
+            "created": now,
+            "last_access": now,
+            "size": os.path.getsize(data_path)})
+        self.__evict()
+
+    def __evict(self):
+        """Delete least recently used entries until under the size limit."""
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if name.endswith(".json"):
+                metadata_path = os.path.join(self.cache_dir, name)
+                metadata = self.__read_metadata(metadata_path)
+                if metadata is not None:
+                    entries.append((metadata["last_access"], metadata["size"],
+                                    metadata_path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, metadata_path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            self.__remove(metadata_path)
+            total -= size
+
+    def __remove(self, metadata_path):
+        """Delete an entry's data and metadata files."""
+        data_path = metadata_path[:-len(".json")] + ".data"
+        for path in (data_path, metadata_path):
+            if os.path.exists(path):
+                os.remove(path)
+
+    def clear(self):
+        """Delete every entry in the cache."""
+        for name in os.listdir(self.cache_dir):
+            if name.endswith(".json"):
+                self.__remove(os.path.join(self.cache_dir, name))
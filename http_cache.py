@@ -0,0 +1,158 @@
+import hashlib
+import json
+import os
+import threading
+import time
+
+
+class HttpCache:
+    """Contains methods for caching API responses with conditional requests.
+
+    Each response body is saved to disk with its ETag and Last-Modified
+    validators, keyed by a hash of the URL and request headers (e.g. the
+    API key of headers_dict.yaml), so the headers themselves are never
+    written to disk. When the URL is requested again, the validators are
+    sent as If-None-Match and If-Modified-Since headers, and a
+    304 Not Modified response is answered from the saved body without
+    downloading it again.
+
+    Responses without validators are served from disk without any request
+    until they are older than the TTL, then downloaded again.
+
+    Public Methods:
+     - get(url, headers, session)
+     - summary()
+     - print_summary()
+     - clear()
+
+    Instance Variables:
+     - cache_dir (str): Directory the responses are saved to. Default
+       "archive_data/cache/http".
+     - ttl_seconds (float): Age after which responses without validators
+       are downloaded again. Default one day.
+
+    Attributes:
+     - hits (int): Number of requests answered from the cache, either
+       without a request or by a 304 response.
+     - not_modified (int): Number of the hits answered by a 304 response.
+     - misses (int): Number of responses downloaded in full.
+     - bytes_downloaded (int): Response bytes downloaded on misses.
+     - bytes_saved (int): Response bytes served from the cache on hits.
+    """
+
+    def __init__(self, cache_dir="archive_data/cache/http", ttl_seconds=24 * 3600):
+        """Initialise the HttpCache instance.
+
+        Keyword Arguments:
+         - cache_dir (str): See class docstring.
+         - ttl_seconds (float): See class docstring.
+        """
+        self.cache_dir = cache_dir
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.not_modified = 0
+        self.misses = 0
+        self.bytes_downloaded = 0
+        self.bytes_saved = 0
+        self.__lock = threading.Lock()
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def __path(self, url, headers):
+        """Return the path of the entry of a URL and request headers."""
+        identity = json.dumps({"url": url, "headers": headers or {}}, sort_keys=True)
+        key = hashlib.sha256(identity.encode()).hexdigest()
+        return(os.path.join(self.cache_dir, f"{key}.json"))
+
+    def __read_entry(self, path):
+        """Return a saved response, or None if it is missing."""
+        try:
+            with open(path, "r") as file:
+                return(json.load(file))
+        except (FileNotFoundError, json.JSONDecodeError):
+            return(None)
+
+    def __write_entry(self, path, entry):
+        """Write a saved response atomically."""
+        with open(f"{path}.tmp", "w") as file:
+            json.dump(entry, file)
+        os.replace(f"{path}.tmp", path)
+
+    def __count(self, counter, body_bytes):
+        """Add a hit or miss and its bytes to the counters."""
+        with self.__lock:
+            if counter == "miss":
+                self.misses += 1
+                self.bytes_downloaded += body_bytes
+            else:
+                self.hits += 1
+                self.bytes_saved += body_bytes
+                if counter == "not_modified":
+                    self.not_modified += 1
+
+    def get(self, url, headers=None, session=None):
+        """Return the body of a GET request, from the cache if unchanged.
+
+        Arguments:
+         - url (str): The URL requested.
+
+        Keyword Arguments:
+         - headers (dict): Request headers, part of the cache key.
+           Default None.
+         - session (requests Session): Session the request is sent with,
+           e.g. one that retries failed requests. Default None uses
+           requests.get.
+
+        Returns:
+         - body (str): The response body.
+        """
+        if session is None:
+            import requests
+            session = requests
+        path = self.__path(url, headers)
+        entry = self.__read_entry(path)
+        validators = {}
+        if entry is not None:
+            if entry["etag"] is not None:
+                validators["If-None-Match"] = entry["etag"]
+            if entry["last_modified"] is not None:
+                validators["If-Modified-Since"] = entry["last_modified"]
+            # Without validators a response can only be trusted until it
+            # is older than the TTL:
+            if (not validators
+                    and time.time() - entry["fetched"] < self.ttl_seconds):
+                self.__count("hit", len(entry["body"].encode()))
+                return(entry["body"])
+        response = session.get(url, headers={**(headers or {}), **validators})
+        if entry is not None and validators and response.status_code == 304:
+            self.__count("not_modified", len(entry["body"].encode()))
+            return(entry["body"])
+        response.raise_for_status()
+        self.__count("miss", len(response.content))
+        self.__write_entry(path, {"url": url,
+                                  "etag": response.headers.get("ETag"),
+                                  "last_modified": response.headers.get("Last-Modified"),
+                                  "fetched": time.time(),
+                                  "body": response.text})
+        return(response.text)
+
+    def summary(self):
+        """Return the hit, miss and byte counters as a dictionary."""
+        with self.__lock:
+            return({"hits": self.hits,
+                    "not_modified": self.not_modified,
+                    "misses": self.misses,
+                    "bytes_downloaded": self.bytes_downloaded,
+                    "bytes_saved": self.bytes_saved})
+
+    def print_summary(self):
+        """Print the counters, if any requests were made."""
+        summary = self.summary()
+        if summary["hits"] or summary["misses"]:
+            print("HTTP cache: " + ", ".join(f"{name} {value}"
+                                             for name, value in summary.items()))
+
+    def clear(self):
+        """Delete every saved response."""
+        for name in os.listdir(self.cache_dir):
+            if name.endswith(".json"):
+                os.remove(os.path.join(self.cache_dir, name))
@@ -0,0 +1,163 @@
+import json
+import pandas as pd
+
+
+class IncrementalLoader:
+    """Contains methods for loading only new source data on each run.
+
+    Each source has a high-water mark saved in the target database by
+    DatabaseConnector.upload_to_db, in the same transaction as the rows
+    it covers. A run extracts only the rows beyond the mark, cleans them
+    with the DataCleaning instance, compacts them with the DtypePlanner
+    if one is given, and appends them to the target table through the
+    StarSchemaBuilder, so they get the same key checks as a full load:
+    orders with orphan keys are quarantined rather than aborting the
+    load. The cost of a run follows the size of the delta rather than
+    the size of the source. Given a BusinessMetrics instance, the summary
+    tables are then brought up to date from the delta alone.
+
+    Public Methods:
+     - load_orders(source_table, table_name)
+     - load_events(web_address, file_path, table_name)
+
+    Instance Variables:
+     - extractor (DataExtractor): extracts from the source database.
+     - cleaner (DataCleaning): cleans the extracted rows.
+     - connector (DatabaseConnector): connects to the target database,
+       where both the loaded rows and the watermarks are stored.
+     - builder (StarSchemaBuilder): loads the rows, checking their keys.
+       Default None builds one on 'connector'.
+     - planner (DtypePlanner): Optional planner compacting the rows
+       before they are loaded. Default None.
+     - metrics (BusinessMetrics): Optional summary tables refreshed
+       after each load. Default None.
+
+    Attributes:
+     - As instance variables.
+    """
+
+    def __init__(self, extractor, cleaner, connector, builder=None,
+                 planner=None, metrics=None):
+        """Initialise the IncrementalLoader instance.
+
+        Arguments:
+         - extractor (DataExtractor): See class docstring.
+         - cleaner (DataCleaning): See class docstring.
+         - connector (DatabaseConnector): See class docstring.
+
+        Keyword Arguments:
+         - builder (StarSchemaBuilder): See class docstring.
+         - planner (DtypePlanner): See class docstring.
+         - metrics (BusinessMetrics): See class docstring.
+        """
+        if builder is None:
+            from star_schema import StarSchemaBuilder
+            builder = StarSchemaBuilder(connector)
+        self.extractor = extractor
+        self.cleaner = cleaner
+        self.connector = connector
+        self.builder = builder
+        self.planner = planner
+        self.metrics = metrics
+
+    def __compact(self, frame, table_name):
+        """Return a cleaned frame in its planned dtypes, if there is a planner."""
+        if self.planner is None:
+            return(frame)
+        return(self.planner.optimise(frame, table_name))
+
+    def load_orders(self, source_table="orders_table", table_name="orders_table"):
+        """Append orders added to the source table since the last run.
+
+        The watermark is the largest 'index' value loaded so far, and the
+        filter on it is applied by the source database.
+
+        Arguments:
+         - None.
+
+        Keyword Arguments:
+         - source_table (str): The orders table in the source database.
+           Default "orders_table".
+         - table_name (str): The orders table in the target database.
+           Default "orders_table".
+
+        Returns:
+         - new_rows (int): The number of order rows appended, after
+           orders with orphan keys are quarantined.
+        """
+        source = f"rds:{source_table}"
+        last_index = self.connector.read_watermark(source)
+        if last_index is None:
+            order_data = self.extractor.read_rds_table(source_table)
+        else:
+            order_data = self.extractor.read_rds_table(
+                source_table,
+                where='"index" > :last_index',
+                params={"last_index": int(last_index)})
+        if order_data.empty:
+            print(f"No new rows in {source_table}.")
+            return(0)
+        # Take the watermark before cleaning so rows dropped by the
+        # cleaner are not extracted again next run:
+        new_index = int(order_data["index"].max())
+        order_data = self.__compact(self.cleaner.clean_order_data(order_data),
+                                    table_name)
+        load_stats = self.builder.load_fact(order_data, table_name,
+                                            if_exists="append",
+                                            watermark=(source, new_index))
+        # Only the appended orders are added to the sales summaries:
+        if self.metrics is not None:
+            self.metrics.refresh(orders=order_data,
+                                 watermark=(source, last_index, new_index))
+        return(load_stats["rows"])
+
+    def load_events(self, web_address, file_path, table_name="dim_datetimes"):
+        """Append sales events added to the S3 json file since the last run.
+
+        The watermark records the version of the json object (its ETag
+        and modification time) and the largest event index loaded. The
+        version is read from the object's metadata before anything is
+        downloaded, so an unchanged object is skipped without extracting
+        it. Otherwise only events beyond the index are cleaned and
+        appended.
+
+        Arguments:
+         - web_address (str): The web address of the events json file.
+         - file_path (str): Where the downloaded json file is saved.
+
+        Keyword Arguments:
+         - table_name (str): The events table in the target database.
+           Default "dim_datetimes".
+
+        Returns:
+         - new_rows (int): The number of event rows appended.
+        """
+        source = f"s3:{web_address}"
+        watermark = self.connector.read_watermark(source)
+        watermark = json.loads(watermark) if watermark else {"version": None,
+                                                             "max_index": -1}
+        version = self.extractor.s3_object_version(web_address)
+        if version == watermark.get("version"):
+            print(f"{web_address} is unchanged since the last run.")
+            return(0)
+        events_data = self.extractor.extract_json_from_s3(web_address, file_path)
+        max_index = (int(events_data.index.max()) if len(events_data)
+                     else watermark["max_index"])
+        new_watermark = json.dumps({"version": version, "max_index": max_index})
+        events_data = events_data[events_data.index > watermark["max_index"]]
+        if events_data.empty:
+            # The version is still saved, so the object is not downloaded
+            # again until it changes:
+            self.connector.write_watermark(source, new_watermark)
+            print(f"No new events in {web_address}.")
+            return(0)
+        events_data = self.__compact(self.cleaner.clean_events_data(events_data),
+                                     table_name)
+        load_stats = self.builder.load_dimension(events_data, table_name,
+                                                 if_exists="append",
+                                                 watermark=(source, new_watermark))
+        # New events add no orders, so only the summaries of the
+        # dimension tables are rebuilt:
+        if self.metrics is not None:
+            self.metrics.refresh(orders=pd.DataFrame())
+        return(load_stats["rows"])
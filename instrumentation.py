@@ -0,0 +1,191 @@
+from functools import wraps
+import inspect
+import json
+import os
+import sys
+import threading
+import time
+import pandas as pd
+
+try:
+    import resource
+except ImportError:
+    # 'resource' is unix-only; peak RSS is not recorded elsewhere.
+    resource = None
+
+
+class PipelineInstrumentation:
+    """Contains methods for timing the public methods of pipeline objects.
+
+    'instrument' wraps every public method of a DataExtractor,
+    DataCleaning or DatabaseConnector instance (or any other object) so
+    each call records its wall time, CPU time, growth in peak RSS, and
+    the rows and bytes of the DataFrames passed in and returned. Records
+    are appended to a JSON lines log as they happen and can be summarised
+    per method at the end of a run.
+
+    As the PipelineRunner runs stages on threads, CPU time is that of the
+    calling thread only, so concurrent stages are not charged for each
+    other; work a call hands to other threads or worker processes is not
+    counted. Peak RSS can only be read for the whole process, so its
+    growth during a call ("process_peak_rss_delta_bytes") includes any
+    calls running at the same time.
+
+    When disabled, 'instrument' returns objects unchanged, so there is
+    no overhead at all. It is enabled by passing enabled=True or by
+    setting the environment variable MRDC_INSTRUMENT=1.
+
+    Public Methods:
+     - instrument(obj)
+     - summary()
+     - print_summary()
+
+    Instance Variables:
+     - log_path (str): Path of the JSON lines log. Default None keeps
+       records in memory only.
+     - enabled (bool): Whether objects are instrumented.
+
+    Attributes:
+     - records (list): One dictionary per instrumented call.
+    """
+
+    def __init__(self, log_path=None, enabled=None):
+        """Initialise the PipelineInstrumentation instance.
+
+        Keyword Arguments:
+         - log_path (str): See class docstring. Default None.
+         - enabled (bool): See class docstring. Default None reads the
+           MRDC_INSTRUMENT environment variable.
+        """
+        if enabled is None:
+            enabled = os.environ.get("MRDC_INSTRUMENT", "0") not in ("", "0")
+        self.log_path = log_path
+        self.enabled = enabled
+        self.records = []
+        self.__lock = threading.Lock()
+
+    def __peak_rss(self):
+        """Return the peak resident set size of the process in bytes."""
+        if resource is None:
+            return(None)
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux reports kilobytes, macOS bytes:
+        return(peak if sys.platform == "darwin" else peak * 1024)
+
+    def __frame_size(self, values):
+        """Return the total rows and shallow bytes of any DataFrames given."""
+        frames = [value for value in values if isinstance(value, pd.DataFrame)]
+        if not frames:
+            return(None, None)
+        rows = sum(len(frame) for frame in frames)
+        size = sum(int(frame.memory_usage(index=True).sum()) for frame in frames)
+        return(rows, size)
+
+    def __record(self, record):
+        """Store a call record and append it to the log."""
+        with self.__lock:
+            self.records.append(record)
+            if self.log_path is not None:
+                with open(self.log_path, "a") as log:
+                    log.write(json.dumps(record) + "\n")
+
+    def __wrap(self, owner, name, method):
+        """Return 'method' wrapped to record each call."""
+        @wraps(method)
+        def instrumented(*args, **kwargs):
+            rows_in, bytes_in = self.__frame_size(list(args) + list(kwargs.values()))
+            rss_before = self.__peak_rss()
+            wall_start = time.perf_counter()
+            cpu_start = time.thread_time()
+            error = None
+            try:
+                result = method(*args, **kwargs)
+                return(result)
+            except Exception as exception:
+                error = type(exception).__name__
+                result = None
+                raise
+            finally:
+                wall_seconds = time.perf_counter() - wall_start
+                cpu_seconds = time.thread_time() - cpu_start
+                rss_after = self.__peak_rss()
+                rows_out, bytes_out = self.__frame_size([result])
+                self.__record({
+                    "timestamp": time.time(),
+                    "class": owner,
+                    "method": name,
+                    "wall_seconds": wall_seconds,
+                    "cpu_seconds": cpu_seconds,
+                    "process_peak_rss_delta_bytes": (None if rss_before is None
+                                                     else rss_after - rss_before),
+                    "rows_in": rows_in,
+                    "rows_out": rows_out,
+                    "bytes_in": bytes_in,
+                    "bytes_out": bytes_out,
+                    "error": error})
+        return(instrumented)
+
+    def instrument(self, obj):
+        """Wrap the public methods of an object to record every call.
+
+        Arguments:
+         - obj (object): The object to instrument, e.g. a DataCleaning
+           instance. Its methods are replaced on the instance only.
+
+        Keyword Arguments:
+         - None.
+
+        Returns:
+         - obj (object): The same object, instrumented if enabled.
+        """
+        if not self.enabled:
+            return(obj)
+        owner = type(obj).__name__
+        for name in dir(obj):
+            # Properties are skipped, so lazily created attributes such as
+            # DatabaseConnector.engine are not created here:
+            if name.startswith("_") or isinstance(getattr(type(obj), name, None), property):
+                continue
+            method = getattr(obj, name)
+            # Only methods, and functions set on the instance such as the
+            # cleaning methods of PartitionedCleaning, are wrapped. Other
+            # callables, e.g. PartitionedCleaning.cleaner_class, are left
+            # alone so they still pickle to worker processes:
+            if inspect.ismethod(method) or inspect.isfunction(method):
+                setattr(obj, name, self.__wrap(owner, name, method))
+        return(obj)
+
+    def summary(self):
+        """Return a DataFrame of call records totalled per method.
+
+        Arguments:
+         - None.
+
+        Keyword Arguments:
+         - None.
+
+        Returns:
+         - summary (DataFrame): calls, wall and thread CPU seconds, largest
+           growth in the process's peak RSS, and rows and bytes in and out
+           per class and method, slowest first.
+        """
+        if not self.records:
+            return(pd.DataFrame())
+        records = pd.DataFrame(self.records)
+        summary = records.groupby(["class", "method"]).agg(
+            calls=("wall_seconds", "size"),
+            wall_seconds=("wall_seconds", "sum"),
+            cpu_seconds=("cpu_seconds", "sum"),
+            process_peak_rss_delta_bytes=("process_peak_rss_delta_bytes", "max"),
+            rows_in=("rows_in", "sum"),
+            rows_out=("rows_out", "sum"),
+            bytes_in=("bytes_in", "sum"),
+            bytes_out=("bytes_out", "sum"),
+            errors=("error", "count"))
+        return(summary.sort_values("wall_seconds", ascending=False))
+
+    def print_summary(self):
+        """Print the summary table, if any calls were recorded."""
+        summary = self.summary()
+        if not summary.empty:
+            print(summary.to_string())
@@ -0,0 +1,240 @@
+from concurrent.futures import ProcessPoolExecutor
+from functools import wraps
+from multiprocessing import shared_memory
+import multiprocessing
+import os
+import threading
+import numpy as np
+import pandas as pd
+
+from data_cleaning import DataCleaning
+from rejects import RejectsSink
+
+try:
+    import pyarrow
+except ImportError:
+    # Without pyarrow every partition is pickled to its worker.
+    pyarrow = None
+
+
+def _read_shared_partition(memory_name, size, start, stop):
+    """Return rows start:stop of a frame saved as Arrow in shared memory."""
+    # Workers share the parent's resource tracker, so attaching here does
+    # not hand ownership of the block to this process:
+    memory = shared_memory.SharedMemory(name=memory_name)
+    view = memory.buf[:size]
+    try:
+        table = pyarrow.ipc.open_stream(pyarrow.py_buffer(view)).read_all()
+        # Take (rather than slice) copies the rows out of the block, as
+        # to_pandas could otherwise return views of it:
+        partition = table.take(np.arange(start, stop))
+        del table
+    finally:
+        view.release()
+        memory.close()
+    return(partition.to_pandas())
+
+
+def _clean_partition(cleaner_class, method_name, source, kwargs, rejects):
+    """Run a cleaning method on one partition in a worker process.
+
+    'source' is either a pickled DataFrame or the (name, size, start,
+    stop) of a partition of a frame in shared memory. 'kwargs' are the
+    keyword arguments of the cleaning method. If 'rejects' is an (empty)
+    RejectsSink, the cleaner records the partition's rejects in it and
+    it is returned with the cleaned partition.
+    """
+    if not isinstance(source, pd.DataFrame):
+        source = _read_shared_partition(*source)
+    if rejects is None:
+        return(getattr(cleaner_class(), method_name)(source, **kwargs), None)
+    cleaned = getattr(cleaner_class(rejects=rejects), method_name)(source, **kwargs)
+    return(cleaned, rejects)
+
+
+class PartitionedCleaning:
+    """Contains methods for running DataCleaning methods in a process pool.
+
+    Every public cleaning method of 'cleaner_class' is available on the
+    instance under the same name. Frames of at least 'min_rows' rows are
+    split into contiguous row partitions, one per worker, and each is
+    cleaned by the same method in a separate process. The cleaned
+    partitions are concatenated in order, so the result is the same as
+    the serial run:
+
+     - Columns whose dtypes differ between partitions (e.g. inferred by
+       convert_dtypes from different values) are inferred again on the
+       whole result.
+     - Methods in 'renumbered' are renumbered 0..n-1 over the whole
+       result, as they are over the whole frame when run serially.
+
+    The input frame is written once to shared memory as an Arrow IPC
+    stream, which the workers read their rows from without pickling.
+    Frames Arrow cannot store, such as raw columns mixing numbers and
+    strings, are pickled to the workers in partitions instead.
+
+    The worker processes are started on the first partitioned call and
+    reused by later calls until 'close' is called.
+
+    If a RejectsSink is given, each worker records the rejects of its 
+    partition in a sink of its own, which is merged into 'rejects' in
+    partition order.
+
+    Public Methods:
+     - clean(method_name, data, **kwargs)
+     - close()
+     - The cleaning methods of 'cleaner_class', e.g. clean_user_data(data).
+
+    Instance Variables:
+     - cleaner_class (class): The cleaning class run in the workers.
+       Default DataCleaning.
+     - max_workers (int): Worker processes, and partitions per frame.
+       Default None uses one per CPU.
+     - min_rows (int): Frames with fewer rows are cleaned serially in
+       this process. Default 100000.
+     - start_method (str): multiprocessing start method of the workers.
+       Default "spawn", which is safe alongside the threads of the
+       PipelineRunner.
+     - rejects (RejectsSink): Sink for the rows dropped by the cleaning
+       rules, passed to 'cleaner_class'. Default None.
+
+    Attributes:
+     - renumbered (dict): Name of the renumbered index, by the methods
+       whose result index is renumbered.
+    """
+
+    renumbered = {"clean_card_data": "Index"}
+
+    def __init__(self, cleaner_class=DataCleaning, max_workers=None,
+                 min_rows=100000, start_method="spawn", rejects=None):
+        """Initialise the PartitionedCleaning instance.
+
+        Keyword Arguments:
+         - cleaner_class (class): See class docstring.
+         - max_workers (int): See class docstring.
+         - min_rows (int): See class docstring.
+         - start_method (str): See class docstring.
+         - rejects (RejectsSink): See class docstring.
+        """
+        self.cleaner_class = cleaner_class
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.min_rows = min_rows
+        self.start_method = start_method
+        self.rejects = rejects
+        self.__pool = None
+        self.__lock = threading.Lock()
+        # Expose each public cleaning method under its own name:
+        for name in dir(self.cleaner_class):
+            if name.startswith("clean_"):
+                setattr(self, name, self.__partitioned_method(name))
+
+    def __partitioned_method(self, method_name):
+        """Return a partitioned version of a cleaning method."""
+        @wraps(getattr(self.cleaner_class, method_name))
+        def partitioned(data, **kwargs):
+            return(self.clean(method_name, data, **kwargs))
+        return(partitioned)
+
+    def __worker_pool(self):
+        """Return the process pool, starting it on first use."""
+        with self.__lock:
+            if self.__pool is None:
+                self.__pool = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=multiprocessing.get_context(self.start_method))
+            return(self.__pool)
+
+    def close(self):
+        """Shut down the worker processes, if they were started."""
+        with self.__lock:
+            if self.__pool is not None:
+                self.__pool.shutdown()
+                self.__pool = None
+
+    def __bounds(self, rows):
+        """Return the (start, stop) rows of each partition."""
+        partitions = min(self.max_workers, rows)
+        edges = [rows * number // partitions for number in range(partitions + 1)]
+        return(list(zip(edges[:-1], edges[1:])))
+
+    def __shared_frame(self, data):
+        """Write a frame to shared memory as Arrow, or return None if it can't be."""
+        if pyarrow is None:
+            return(None)
+        try:
+            table = pyarrow.Table.from_pandas(data, preserve_index=True)
+        except (pyarrow.ArrowException, ValueError, TypeError):
+            return(None)
+        sink = pyarrow.BufferOutputStream()
+        with pyarrow.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+        stream = sink.getvalue()
+        memory = shared_memory.SharedMemory(create=True, size=max(stream.size, 1))
+        try:
+            memory.buf[:stream.size] = memoryview(stream).cast("B")
+        except BaseException:
+            memory.close()
+            memory.unlink()
+            raise
+        return(memory, stream.size)
+
+    def __combine(self, method_name, parts):
+        """Concatenate cleaned partitions as the serial run would return them."""
+        non_empty = [part for part in parts if len(part)] or parts[:1]
+        combined = pd.concat(non_empty)
+        for name in combined.columns:
+            if len({str(part[name].dtype) for part in non_empty}) > 1:
+                combined[name] = combined[name].convert_dtypes()
+        if method_name in self.renumbered:
+            combined.reset_index(inplace=True, drop=True)
+            combined.index.rename(self.renumbered[method_name], inplace=True)
+        return(combined)
+
+    def clean(self, method_name, data, **kwargs):
+        """Run a cleaning method over row partitions of a frame in parallel.
+
+        Arguments:
+         - method_name (str): The name of the cleaning method, e.g.
+           "clean_user_data".
+         - data (DataFrame): The frame to be cleaned.
+
+        Keyword Arguments:
+         - Keyword arguments of the cleaning method, e.g. 
+           check_numbers="flag" for clean_card_data.
+
+        Returns:
+         - data (DataFrame): The cleaned frame.
+        """
+        # Iterables of chunks (see clean_events_data) are cleaned serially
+        # as they are read:
+        if (not isinstance(data, pd.DataFrame) or len(data) < self.min_rows
+                or self.max_workers == 1):
+            cleaner = (self.cleaner_class() if self.rejects is None
+                       else self.cleaner_class(rejects=self.rejects))
+            return(getattr(cleaner, method_name)(data, **kwargs))
+        bounds = self.__bounds(len(data))
+        shared = self.__shared_frame(data)
+        if shared is None:
+            sources = [data.iloc[start:stop] for start, stop in bounds]
+        else:
+            memory, size = shared
+            sources = [(memory.name, size, start, stop) for start, stop in bounds]
+        # An empty sink with the same settings for each worker:
+        rejects = (None if self.rejects is None
+                   else RejectsSink(self.rejects.rejects_dir, self.rejects.enabled,
+                                    self.rejects.keep_rows))
+        try:
+            results = list(self.__worker_pool().map(_clean_partition,
+                                                    [self.cleaner_class] * len(sources),
+                                                    [method_name] * len(sources),
+                                                    sources,
+                                                    [kwargs] * len(sources),
+                                                    [rejects] * len(sources)))
+        finally:
+            if shared is not None:
+                memory.close()
+                memory.unlink()
+        for _, partition_rejects in results:
+            if partition_rejects is not None:
+                self.rejects.merge(partition_rejects)
+        return(self.__combine(method_name, [part for part, _ in results]))
@@ -0,0 +1,197 @@
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+import time
+
+from config_store import load_config
+
+
+class PipelineRunner:
+    """Contains methods for running the table pipelines in parallel.
+
+    The pipeline config (parameters/pipeline.yaml) defines, for each
+    table, a chain of stages (extract, clean, load) that each call a
+    method of a named pipeline object. Together the tables form a DAG of
+    tasks: a stage depends on the previous stage of its table and on any
+    tasks listed under 'after'. Tasks run on a pool of worker threads as
+    soon as their dependencies finish, so independent tables (the card
+    pdf, the store API and the S3 downloads) overlap and the wall time
+    of a run is close to that of the slowest table.
+
+    Public Methods:
+     - tasks(tables)
+     - run(tables)
+
+    Instance Variables:
+     - objects (dict): Pipeline objects by the name used in the config,
+       e.g. {"Cleaner": DataCleaning(), ...}.
+     - config_path (str): Path to the pipeline config. Default
+       "parameters/pipeline.yaml".
+     - max_workers (int): The maximum number of tasks run at once.
+       Default 6, one per table.
+
+    Attributes:
+     - config (dict): The parsed pipeline config.
+     - timings (dict): Wall seconds of each task of the last run.
+    """
+
+    def __init__(self, objects, config_path="parameters/pipeline.yaml",
+                 max_workers=6):
+        """Initialise the PipelineRunner instance.
+
+        Arguments:
+         - objects (dict): See class docstring.
+
+        Keyword Arguments:
+         - config_path (str): See class docstring.
+         - max_workers (int): See class docstring.
+        """
+        self.objects = objects
+        self.config_path = config_path
+        self.max_workers = max_workers
+        self.config = load_config(self.config_path)
+        self.timings = {}
+
+    def tasks(self, tables=None):
+        """Return the task DAG of the given tables.
+
+        Arguments:
+         - None.
+
+        Keyword Arguments:
+         - tables (list): Names of the tables to run. Default None runs
+           every table in the config.
+
+        Returns:
+         - tasks (dict): Task definitions by task name
+           ("<table>.<stage>"). Each has the config keys of its stage,
+           plus 'input' (the previous stage of its table, or None) and
+           'depends_on' (all tasks that must finish first).
+
+        Raises a ValueError if a task depends on a task not in the run,
+        or if the dependencies of the tasks form a cycle.
+        """
+        tables = list(self.config) if tables is None else tables
+        tasks = {}
+        for table in tables:
+            previous = None
+            for stage, definition in self.config[table].items():
+                name = f"{table}.{stage}"
+                depends_on = list(definition.get("after", []))
+                if previous is not None:
+                    depends_on.append(previous)
+                tasks[name] = dict(definition, input=previous, depends_on=depends_on)
+                previous = name
+        # Check every dependency is part of the run:
+        for name, task in tasks.items():
+            missing = [other for other in task["depends_on"] if other not in tasks]
+            if missing:
+                raise ValueError(f"Task '{name}' depends on {missing}, "
+                                 "which are not in this run.")
+        # Check the dependencies form no cycle, whose tasks would wait on
+        # each other for ever. Tasks are removed once all they depend on
+        # has been, which leaves only the tasks on or after a cycle:
+        waiting_on = {name: set(task["depends_on"]) for name, task in tasks.items()}
+        while True:
+            ready = [name for name, waits in waiting_on.items() if not waits]
+            if not ready:
+                break
+            for name in ready:
+                del waiting_on[name]
+            for waits in waiting_on.values():
+                waits.difference_update(ready)
+        if waiting_on:
+            raise ValueError(f"Tasks {sorted(waiting_on)} depend on each other "
+                             "in a cycle.")
+        return(tasks)
+
+    def __call_task(self, task, input_data):
+        """Call a task's method with its input and configured arguments."""
+        object_name, method_name = task["call"].split(".")
+        method = getattr(self.objects[object_name], method_name)
+        args = list(task.get("args", []))
+        if task["input"] is not None:
+            args.insert(0, input_data)
+        return(method(*args, **task.get("kwargs", {})))
+
+    def __timed_task(self, name, task, input_data):
+        """Run a task and record its wall time."""
+        start = time.perf_counter()
+        try:
+            return(self.__call_task(task, input_data))
+        finally:
+            self.timings[name] = time.perf_counter() - start
+
+    def run(self, tables=None):
+        """Run the pipelines of the given tables.
+
+        If a task fails, the tasks depending on it are skipped but
+        independent tables carry on. The failures are raised together
+        once nothing else can run.
+
+        Arguments:
+         - None.
+
+        Keyword Arguments:
+         - tables (list): Names of the tables to run. Default None runs
+           every table in the config.
+
+        Returns:
+         - results (dict): The output of the last stage of each table,
+           by table name.
+        """
+        tasks = self.tasks(tables)
+        waiting_on = {name: set(task["depends_on"]) for name, task in tasks.items()}
+        dependents = {name: [other for other, task in tasks.items()
+                             if name in task["depends_on"]] for name in tasks}
+        last_stages = {name.split(".")[0]: name for name in tasks}
+        outputs = {}
+        failures = {}
+        self.timings = {}
+        run_start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            running = {}
+
+            def submit_ready():
+                for name in [name for name, waits in waiting_on.items() if not waits]:
+                    del waiting_on[name]
+                    task = tasks[name]
+                    future = pool.submit(self.__timed_task, name, task,
+                                         outputs.get(task["input"]))
+                    running[future] = name
+
+            def skip_dependents(name):
+                for other in dependents[name]:
+                    if other in waiting_on:
+                        del waiting_on[other]
+                        failures[other] = f"skipped, '{name}' failed"
+                        skip_dependents(other)
+
+            submit_ready()
+            while running:
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = running.pop(future)
+                    if future.exception() is not None:
+                        failures[name] = repr(future.exception())
+                        skip_dependents(name)
+                        continue
+                    outputs[name] = future.result()
+                    # Dependents skipped after another of their
+                    # dependencies failed are no longer waiting:
+                    for other in dependents[name]:
+                        if other in waiting_on:
+                            waiting_on[other].discard(name)
+                    # Release stage outputs once every task using them 
+                    # has started, keeping the last stage of each table:
+                    for finished in list(outputs):
+                        if (finished not in last_stages.values()
+                                and not any(other in waiting_on 
+                                            for other in dependents[finished])):
+                            del outputs[finished]
+                submit_ready()
+        print(f"Pipeline finished in {time.perf_counter() - run_start:.2f}s")
+        for name, seconds in sorted(self.timings.items(), key=lambda item: -item[1]):
+            print(f"  {name:<24} {seconds:8.2f}s")
+        if failures:
+            raise RuntimeError("Pipeline tasks failed: " + "; ".join(
+                f"{name}: {reason}" for name, reason in failures.items()))
+        return({table: outputs.get(name) for table, name in last_stages.items()})
@@ -0,0 +1,225 @@
+import os
+import threading
+import pandas as pd
+
+from dtype_planner import binary_to_uuids, is_binary_uuid
+
+try:
+    import pyarrow
+except ImportError:
+    # Without pyarrow the rejected rows are saved as pickles.
+    pyarrow = None
+
+
+class RejectsSink:
+    """Contains methods for keeping the rows dropped by cleaning rules.
+
+    Each rule that drops rows in DataCleaning is named "<source>.<rule>",
+    e.g. "stores.continent". For every application of a rule, 'record'
+    adds to the rule's counts of rows checked and rejected and its time
+    in seconds, and keeps a copy of the rejected rows, labelled with the
+    rule name. 'flush' writes the rejected rows of each source to
+    '<rejects_dir>/<source>.parquet' and clears them from memory.
+
+    Rejected rows are selected by the same boolean mask that keeps the
+    other rows, so recording them costs one extra indexing per rule.
+    When disabled, nothing is recorded; with keep_rows=False only the
+    counts and times are. It is disabled by passing enabled=False or by
+    setting the environment variable MRDC_REJECTS=0.
+
+    Public Methods:
+     - record(rule, data, keep, seconds)
+     - merge(other)
+     - rejects(source)
+     - flush()
+     - summary()
+     - print_summary()
+
+    Instance Variables:
+     - rejects_dir (str): Directory the rejected rows are written to.
+       Default "archive_data/rejects".
+     - enabled (bool): Whether rules are recorded.
+     - keep_rows (bool): Whether rejected rows are kept, as well as
+       counted. Default True.
+
+    Attributes:
+     - counts (dict): Rows checked and rejected and seconds taken, by
+       rule name.
+    """
+
+    def __init__(self, rejects_dir="archive_data/rejects", enabled=None,
+                 keep_rows=True):
+        """Initialise the RejectsSink instance.
+
+        Keyword Arguments:
+         - rejects_dir (str): See class docstring.
+         - enabled (bool): See class docstring. Default None reads the
+           MRDC_REJECTS environment variable, enabled unless it is "0".
+         - keep_rows (bool): See class docstring.
+        """
+        if enabled is None:
+            enabled = os.environ.get("MRDC_REJECTS", "1") != "0"
+        self.rejects_dir = rejects_dir
+        self.enabled = enabled
+        self.keep_rows = keep_rows
+        self.counts = {}
+        self.__rows = {}
+        # Files written by this sink, which later flushes append to:
+        self.__written = set()
+        self.__lock = threading.Lock()
+
+    def __getstate__(self):
+        """Return the picklable state, e.g. to return a sink from a worker."""
+        state = self.__dict__.copy()
+        del state["_RejectsSink__lock"]
+        return(state)
+
+    def __setstate__(self, state):
+        """Restore a pickled sink with a new lock."""
+        self.__dict__.update(state)
+        self.__lock = threading.Lock()
+
+    def __add(self, rule, checked, rejected, seconds, rows):
+        """Add to a rule's counts and keep its rejected rows. Needs the lock."""
+        counts = self.counts.setdefault(rule, {"checked": 0, "rejected": 0,
+                                               "seconds": 0.0})
+        counts["checked"] += checked
+        counts["rejected"] += rejected
+        counts["seconds"] += seconds
+        if rows is not None and len(rows):
+            self.__rows.setdefault(rule.split(".")[0], []).append(rows)
+
+    def record(self, rule, data, keep, seconds):
+        """Record one application of a rule that drops rows.
+
+        Arguments:
+         - rule (str): The rule name, "<source>.<rule>".
+         - data (DataFrame): The rows the rule was applied to.
+         - keep (ndarray): Boolean mask of the rows the rule kept.
+         - seconds (float): Time taken to apply the rule.
+
+        Keyword Arguments:
+         - None.
+
+        Returns:
+         - None.
+        """
+        if not self.enabled:
+            return
+        rejected = len(keep) - int(keep.sum())
+        rows = None
+        if self.keep_rows and rejected:
+            rows = data[~keep].assign(rule=rule)
+        with self.__lock:
+            self.__add(rule, len(keep), rejected, seconds, rows)
+
+    def merge(self, other):
+        """Add the counts and rejected rows of another sink to this one.
+
+        Arguments:
+         - other (RejectsSink): e.g. a sink returned by a worker process.
+
+        Keyword Arguments:
+         - None.
+
+        Returns:
+         - None.
+        """
+        with self.__lock:
+            for rule, counts in other.counts.items():
+                self.__add(rule, counts["checked"], counts["rejected"],
+                           counts["seconds"], None)
+            for source, frames in other.__rows.items():
+                self.__rows.setdefault(source, []).extend(frames)
+
+    def rejects(self, source):
+        """Return the rejected rows of a source not yet flushed.
+
+        Arguments:
+         - source (str): The source part of the rule names, e.g. "stores".
+
+        Keyword Arguments:
+         - None.
+
+        Returns:
+         - rejects (DataFrame): The rejected rows with a 'rule' column,
+           or an empty frame if there are none.
+        """
+        with self.__lock:
+            frames = list(self.__rows.get(source, []))
+        if not frames:
+            return(pd.DataFrame())
+        return(pd.concat(frames))
+
+    def __as_text(self, frame):
+        """Return a frame of rejected rows as text, with UUIDs decoded."""
+        # Binary UUIDs of planned frames are not valid UTF-8, so they are
+        # written as their 36 character text:
+        binary = [name for name, dtype in frame.dtypes.items() if is_binary_uuid(dtype)]
+        if binary:
+            frame = frame.assign(**{name: binary_to_uuids(frame[name]) for name in binary})
+        return(frame.astype("string"))
+
+    def flush(self):
+        """Write the rejected rows of each source to file and clear them.
+
+        Rows are written as text, as rejected values are often of mixed
+        types, and binary UUIDs as their 36 character text. The first
+        flush of a source replaces the file of any earlier run; later
+        flushes append to it.
+
+        Arguments:
+         - None.
+
+        Keyword Arguments:
+         - None.
+
+        Returns:
+         - paths (list): The files written.
+        """
+        with self.__lock:
+            rows, self.__rows = self.__rows, {}
+        os.makedirs(self.rejects_dir, exist_ok=True)
+        paths = []
+        for source, frames in rows.items():
+            rejects = pd.concat([self.__as_text(frame) for frame in frames])
+            extension = "parquet" if pyarrow is not None else "pkl"
+            path = os.path.join(self.rejects_dir, f"{source}.{extension}")
+            if path in self.__written:
+                previous = (pd.read_parquet(path) if pyarrow is not None
+                            else pd.read_pickle(path))
+                rejects = pd.concat([previous, rejects])
+            if pyarrow is not None:
+                rejects.to_parquet(path)
+            else:
+                rejects.to_pickle(path)
+            self.__written.add(path)
+            paths.append(path)
+        return(paths)
+
+    def summary(self):
+        """Return a DataFrame of the counts and times of each rule.
+
+        Arguments:
+         - None.
+
+        Keyword Arguments:
+         - None.
+
+        Returns:
+         - summary (DataFrame): Rows checked and rejected, the rejected
+           fraction and seconds taken by each rule.
+        """
+        with self.__lock:
+            summary = pd.DataFrame.from_dict(self.counts, orient="index")
+        if summary.empty:
+            return(summary)
+        summary.index.rename("rule", inplace=True)
+        summary.insert(2, "rejected_fraction", summary.rejected / summary.checked)
+        return(summary.sort_index())
+
+    def print_summary(self):
+        """Print the summary table, if any rules were recorded."""
+        summary = self.summary()
+        if not summary.empty:
+            print(summary.to_string())
@@ -0,0 +1,234 @@
+import time
+import numpy as np
+import pandas as pd
+
+from dtype_planner import binary_to_uuids, is_binary_uuid
+
+
+class StarSchemaBuilder:
+    """Contains methods for loading the star schema with checked keys.
+
+    Tables are loaded through a DatabaseConnector with schemas (see
+    parameters/table_schemas.yaml), created without their primary and
+    foreign keys, which are added with an index on each foreign key column
+    once the rows are loaded (see DatabaseConnector.upload_to_db), so the
+    COPY does not check them row by row.
+
+    Before loading, 'load_dimension' drops the rows of a dimension table
+    with a missing or repeated primary key, which would stop the key
+    being added, and keeps the distinct keys. 'load_fact' then checks each
+    foreign key column of a fact table against the keys of the table it
+    references: those loaded by this builder, or else those read from the
+    database. Each distinct key of the column is looked up once, and the
+    rows are matched by their codes, so a column of tens of millions of
+    rows is hashed only once.
+
+    Rows with orphan keys are either quarantined, i.e. dropped and
+    recorded in the RejectsSink as rule "<table>.orphan_<column>", or
+    reported and loaded, in which case the foreign key is added NOT VALID
+    so existing rows are not checked.
+
+    Public Methods:
+     - load_dimension(frame, table_name, **upload_kwargs)
+     - orphans(frame, table_name)
+     - load_fact(frame, table_name, **upload_kwargs)
+
+    Instance Variables:
+     - connector (DatabaseConnector): Connector of the target database,
+       with the table schemas.
+     - on_orphans (str): "quarantine" or "report". Default "quarantine".
+     - rejects (RejectsSink): Optional sink of the rows dropped. Default
+       None only counts them.
+
+    Attributes:
+     - keys (dict): The distinct primary keys of each dimension table
+       loaded, as text, by table name. Those of tables appended to are
+       dropped, and read from the database when next needed.
+     - orphan_counts (dict): Rows with an orphan key in each foreign key
+       column checked, by "<table>.<column>".
+    """
+
+    def __init__(self, connector, on_orphans="quarantine", rejects=None):
+        """Initialise the StarSchemaBuilder instance.
+
+        Arguments:
+         - connector (DatabaseConnector): See class docstring.
+
+        Keyword Arguments:
+         - on_orphans (str): See class docstring.
+         - rejects (RejectsSink): See class docstring.
+        """
+        if on_orphans not in ("quarantine", "report"):
+            raise ValueError(f"Unknown on_orphans option '{on_orphans}'.")
+        self.connector = connector
+        self.on_orphans = on_orphans
+        self.rejects = rejects
+        self.keys = {}
+        self.orphan_counts = {}
+
+    def __schema(self, table_name):
+        """Return the schema of a table, which must have one."""
+        schema = self.connector.schemas.get(table_name)
+        if schema is None:
+            raise ValueError(f"Table '{table_name}' has no schema.")
+        return(schema)
+
+    def __column(self, frame, name):
+        """Return a column of a frame, which may be an index level."""
+        if name in frame.columns:
+            return(frame[name])
+        return(pd.Series(frame.index.get_level_values(name), index=frame.index))
+
+    def __key_codes(self, column, sql_type):
+        """Return the code of each value of a key column and its distinct values.
+
+        Missing values get code -1. The distinct values are returned as
+        text, lower case for UUIDs, to compare with the keys of other
+        tables whatever their dtype.
+        """
+        if isinstance(column.dtype, pd.CategoricalDtype):
+            codes = column.cat.codes.to_numpy()
+            uniques = pd.Series(column.cat.categories)
+        else:
+            codes, uniques = pd.factorize(column)
+            uniques = pd.Series(uniques)
+        if is_binary_uuid(uniques.dtype):
+            uniques = binary_to_uuids(uniques)
+        uniques = uniques.astype(str)
+        if sql_type == "UUID":
+            uniques = uniques.str.lower()
+        return(codes, pd.Index(uniques))
+
+    def __drop_rows(self, frame, rule, keep, seconds):
+        """Return the kept rows of a frame, recording the others."""
+        if self.rejects is not None:
+            self.rejects.record(rule, frame, keep, seconds)
+        if keep.all():
+            return(frame)
+        return(frame[keep])
+
+    def load_dimension(self, frame, table_name, **upload_kwargs):
+        """Upload a dimension table after dropping rows with bad keys.
+
+        Arguments:
+         - frame (DataFrame): The cleaned dimension table.
+         - table_name (str): The table name, with a primary key in its
+           schema.
+
+        Keyword Arguments:
+         - Passed on to DatabaseConnector.upload_to_db, e.g.
+           if_exists="replace".
+
+        Returns:
+         - load_stats (dict): As returned by upload_to_db.
+        """
+        schema = self.__schema(table_name)
+        key_columns = schema.get("primary_key", [])
+        if len(key_columns) == 1:
+            start = time.perf_counter()
+            key = key_columns[0]
+            codes, uniques = self.__key_codes(self.__column(frame, key),
+                                              schema.get("columns", {}).get(key))
+            # The first row of each key is kept:
+            first = np.zeros(len(codes), dtype=bool)
+            present = codes >= 0
+            first[np.flatnonzero(present)[np.unique(codes[present], return_index=True)[1]]] = True
+            frame = self.__drop_rows(frame, f"{table_name}.primary_key", first,
+                                     time.perf_counter() - start)
+            self.keys[table_name] = uniques
+        load_stats = self.connector.upload_to_db(frame, table_name,
+                                                 defer_constraints=True, **upload_kwargs)
+        # Rows appended to a table are only part of its keys, so they are
+        # read from the database when next needed:
+        if upload_kwargs.get("if_exists") == "append":
+            self.keys.pop(table_name, None)
+        return(load_stats)
+
+    def __referenced_keys(self, table_name, column, sql_type):
+        """Return the distinct keys of a referenced table as text."""
+        if table_name in self.keys:
+            return(self.keys[table_name])
+        # Tables not loaded by this builder are read from the database:
+        from sqlalchemy import text
+        with self.connector.engine.connect() as connection:
+            keys = pd.Series(connection.execute(text(
+                f'SELECT DISTINCT "{column}"::text FROM "{table_name}" '
+                f'WHERE "{column}" IS NOT NULL')).scalars().all(), dtype=object)
+        keys = keys.astype(str)
+        if sql_type == "UUID":
+            keys = keys.str.lower()
+        self.keys[table_name] = pd.Index(keys)
+        return(self.keys[table_name])
+
+    def orphans(self, frame, table_name):
+        """Return a mask of the rows with an orphan key in each column.
+
+        Arguments:
+         - frame (DataFrame): The cleaned fact table.
+         - table_name (str): The table name, with foreign keys in its
+           schema.
+
+        Keyword Arguments:
+         - None.
+
+        Returns:
+         - orphans (dict): Boolean arrays of the rows whose key is not in
+           the referenced table, by foreign key column. Missing keys are
+           not orphans.
+        """
+        schema = self.__schema(table_name)
+        orphans = {}
+        for name, reference in schema.get("foreign_keys", {}).items():
+            sql_type = schema.get("columns", {}).get(name)
+            codes, uniques = self.__key_codes(self.__column(frame, name), sql_type)
+            keys = self.__referenced_keys(reference["table"], reference["column"],
+                                          sql_type)
+            # Each distinct value is looked up once, and rows by its code:
+            unknown = np.append(keys.get_indexer(uniques) == -1, False)
+            orphans[name] = unknown[codes]
+        return(orphans)
+
+    def load_fact(self, frame, table_name, **upload_kwargs):
+        """Upload a fact table after checking its foreign keys.
+
+        The dimension tables it references must be loaded first.
+
+        Arguments:
+         - frame (DataFrame): The cleaned fact table.
+         - table_name (str): The table name, with foreign keys in its
+           schema.
+
+        Keyword Arguments:
+         - Passed on to DatabaseConnector.upload_to_db, e.g.
+           if_exists="replace".
+
+        Returns:
+         - load_stats (dict): As returned by upload_to_db.
+        """
+        schema = self.__schema(table_name)
+        start = time.perf_counter()
+        orphans = self.orphans(frame, table_name)
+        seconds = (time.perf_counter() - start) / max(len(orphans), 1)
+        for name, mask in orphans.items():
+            self.orphan_counts[f"{table_name}.{name}"] = int(mask.sum())
+            if mask.any():
+                print(f"{int(mask.sum())} rows of {table_name} have a {name} "
+                      f"not in {schema['foreign_keys'][name]['table']}")
+        if self.on_orphans == "quarantine":
+            # Each rule sees the rows kept by the ones before it:
+            keep_all = np.ones(len(frame), dtype=bool)
+            for name, mask in orphans.items():
+                keep = ~mask[keep_all]
+                if self.rejects is not None:
+                    self.rejects.record(f"{table_name}.orphan_{name}",
+                                        frame[keep_all], keep, seconds)
+                keep_all[keep_all] = keep
+            if not keep_all.all():
+                frame = frame[keep_all]
+        else:
+            # Foreign keys of reported orphans are not checked when added:
+            schema = dict(schema, foreign_keys={
+                name: dict(reference, not_valid=bool(orphans[name].any()))
+                for name, reference in schema.get("foreign_keys", {}).items()})
+        return(self.connector.upload_to_db(frame, table_name, schema=schema,
+                                           defer_constraints=True, **upload_kwargs))
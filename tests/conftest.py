@@ -0,0 +1,8 @@
+import os
+import sys
+
+# The modules of the pipeline live in the repository root, and are run
+# from there, as their parameter paths are relative to it:
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
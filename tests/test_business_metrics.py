@@ -0,0 +1,105 @@
+import os
+import uuid
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from business_metrics import METRICS, SUMMARY_TABLES, BusinessMetrics
+
+# The summaries are PostgreSQL queries, so these tests need a database.
+# Point MRDC_TEST_DB_CREDS at a credentials file of one whose tables may
+# be dropped to run them:
+TEST_DB_CREDS = os.environ.get("MRDC_TEST_DB_CREDS")
+
+pytestmark = pytest.mark.skipif(TEST_DB_CREDS is None,
+                                reason="MRDC_TEST_DB_CREDS is not set")
+
+DATE_UUIDS = [str(uuid.UUID(int=number)) for number in range(1, 51)]
+
+
+def orders(rows, seed):
+    generator = np.random.default_rng(seed)
+    return(pd.DataFrame({
+        "date_uuid": generator.choice(DATE_UUIDS, rows),
+        "store_code": generator.choice(["A", "B", "C"], rows),
+        "product_code": generator.choice(["p1", "p2"], rows),
+        "product_quantity": generator.integers(1, 5, rows)}))
+
+
+def summaries(metrics):
+    answers = {name: metrics.metric(name, country_code="GB") for name in METRICS}
+    from sqlalchemy import text
+    with metrics.connector.engine.connect() as connection:
+        for table_name, summary in SUMMARY_TABLES.items():
+            order = ", ".join(f'"{name}"' for name in summary["group_by"])
+            answers[table_name] = pd.read_sql(
+                text(f'SELECT * FROM "{table_name}" ORDER BY {order}'), connection)
+    return(answers)
+
+
+def assert_same(first, second):
+    for name in first:
+        pd.testing.assert_frame_equal(first[name], second[name], obj=name)
+
+
+@pytest.fixture
+def metrics():
+    from sqlalchemy import text
+    from database_utils import DatabaseConnector
+    connector = DatabaseConnector(TEST_DB_CREDS)
+    tables = ["orders_table", "dim_datetimes", "dim_store_details",
+              "dim_products", *SUMMARY_TABLES]
+    # Reading a watermark creates the watermark table if needed:
+    connector.read_watermark("metrics:orders")
+    with connector.engine.begin() as connection:
+        for table_name in tables:
+            connection.execute(text(f'DROP TABLE IF EXISTS "{table_name}" CASCADE'))
+        connection.execute(text(f'DELETE FROM "{connector.watermark_table}" '
+                                "WHERE source LIKE 'metrics:%'"))
+    # Stores with NULL group columns, which incremental refreshes must
+    # match rather than duplicate:
+    dimensions = {
+        "dim_datetimes": pd.DataFrame({
+            "date_uuid": DATE_UUIDS,
+            "datetime": pd.date_range("2020-01-01", periods=50, freq="17D")}),
+        "dim_store_details": pd.DataFrame({
+            "store_code": ["A", "B", "C"],
+            "store_type": ["Web Portal", "Local", None],
+            "country_code": ["GB", None, "DE"],
+            "locality": ["London", None, "Berlin"],
+            "staff_numbers": [1, 2, 3]}),
+        "dim_products": pd.DataFrame({"product_code": ["p1", "p2"],
+                                      "product_price": [1.5, 2.0]})}
+    for table_name, frame in dimensions.items():
+        connector.upload_to_db(frame.set_index(frame.columns[0]), table_name,
+                               if_exists="replace")
+    connector.upload_to_db(orders(500, seed=1), "orders_table", if_exists="replace")
+    return(BusinessMetrics(connector))
+
+
+def test_incremental_refresh_equals_full_build(metrics):
+    metrics.refresh()
+    for seed in (2, 3):
+        new_orders = orders(300, seed)
+        metrics.connector.upload_to_db(new_orders, "orders_table", if_exists="append")
+        metrics.refresh(orders=new_orders)
+    metrics.refresh(orders=pd.DataFrame())
+    incremental = summaries(metrics)
+    metrics.refresh()
+    assert_same(incremental, summaries(metrics))
+
+
+def test_refresh_rebuilds_summaries_that_missed_an_append(metrics):
+    metrics.refresh(watermark=("orders", None, 499))
+    assert metrics.connector.read_watermark("metrics:orders") == "499"
+    # Appended, but the refresh after it failed:
+    missed = orders(300, seed=2)
+    metrics.connector.upload_to_db(missed, "orders_table", if_exists="append")
+    new_orders = orders(300, seed=3)
+    metrics.connector.upload_to_db(new_orders, "orders_table", if_exists="append")
+    metrics.refresh(orders=new_orders, watermark=("orders", 799, 1099))
+    assert metrics.connector.read_watermark("metrics:orders") == "1099"
+    refreshed = summaries(metrics)
+    metrics.refresh()
+    assert_same(refreshed, summaries(metrics))
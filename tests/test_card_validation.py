@@ -0,0 +1,152 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from card_validation import CARD_CHECKS, CardValidator
+from data_cleaning import DataCleaning
+
+
+# Lengths allowed for each provider by parameters/number_lengths.yaml:
+PROVIDER_LENGTHS = {"Maestro": [12, 16], "VISA 13 digit": [13],
+                    "Diners Club / Carte Blanche": [14], "JCB 15 digit": [15],
+                    "American Express": [15], "VISA 16 digit": [16],
+                    "JCB 16 digit": [16], "Discover": [16], "Mastercard": [16],
+                    "VISA 19 digit": [19]}
+# Published test numbers of some providers:
+KNOWN_VALID = {"VISA 16 digit": "4111111111111111", "Mastercard": "5555555555554444",
+               "American Express": "378282246310005", "Discover": "6011111111111117",
+               "Diners Club / Carte Blanche": "30569309025904",
+               "JCB 16 digit": "3530111333300000"}
+
+
+def luhn_valid(number):
+    """Return whether a card number passes the Luhn checksum, row-wise."""
+    total = 0
+    for position, digit in enumerate(int(digit) for digit in reversed(number)):
+        if position % 2 == 1:
+            digit = digit * 2 - 9 if digit > 4 else digit * 2
+        total += digit
+    return(total % 10 == 0)
+
+
+def with_check_digit(prefix):
+    """Return the prefix followed by the digit making it Luhn valid."""
+    return(next(prefix + digit for digit in "0123456789"
+                if luhn_valid(prefix + digit)))
+
+
+def expected_check(number, provider):
+    """Return the first CARD_CHECKS check a card number fails, row-wise."""
+    if number is None:
+        return("missing")
+    if not number.isdigit():
+        return("non_digit")
+    if provider not in PROVIDER_LENGTHS:
+        return("unknown_provider")
+    if len(number) not in PROVIDER_LENGTHS[provider]:
+        return("length")
+    if not luhn_valid(number):
+        return("luhn")
+    return("valid")
+
+
+def check(numbers, providers, **kwargs):
+    checks = CardValidator(**kwargs).check(pd.Series(numbers, dtype="string"),
+                                          pd.Series(providers, dtype="string"))
+    return(checks.astype(str).tolist())
+
+
+@pytest.mark.parametrize("provider, number", KNOWN_VALID.items())
+def test_known_numbers_are_valid(provider, number):
+    assert check([number], [provider]) == ["valid"]
+    # Changing the check digit breaks the checksum:
+    broken = number[:-1] + str((int(number[-1]) + 1) % 10)
+    assert check([broken], [provider]) == ["luhn"]
+
+
+@pytest.mark.parametrize("provider, lengths", PROVIDER_LENGTHS.items())
+def test_each_provider_length_is_checked(provider, lengths):
+    for length in lengths:
+        number = with_check_digit("4" * (length - 1))
+        broken = number[:-1] + str((int(number[-1]) + 5) % 10)
+        assert check([number, broken], [provider] * 2) == ["valid", "luhn"]
+    # Luhn valid numbers of every other length up to 20 digits:
+    other = [with_check_digit("5" * (length - 1))
+             for length in range(2, 21) if length not in lengths]
+    assert check(other, [provider] * len(other)) == ["length"] * len(other)
+
+
+def test_checks_are_applied_in_order():
+    numbers = [None, "4111 1111", "4111111111111111", "4111111111111111",
+               "41111111111111111", "4111111111111112", "12ab", ""]
+    providers = ["VISA 16 digit", "Unknown", "Unknown", None, "VISA 16 digit",
+                 "VISA 16 digit", "VISA 16 digit", "Maestro"]
+    assert check(numbers, providers) == ["missing", "non_digit", "unknown_provider",
+                                        "unknown_provider", "length", "luhn",
+                                        "non_digit", "length"]
+
+
+def test_checks_match_row_wise_reference_across_blocks():
+    generator = np.random.default_rng(0)
+    providers = list(PROVIDER_LENGTHS) + ["Unknown"]
+    numbers, row_providers = [], []
+    for _ in range(500):
+        length = int(generator.integers(10, 22))
+        number = "".join(generator.choice(list("0123456789"), length))
+        if generator.random() < 0.4:
+            number = with_check_digit(number[:-1])
+        if generator.random() < 0.05:
+            number = number[:3] + "x" + number[4:]
+        numbers.append(None if generator.random() < 0.05 else number)
+        row_providers.append(str(generator.choice(providers)))
+    expected = [expected_check(number, provider)
+                for number, provider in zip(numbers, row_providers)]
+    # Blocks of uneven size, and missing numbers within them:
+    assert check(numbers, row_providers, block_rows=37) == expected
+    assert set(expected) == set(CARD_CHECKS)
+
+
+class RecordingRejects:
+    """Stands in for a RejectsSink, keeping the rows of each rule."""
+
+    def __init__(self):
+        self.rejected = {}
+
+    def record(self, rule, data, mask, seconds):
+        self.rejected[rule] = data[~mask]
+
+
+def card_data():
+    numbers = ["?4111111111111111", "4111111111111112", "411111111111111",
+               "5555555555554444"]
+    return(pd.DataFrame({"card_number": numbers,
+                         "expiry_date": ["09/26"] * 4,
+                         "card_provider": ["VISA 16 digit"] * 3 + ["Mastercard"],
+                         "date_payment_confirmed": ["2015-11-25"] * 4}))
+
+
+def test_clean_card_data_flags_card_numbers():
+    cleaned = DataCleaning().clean_card_data(card_data(), check_numbers="flag")
+    assert cleaned.card_number_check.astype(str).tolist() == ["valid", "luhn",
+                                                              "length", "valid"]
+    assert cleaned.card_number.tolist() == [4111111111111111, 4111111111111112,
+                                            411111111111111, 5555555555554444]
+
+
+def test_clean_card_data_drops_card_numbers():
+    rejects = RecordingRejects()
+    cleaned = DataCleaning(rejects=rejects).clean_card_data(card_data(),
+                                                            check_numbers="drop")
+    assert cleaned.card_number.tolist() == [4111111111111111, 5555555555554444]
+    assert "card_number_check" not in cleaned.columns
+    # Rejected rows keep the check they failed:
+    rejected = rejects.rejected["cards.card_number_check"]
+    assert rejected.card_number_check.astype(str).tolist() == ["luhn", "length"]
+
+
+def test_clean_card_data_skips_checks_by_default():
+    cleaned = DataCleaning().clean_card_data(card_data())
+    assert len(cleaned) == 4
+    assert "card_number_check" not in cleaned.columns
+    with pytest.raises(ValueError):
+        DataCleaning().clean_card_data(card_data(), check_numbers="fix")
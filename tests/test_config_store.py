@@ -0,0 +1,94 @@
+import os
+
+import pytest
+
+from config_store import PARAMETERS_DIR, REQUIRED_KEYS, ConfigStore
+
+
+CREDS = ("HOST: localhost\nPASSWORD: secret\nUSER: postgres\n"
+         "DATABASE: sales_data\nPORT: 5432\n")
+
+
+@pytest.fixture
+def store(tmp_path):
+    (tmp_path / "db_creds_test.yaml").write_text(CREDS)
+    (tmp_path / "url_dict.yaml").write_text(
+        "retrieve-store: https://example.com/store/\nnumber-stores: https://example.com/n\n"
+        "nested:\n  retry-count: 3\n")
+    return(ConfigStore(parameters_dir=str(tmp_path)))
+
+
+def test_relative_paths_resolve_against_the_parameters_directory(store, tmp_path,
+                                                                 monkeypatch):
+    monkeypatch.chdir(tmp_path.parent)
+    expected = str(tmp_path / "db_creds_test.yaml")
+    assert store.resolve("db_creds_test.yaml") == expected
+    assert store.resolve("parameters/db_creds_test.yaml") == expected
+    assert store.resolve(expected) == expected
+    assert store.load("parameters/db_creds_test.yaml")["HOST"] == "localhost"
+
+
+def test_environment_overrides_keys(store, monkeypatch):
+    monkeypatch.setenv("MRDC_DB_CREDS_TEST__PASSWORD", "from-env")
+    monkeypatch.setenv("MRDC_DB_CREDS_TEST__PORT", "6543")
+    monkeypatch.setenv("MRDC_URL_DICT__NUMBER_STORES", "https://example.org/n")
+    monkeypatch.setenv("MRDC_URL_DICT__NESTED__RETRY_COUNT", "5")
+    monkeypatch.setenv("MRDC_URL_DICT__NESTED__BACKOFF", "[1, 2]")
+    monkeypatch.setenv("OTHER_DB_CREDS_TEST__HOST", "ignored")
+    creds = store.load("db_creds_test.yaml")
+    assert creds["PASSWORD"] == "from-env"
+    # Values are parsed as yaml:
+    assert creds["PORT"] == 6543
+    assert creds["HOST"] == "localhost"
+    urls = store.load("url_dict.yaml")
+    # Existing keys are matched whatever their case and dashes:
+    assert urls["number-stores"] == "https://example.org/n"
+    assert "NUMBER_STORES" not in urls
+    assert urls["nested"] == {"retry-count": 5, "BACKOFF": [1, 2]}
+
+
+def test_overrides_and_callers_do_not_change_the_cache(store, monkeypatch):
+    monkeypatch.setenv("MRDC_DB_CREDS_TEST__PASSWORD", "from-env")
+    store.load("db_creds_test.yaml")["HOST"] = "changed"
+    monkeypatch.delenv("MRDC_DB_CREDS_TEST__PASSWORD")
+    creds = store.load("db_creds_test.yaml")
+    assert creds["PASSWORD"] == "secret" and creds["HOST"] == "localhost"
+    assert store.loads == 1
+
+
+def test_files_are_parsed_again_only_when_changed(store, tmp_path):
+    path = tmp_path / "db_creds_test.yaml"
+    store.load("db_creds_test.yaml")
+    store.load("db_creds_test.yaml")
+    assert store.loads == 1
+    # A change of size, keeping the modification time:
+    stat = path.stat()
+    path.write_text(CREDS.replace("localhost", "db.example.com"))
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    assert store.load("db_creds_test.yaml")["HOST"] == "db.example.com"
+    assert store.loads == 2
+    # A change of modification time, keeping the size:
+    path.write_text(CREDS.replace("localhost", "remotehost"))
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    assert store.load("db_creds_test.yaml")["HOST"] == "remotehost"
+    assert store.loads == 3
+    store.load("db_creds_test.yaml")
+    assert store.loads == 3
+
+
+def test_missing_required_keys_are_named(store, tmp_path):
+    (tmp_path / "db_creds_broken.yaml").write_text("HOST: localhost\nUSER: postgres\n")
+    with pytest.raises(ValueError) as error:
+        store.load("db_creds_broken.yaml")
+    assert "['PASSWORD', 'DATABASE', 'PORT']" in str(error.value)
+    (tmp_path / "url_dict.yaml").write_text("- retrieve-store\n")
+    with pytest.raises(ValueError, match="not a mapping"):
+        store.load("url_dict.yaml")
+    # A failed load is not cached:
+    (tmp_path / "db_creds_broken.yaml").write_text(CREDS)
+    assert store.load("db_creds_broken.yaml")["PORT"] == 5432
+
+
+def test_shipped_parameter_files_are_valid():
+    configs = ConfigStore(parameters_dir=PARAMETERS_DIR).load_all()
+    assert set(REQUIRED_KEYS) - {"db_creds_*.yaml"} <= set(configs)
@@ -0,0 +1,269 @@
+import re
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from data_cleaning import WEIGHT_CLASSES, WEIGHT_UNITS, DataCleaning
+
+
+# Weights in every format of the product data, and ones that mix them:
+WEIGHTS = ["3 x 100g", "12 x 85g", "40 x 100g", "16oz", "14.1oz", "500ml",
+           "2ml", "100g", "77g .", "5g", "1.6kg", "0.45kg", "1kg", ".5kg",
+           "9GO7KUL", "12", None]
+
+
+def row_wise_kg(weight):
+    """Return a weight in kg as the cleaner's row-wise parser did.
+
+    Each format had its own regex, whose results were summed, so a weight
+    matched by none of them is 0.
+    """
+    if weight is None:
+        return(0)
+    total = np.float32(0)
+    multipack = re.match(r"^(\d+) x (\d+)", weight)
+    if multipack:
+        total += np.float32(multipack[1]) * np.float32(multipack[2]) / np.float32(1000)
+    oz = re.match(r"^(\d+\.?\d+)oz+$", weight)
+    if oz:
+        total += np.float32(oz[1]) / np.float32(35.27)
+    g_ml = re.match(r"^(\d+\.?\d*)[^k]?[g|ml].*$", weight)
+    if g_ml:
+        total += np.float32(g_ml[1]) / np.float32(1000)
+    if "kg" in weight:
+        total += np.float32(weight.strip("kg"))
+    return(total)
+
+
+def row_wise_unit(weight):
+    """Return the unit a weight was given in, by the same regexes."""
+    if weight is None:
+        return("unknown")
+    if re.match(r"^(\d+) x (\d+)", weight):
+        return("multipack")
+    if re.match(r"^(\d+\.?\d+)oz+$", weight):
+        return("oz")
+    g_ml = re.match(r"^(\d+\.?\d*)[^k]?([g|ml]).*$", weight)
+    if g_ml:
+        return("g" if g_ml[2] == "g" else "ml")
+    if "kg" in weight:
+        return("kg")
+    return("unknown")
+
+
+def product_data(weights):
+    """Return raw product data with the given weights."""
+    return(pd.DataFrame({
+        "product_name": [f"Product {number}" for number in range(len(weights))],
+        "product_price": ["£9.99"] * len(weights),
+        "weight": weights,
+        "category": ["homeware"] * len(weights),
+        "date_added": ["2020-01-01"] * len(weights),
+        "removed": ["Still_avaliable"] * len(weights),
+        "product_code": [f"A{number}" for number in range(len(weights))]}))
+
+
+@pytest.mark.parametrize("weight", WEIGHTS)
+def test_weight_matches_row_wise_parser(weight):
+    expected = row_wise_kg(weight)
+    cleaned = DataCleaning().clean_product_data(product_data([weight]))
+    if expected == 0:
+        assert cleaned.empty
+    else:
+        assert cleaned.weight.tolist() == pytest.approx([expected], rel=1e-6)
+        assert cleaned.weight_unit.tolist() == [row_wise_unit(weight)]
+
+
+def test_weights_of_mixed_column_match_row_wise_parser():
+    # Repeated weights are parsed once and mapped back to every row:
+    weights = WEIGHTS * 3
+    expected = np.array([row_wise_kg(weight) for weight in weights], dtype="float32")
+    cleaned = DataCleaning().clean_product_data(product_data(weights))
+    np.testing.assert_allclose(cleaned.weight.to_numpy("float32"),
+                               expected[expected != 0], rtol=1e-6)
+    units = [row_wise_unit(weight) for weight, kg in zip(weights, expected) if kg != 0]
+    assert cleaned.weight_unit.tolist() == units
+    assert list(cleaned.weight_unit.cat.categories) == WEIGHT_UNITS
+
+
+def test_archived_product_data_matches_row_wise_parser():
+    raw = pd.read_csv("archive_data/product_data.csv", index_col=0)
+    weights = raw.weight.astype(object).where(raw.weight.notna(), None)
+    expected_kg = pd.Series([row_wise_kg(weight) for weight in weights],
+                            index=raw.index, dtype="float32")
+    # Too-light kettles and toasters are corrected after parsing:
+    homeware = raw.product_name.str.contains("Toaster|Kettle", na=False)
+    expected_kg[(expected_kg < 0.050) & homeware] *= 1000
+    expected_units = pd.Series([row_wise_unit(weight) for weight in weights],
+                               index=raw.index)
+    cleaned = DataCleaning().clean_product_data(raw.copy())
+    assert cleaned.index.equals(expected_kg.index[expected_kg != 0])
+    np.testing.assert_allclose(cleaned.weight.to_numpy("float32"),
+                               expected_kg[cleaned.index].to_numpy(), rtol=1e-6)
+    assert cleaned.weight_unit.tolist() == expected_units[cleaned.index].tolist()
+    assert set(cleaned.weight_unit) == {"multipack", "oz", "g", "ml", "kg"}
+
+
+def test_too_light_homeware_is_corrected():
+    data = product_data(["1.2g", "1.2g"])
+    data.product_name = ["Red Kettle", "Red Mug"]
+    cleaned = DataCleaning().clean_product_data(data)
+    assert cleaned.weight.tolist() == pytest.approx([1.2, 0.0012], rel=1e-6)
+
+
+# Dates in every layout of DATE_PATTERNS, with full and abbreviated month
+# names in any case, dates in no known layout, which dateutil parses,
+# dates that are invalid in their layout and unparseable strings:
+DATES = ["2005-12-02", "1999/09/18", "2001/1/05", "March 1980 21", "Sept 2010 07",
+         "JANUARY 2000 01", "1977 January 10", "1977 jan 10", "1999 September 18",
+         "5 March 2001", "2021-06-01 10:30:00", "20/03/2015", "2005-02-30",
+         "2005/02/30", "February 2005 30", "2005 February 30", "2004-02-29",
+         "Smarch 2001 01", "2001 Smarch 01", "GHVDKJD", "", None, pd.NA]
+
+
+def parse_dates(dates, errors="coerce"):
+    return(DataCleaning()._DataCleaning__parse_dates(dates, errors=errors))
+
+
+def test_dates_match_mixed_format_parsing():
+    # Repeated dates are parsed once and mapped back to every row:
+    dates = pd.Series(DATES * 3, index=range(100, 100 + 3 * len(DATES)),
+                      name="join_date", dtype="string")
+    expected = pd.to_datetime(dates, format="mixed", errors="coerce")
+    parsed = parse_dates(dates)
+    pd.testing.assert_series_equal(parsed, expected.astype("datetime64[ns]"))
+    # Invalid dates are NaT, whichever parser was used:
+    assert parsed[dates.isin(["2005-02-30", "February 2005 30", "GHVDKJD"])].isna().all()
+    assert parsed[dates.isna()].isna().all()
+
+
+@pytest.mark.parametrize("date", [date for date in DATES if isinstance(date, str)])
+def test_each_date_matches_mixed_format_parsing(date):
+    dates = pd.Series([date], dtype=object)
+    expected = pd.to_datetime(dates, format="mixed", errors="coerce")
+    pd.testing.assert_series_equal(parse_dates(dates), expected.astype("datetime64[ns]"))
+
+
+def test_invalid_dates_raise_when_asked_to():
+    with pytest.raises(ValueError):
+        pd.to_datetime(pd.Series(["GHVDKJD"]), format="mixed", errors="raise")
+    with pytest.raises(ValueError):
+        parse_dates(pd.Series(["2005-12-02", "GHVDKJD"]), errors="raise")
+    # Dates invalid in a known layout fall back to dateutil, so raise too:
+    with pytest.raises(ValueError):
+        parse_dates(pd.Series(["2005-02-30"]), errors="raise")
+    assert parse_dates(pd.Series(["2005-12-02", None]), errors="raise").isna().tolist() \
+        == [False, True]
+
+
+def test_all_missing_and_empty_dates():
+    assert parse_dates(pd.Series([None, None], dtype=object)).isna().all()
+    parsed = parse_dates(pd.Series([], dtype="string"))
+    assert parsed.empty and parsed.dtype == "datetime64[ns]"
+
+
+def concatenated_datetimes(events_data):
+    """Return event datetimes as the cleaner built them from strings.
+
+    Single-digit date parts were given a leading zero and the parts joined
+    into one string per row for pd.to_datetime. Rows whose string is not a
+    valid date and time are NaT here, as they are dropped by the cleaner.
+    """
+    parts = events_data[["year", "month", "day"]].astype("string")
+    parts = parts.mask(parts.isin(list("0123456789")), "0" + parts)
+    strings = (parts.year + parts.month + parts.day + " "
+               + events_data.timestamp.astype("string"))
+    # strptime accepts a leap second, ':60', which the cleaner drops:
+    valid = events_data.timestamp.astype("string").str.fullmatch(r"\d\d:\d\d:[0-5]\d")
+    strings = strings.where(valid.fillna(False))
+    return(pd.to_datetime(strings, format="%Y%m%d %H:%M:%S", errors="coerce"))
+
+
+def events_data(rows=None):
+    """Return raw events with valid and invalid dates and times."""
+    events = pd.DataFrame(
+        [["16:00:22", "4", "2012", "9"], ["00:00:00", "1", "1993", "1"],
+         ["23:59:59", "12", "2022", "31"], ["25:00:00", "5", "2010", "2"],
+         ["12:60:00", "5", "2010", "2"], ["12:00:60", "5", "2010", "2"],
+         ["7:05:00", "5", "2010", "2"], ["12:00:00", "2", "2005", "30"],
+         ["12:00:00", "2", "2004", "29"], ["12:00:00", "2", "2005", "29"],
+         ["12:00:00", "13", "2010", "1"], ["12:00:00", "0", "2010", "1"],
+         ["12:00:00", "4", "2010", "0"], ["12:00:00", "4", "2010", "31"],
+         ["12:00:00", "04", "2010", "05"], ["APKOWK9I0F", "569ROK26G8", "DXBU6GX1VC",
+                                            "NULL"],
+         [None, "4", "2012", "9"], ["16:00:22", None, "2012", "9"]],
+        columns=["timestamp", "month", "year", "day"])
+    events["time_period"] = "Morning"
+    events["date_uuid"] = [f"uuid-{number}" for number in range(len(events))]
+    if rows is not None:
+        events = pd.concat([events] * (rows // len(events) + 1)).iloc[:rows]
+        events.index = range(rows)
+    return(events)
+
+
+def test_event_datetimes_match_concatenated_strings():
+    raw = events_data()
+    expected = concatenated_datetimes(raw)
+    cleaned = DataCleaning().clean_events_data(raw.copy())
+    assert cleaned.index.equals(expected.index[expected.notna()])
+    pd.testing.assert_series_equal(cleaned.datetime, expected.dropna().astype("datetime64[ns]"),
+                                   check_names=False)
+    assert cleaned.date_uuid.tolist() == raw.date_uuid[expected.notna()].tolist()
+    # Hours past 23, minutes or seconds past 59 and 30 February are dropped:
+    assert not cleaned.date_uuid.isin(["uuid-3", "uuid-4", "uuid-5", "uuid-7"]).any()
+
+
+def test_synthetic_event_datetimes_match_concatenated_strings():
+    from benchmarks.synthetic_data import SyntheticData
+    raw = SyntheticData(seed=3, dirty_fraction=0.1).events_data(2000)
+    expected = concatenated_datetimes(raw).dropna()
+    cleaned = DataCleaning().clean_events_data(raw.copy())
+    pd.testing.assert_series_equal(cleaned.datetime, expected.astype("datetime64[ns]"),
+                                   check_names=False)
+
+
+def test_chunked_events_match_whole_frame():
+    raw = events_data(rows=101)
+    whole = DataCleaning().clean_events_data(raw.copy())
+    # Chunks of uneven sizes, as read from line-delimited json:
+    bounds = [0, 1, 18, 50, 51, 101]
+    chunks = (raw.iloc[start:stop].copy() for start, stop in zip(bounds, bounds[1:]))
+    chunked = DataCleaning().clean_events_data(chunks)
+    pd.testing.assert_frame_equal(chunked, whole)
+    expected = concatenated_datetimes(raw).dropna()
+    pd.testing.assert_series_equal(chunked.datetime, expected.astype("datetime64[ns]"),
+                                   check_names=False)
+
+
+def test_product_columns_are_derived():
+    data = product_data(["1.999kg", "2kg", "39.99kg", "40kg", "139.9kg", "140kg"])
+    data.product_price = ["£9.99", "£1,000.00", "£0.50", "£12", "£100.25", "£7"]
+    data.removed = ["Still_avaliable", "Still_available", "Removed", "removed",
+                    None, "Still_avaliable"]
+    cleaned = DataCleaning().clean_product_data(data)
+    assert pd.api.types.is_float_dtype(cleaned.product_price)
+    assert cleaned.product_price.isna().tolist() == [False, True, False, False,
+                                                     False, False]
+    assert cleaned.product_price.dropna().tolist() == [9.99, 0.5, 12.0, 100.25, 7.0]
+    # Each class includes its lower bound:
+    assert cleaned.weight_class.tolist() == ["Light", "Mid_Sized", "Mid_Sized",
+                                             "Heavy", "Heavy", "Truck_Required"]
+    assert list(cleaned.weight_class.cat.categories) == list(WEIGHT_CLASSES)
+    # Unexpected 'removed' values are unknown rather than available:
+    assert cleaned.still_available.dtype == "boolean"
+    assert cleaned.still_available.tolist() == [True, True, False, pd.NA, pd.NA, True]
+    assert "removed" not in cleaned.columns
+
+
+def test_weight_class_bin_edges():
+    assert WEIGHT_CLASSES == {"Light": 0, "Mid_Sized": 2, "Heavy": 40,
+                              "Truck_Required": 140}
+    bounds = list(WEIGHT_CLASSES.values())
+    assert bounds == sorted(bounds)
+    weights = [weight for bound in bounds[1:] for weight in (bound - 0.001, bound)]
+    cleaned = DataCleaning().clean_product_data(
+        product_data([f"{weight}kg" for weight in weights]))
+    names = list(WEIGHT_CLASSES)
+    assert cleaned.weight_class.tolist() == [name for position in range(1, len(names))
+                                             for name in names[position - 1:position + 1]]
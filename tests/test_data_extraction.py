@@ -0,0 +1,366 @@
+import json
+import os
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pandas as pd
+import pytest
+import requests
+
+import data_extraction
+from data_extraction import DataExtractor
+from http_cache import HttpCache
+
+
+class RecordingPool(ThreadPoolExecutor):
+    """Stands in for the process pool, running tasks on threads."""
+
+    started = []
+
+    def __init__(self, max_workers, mp_context=None):
+        super().__init__(max_workers=max_workers)
+        self.shut_down = False
+        RecordingPool.started.append(self)
+
+    def shutdown(self, *args, **kwargs):
+        self.shut_down = True
+        super().shutdown(*args, **kwargs)
+
+
+@pytest.fixture
+def pdf_reads(monkeypatch):
+    """Replace tabula with one table per page, recording the pages read."""
+    reads = []
+
+    def read_pdf_pages(pdf_path, pages, persistent_jvm):
+        reads.append(pages)
+        if pages == "all":
+            return([pd.DataFrame({"page": [0]})])
+        return([pd.DataFrame({"page": [page]}) for page in pages])
+
+    RecordingPool.started = []
+    monkeypatch.setattr(data_extraction, "_read_pdf_pages", read_pdf_pages)
+    monkeypatch.setattr(data_extraction, "ProcessPoolExecutor", RecordingPool)
+    return(reads)
+
+
+def write_pdf(path, pages):
+    """Write a file with the page objects of a pdf, enough to count them."""
+    with open(path, "wb") as file:
+        file.write(b"%PDF-1.4\n")
+        for number in range(pages):
+            file.write(b"%d 0 obj << /Type /Page >> endobj\n" % (number + 3))
+
+
+def test_parallel_pdf_tables_stay_in_page_order(tmp_path, monkeypatch, pdf_reads):
+    monkeypatch.setitem(sys.modules, "pypdf", None)
+    pdf_path = str(tmp_path / "cards.pdf")
+    write_pdf(pdf_path, 7)
+    extractor = DataExtractor(None)
+
+    data = extractor.retrieve_pdf_data(pdf_path, parallel=True,
+                                       pages_per_task=3, max_workers=2)
+
+    assert data["page"].tolist() == [1, 2, 3, 4, 5, 6, 7]
+    assert sorted(pdf_reads) == [[1, 2, 3], [4, 5, 6], [7]]
+    extractor.close()
+
+
+def test_parallel_pdf_workers_are_reused_until_closed(tmp_path, monkeypatch, pdf_reads):
+    monkeypatch.setitem(sys.modules, "pypdf", None)
+    pdf_path = str(tmp_path / "cards.pdf")
+    write_pdf(pdf_path, 4)
+    extractor = DataExtractor(None)
+
+    extractor.retrieve_pdf_data(pdf_path, parallel=True, max_workers=2)
+    extractor.retrieve_pdf_data(pdf_path, parallel=True, max_workers=2)
+    assert len(RecordingPool.started) == 1
+    assert not RecordingPool.started[0].shut_down
+
+    extractor.close()
+    assert RecordingPool.started[0].shut_down
+    extractor.retrieve_pdf_data(pdf_path, parallel=True, max_workers=2)
+    assert len(RecordingPool.started) == 2
+    extractor.close()
+
+
+def test_parallel_pdf_without_page_count_is_read_whole(tmp_path, monkeypatch, pdf_reads):
+    # Without pypdf, page objects in compressed streams can't be counted:
+    monkeypatch.setitem(sys.modules, "pypdf", None)
+    pdf_path = str(tmp_path / "cards.pdf")
+    write_pdf(pdf_path, 0)
+    extractor = DataExtractor(None)
+
+    data = extractor.retrieve_pdf_data(pdf_path, parallel=True)
+
+    assert pdf_reads == ["all"]
+    assert data["page"].tolist() == [0]
+    assert RecordingPool.started == []
+
+
+class StoreAPI(ThreadingHTTPServer):
+    """A local store API, with stores that can be made to fail."""
+
+    def __init__(self, stores):
+        super().__init__(("127.0.0.1", 0), StoreHandler)
+        self.stores = stores
+        self.failures = {}
+        self.requests = []
+        self.lock = threading.Lock()
+
+    @property
+    def base_url(self):
+        return(f"http://127.0.0.1:{self.server_address[1]}")
+
+
+class StoreHandler(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        api = self.server
+        with api.lock:
+            api.requests.append(self.path)
+        if self.headers.get("x-api-key") != "test-key":
+            self.send_response(403)
+            self.end_headers()
+            return
+        if self.path == "/number_stores":
+            self.send_json({"statusCode": 200, "number_stores": len(api.stores)})
+            return
+        number = int(self.path.rsplit("/", 1)[1])
+        with api.lock:
+            failing = api.failures.get(number, 0)
+            api.failures[number] = max(failing - 1, 0)
+        if failing:
+            self.send_response(503)
+            self.end_headers()
+            return
+        etag = f'"store-{number}"'
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.end_headers()
+            return
+        self.send_json(api.stores[number], {"ETag": etag})
+
+    def send_json(self, data, headers=None):
+        body = json.dumps(data).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+
+@pytest.fixture
+def store_api(tmp_path):
+    """Serve five stores and point a DataExtractor's parameters at them."""
+    stores = [{"index": number, "store_code": f"ST-{number}", "staff_numbers": number}
+              for number in range(5)]
+    api = StoreAPI(stores)
+    thread = threading.Thread(target=api.serve_forever, daemon=True)
+    thread.start()
+    header_path = tmp_path / "headers_dict.yaml"
+    header_path.write_text("x-api-key: test-key\n")
+    url_path = tmp_path / "url_dict.yaml"
+    url_path.write_text(f"number-stores: {api.base_url}/number_stores\n"
+                        f"retrieve-store: {api.base_url}/store_details/\n")
+    extractor = DataExtractor(None)
+    extractor.header_dict_path = str(header_path)
+    extractor.url_dict_path = str(url_path)
+    yield(api, extractor)
+    api.shutdown()
+    api.server_close()
+
+
+def store_requests(api):
+    return(sorted(path for path in api.requests if path.startswith("/store_details/")))
+
+
+@pytest.mark.parametrize("concurrent", [False, True])
+def test_stores_are_returned_in_index_order(store_api, concurrent):
+    api, extractor = store_api
+    assert extractor.list_number_of_stores() == 5
+
+    store_data = extractor.retrieve_stores_data(concurrent=concurrent, max_workers=3)
+
+    assert store_data.index.tolist() == [0, 1, 2, 3, 4]
+    assert store_data.store_code.tolist() == [f"ST-{number}" for number in range(5)]
+
+
+def test_concurrent_stores_retry_server_errors(store_api):
+    api, extractor = store_api
+    api.failures = {2: 2}
+
+    store_data = extractor.retrieve_stores_data(concurrent=True, retries=2,
+                                                backoff_factor=0)
+
+    assert store_data.store_code.tolist() == [f"ST-{number}" for number in range(5)]
+    assert store_requests(api).count("/store_details/2") == 3
+
+
+@pytest.mark.parametrize("concurrent", [False, True])
+def test_failed_crawl_resumes_from_progress_log(store_api, tmp_path, concurrent):
+    api, extractor = store_api
+    progress_path = str(tmp_path / "store_crawl.jsonl")
+    api.failures = {3: 1}
+
+    with pytest.raises(requests.RequestException):
+        extractor.retrieve_stores_data(concurrent=concurrent, retries=0,
+                                       progress_path=progress_path)
+    fetched = store_requests(api)
+    api.requests.clear()
+    store_data = extractor.retrieve_stores_data(concurrent=concurrent, retries=0,
+                                                progress_path=progress_path)
+
+    assert store_data.store_code.tolist() == [f"ST-{number}" for number in range(5)]
+    # Only the store that failed, and any not reached, are requested again:
+    assert set(store_requests(api)).isdisjoint(set(fetched) - {"/store_details/3"})
+    assert "/store_details/3" in store_requests(api)
+    assert not os.path.exists(progress_path)
+
+
+def test_unchanged_stores_are_served_from_http_cache(store_api, tmp_path):
+    api, extractor = store_api
+    extractor.http_cache = HttpCache(cache_dir=str(tmp_path / "http"))
+
+    first = extractor.retrieve_stores_data(store_number=5, concurrent=True)
+    second = extractor.retrieve_stores_data(store_number=5, concurrent=True)
+
+    pd.testing.assert_frame_equal(first, second)
+    assert extractor.http_cache.summary()["misses"] == 5
+    assert extractor.http_cache.summary()["not_modified"] == 5
+    # The API key is part of the cache key but never written to disk:
+    for name in os.listdir(tmp_path / "http"):
+        assert "test-key" not in (tmp_path / "http" / name).read_text()
+
+
+@pytest.fixture
+def s3_objects(monkeypatch):
+    """Put a csv and a line-delimited json object in a mocked s3 bucket."""
+    moto = pytest.importorskip("moto")
+    import boto3
+    monkeypatch.setenv("AWS_DEFAULT_REGION", "eu-west-1")
+    with moto.mock_aws():
+        s3 = boto3.client("s3", region_name="eu-west-1")
+        s3.create_bucket(Bucket="data-handling-test",
+                         CreateBucketConfiguration={"LocationConstraint": "eu-west-1"})
+        products = pd.DataFrame({"product_name": [f"Product {number}" for number in range(50)],
+                                 "weight": [f"{number}g" for number in range(50)]})
+        s3.put_object(Bucket="data-handling-test", Key="products.csv",
+                      Body=products.to_csv().encode())
+        events = pd.DataFrame({"timestamp": ["12:00:00"] * 50, "month": range(50)})
+        s3.put_object(Bucket="data-handling-test", Key="date_details.json",
+                      Body=events.to_json(orient="records", lines=True).encode())
+        yield(products, events)
+
+
+@pytest.mark.parametrize("max_concurrency", [1, 4])
+def test_streamed_csv_matches_downloaded_csv(s3_objects, tmp_path, max_concurrency):
+    products, _ = s3_objects
+    extractor = DataExtractor(None)
+    address = "s3://data-handling-test/products.csv"
+
+    downloaded = extractor.extract_csv_from_s3(address, str(tmp_path / "products.csv"))
+    archive_path = tmp_path / "archive.csv"
+    streamed = extractor.extract_csv_from_s3(address, str(archive_path), stream=True,
+                                             max_concurrency=max_concurrency,
+                                             part_size=256)
+
+    pd.testing.assert_frame_equal(streamed, downloaded)
+    pd.testing.assert_frame_equal(streamed, products)
+    # The archive copy holds the object as it was read:
+    assert archive_path.read_bytes() == (tmp_path / "products.csv").read_bytes()
+
+
+def test_csv_chunks_cover_every_row(s3_objects):
+    products, _ = s3_objects
+    chunks = DataExtractor(None).extract_csv_from_s3(
+        "s3://data-handling-test/products.csv", stream=True, chunk_size=20)
+
+    chunks = list(chunks)
+    assert [len(chunk) for chunk in chunks] == [20, 20, 10]
+    pd.testing.assert_frame_equal(pd.concat(chunks), products)
+
+
+def test_json_lines_chunks_cover_every_record(s3_objects):
+    _, events = s3_objects
+    address = "https://data-handling-test.s3.eu-west-1.amazonaws.com/date_details.json"
+    extractor = DataExtractor(None)
+
+    whole = extractor.extract_json_from_s3(address, stream=True, lines=True)
+    chunks = list(extractor.extract_json_from_s3(address, stream=True, lines=True,
+                                                 chunk_size=15))
+
+    assert [len(chunk) for chunk in chunks] == [15, 15, 15, 5]
+    pd.testing.assert_frame_equal(pd.concat(chunks), whole)
+    assert whole.month.tolist() == events.month.tolist()
+    with pytest.raises(ValueError):
+        extractor.extract_json_from_s3(address, stream=True, chunk_size=15)
+
+
+@pytest.fixture
+def orders_engine(tmp_path):
+    """Return an engine of a sqlite database with an orders table, in the
+    main schema and in an attached 'archive' schema."""
+    from sqlalchemy import create_engine, event
+    engine = create_engine(f"sqlite:///{tmp_path / 'orders.db'}")
+
+    @event.listens_for(engine, "connect")
+    def attach_archive(connection, record):
+        connection.execute(f"ATTACH DATABASE '{tmp_path / 'archive.db'}' AS archive")
+
+    orders = pd.DataFrame({"index": range(10),
+                           "store_code": [f"S{number % 3}" for number in range(10)],
+                           "product_quantity": range(10, 20)})
+    orders.to_sql("orders_table", engine, index=False)
+    orders.assign(store_code="OLD").to_sql("orders_table", engine, schema="archive",
+                                           index=False)
+    yield engine
+    engine.dispose()
+
+
+def test_rds_table_is_read_whole(orders_engine):
+    data = DataExtractor(orders_engine).read_rds_table("orders_table")
+    assert data.columns.tolist() == ["index", "store_code", "product_quantity"]
+    assert data["index"].tolist() == list(range(10))
+
+
+def test_rds_table_columns_and_rows_are_selected_by_the_database(orders_engine):
+    statements = []
+    from sqlalchemy import event
+    event.listen(orders_engine, "before_cursor_execute",
+                 lambda conn, cursor, statement, *args: statements.append(statement))
+    data = DataExtractor(orders_engine).read_rds_table(
+        "orders_table", columns=["index", "store_code"],
+        where='"index" > :last_index AND store_code = :store',
+        params={"last_index": 3, "store": "S1"})
+    assert data.to_dict("list") == {"index": [4, 7], "store_code": ["S1", "S1"]}
+    # Only the asked for columns and rows are fetched:
+    assert statements[-1].startswith('SELECT "index", store_code \nFROM orders_table')
+    assert "WHERE" in statements[-1]
+
+
+def test_schema_qualified_rds_table_names(orders_engine):
+    extractor = DataExtractor(orders_engine)
+    archived = extractor.read_rds_table("archive.orders_table", columns=["store_code"])
+    assert set(archived.store_code) == {"OLD"}
+    current = extractor.read_rds_table("main.orders_table", columns=["store_code"])
+    assert "OLD" not in set(current.store_code)
+    chunks = list(extractor.read_rds_table("archive.orders_table", chunk_size=4))
+    assert [len(chunk) for chunk in chunks] == [4, 4, 2]
+
+
+def test_rds_table_chunks_stream_every_row(orders_engine):
+    chunks = DataExtractor(orders_engine).read_rds_table(
+        "orders_table", where='"index" >= :first', params={"first": 1}, chunk_size=4)
+    assert not isinstance(chunks, pd.DataFrame)
+    chunks = list(chunks)
+    assert [len(chunk) for chunk in chunks] == [4, 4, 1]
+    assert all(chunk.columns.tolist() == ["index", "store_code", "product_quantity"]
+               for chunk in chunks)
+    assert pd.concat(chunks)["index"].tolist() == list(range(1, 10))
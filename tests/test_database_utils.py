@@ -0,0 +1,101 @@
+import csv
+from contextlib import contextmanager
+from io import StringIO
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from database_utils import DatabaseConnector
+
+
+class RecordingCursor:
+    """Stands in for a psycopg2 cursor, keeping the statements it is sent."""
+
+    def __init__(self):
+        self.statements = []
+        self.copies = []
+
+    def execute(self, statement, params=None):
+        self.statements.append(statement)
+
+    def fetchone(self):
+        # The target table already has a primary key:
+        return((1,))
+
+    def copy_expert(self, statement, buffer):
+        self.copies.append((statement, buffer.read()))
+
+    def close(self):
+        pass
+
+
+class RecordingEngine:
+    """Stands in for an engine, with one cursor for every transaction."""
+
+    def __init__(self):
+        self.recorded = RecordingCursor()
+
+    def cursor(self):
+        return(self.recorded)
+
+    @contextmanager
+    def begin(self):
+        class Connection:
+            connection = self
+        yield Connection()
+
+
+class RecordingRegistry:
+    def engine(self, url, **pool_options):
+        return(RecordingEngine())
+
+
+@pytest.fixture
+def connector(tmp_path):
+    cred_path = tmp_path / "db_creds_test.yaml"
+    cred_path.write_text("HOST: localhost\nPASSWORD: secret\nUSER: postgres\n"
+                         "DATABASE: sales_data\nPORT: 5432\n")
+    connector = DatabaseConnector(str(cred_path), registry=RecordingRegistry())
+    schema = {"columns": {"index": "BIGINT", "name": "VARCHAR(20)",
+                          "price": "FLOAT"}}
+    connector.schemas["products"] = schema
+    return(connector)
+
+
+def products():
+    return(pd.DataFrame({"name": ["kettle", "", None, 'mug, "large"'],
+                         "price": [9.99, 1.0, np.nan, 4.5]}))
+
+
+def test_copy_keeps_empty_strings_apart_from_nulls(connector):
+    connector.upload_to_db(products(), "products", if_exists="append")
+
+    (statement, text), = connector.engine.recorded.copies
+    assert statement == ('COPY "products" ("index", "name", "price") FROM STDIN '
+                         "WITH (FORMAT csv, NULL '\\N')")
+    rows = list(csv.reader(StringIO(text)))
+    assert rows == [["0", "kettle", "9.99"],
+                    ["1", "", "1.0"],
+                    ["2", "\\N", "\\N"],
+                    ["3", 'mug, "large"', "4.5"]]
+
+
+def test_copy_is_sent_in_chunks(connector):
+    connector.upload_to_db(products(), "products", if_exists="append", chunk_size=3)
+
+    chunks = [text.splitlines() for _, text in connector.engine.recorded.copies]
+    assert [len(lines) for lines in chunks] == [3, 1]
+
+
+def test_upsert_merges_staged_rows_on_key(connector):
+    connector.upload_to_db(products(), "products", if_exists="upsert", key=["index"])
+
+    cursor = connector.engine.recorded
+    (statement, _), = cursor.copies
+    assert statement.startswith('COPY "products_staging" ')
+    assert cursor.statements[-1] == (
+        'INSERT INTO "products" ("index", "name", "price") '
+        'SELECT "index", "name", "price" FROM "products_staging" '
+        'ON CONFLICT ("index") DO UPDATE SET "name" = EXCLUDED."name", '
+        '"price" = EXCLUDED."price"')
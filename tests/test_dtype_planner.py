@@ -0,0 +1,30 @@
+import pandas as pd
+
+from dtype_planner import binary_to_uuids, uuids_to_binary
+
+
+UUIDS = ["9476f17e-5d6a-4117-874d-9cdb38ca1fa5",
+         None,
+         "0423A395-A04D-4E4A-BD0F-D237CBD5A295",
+         "e30a4df8-5d1c-4c1f-a1e5-3dd0d9f3b4a1"]
+
+
+def test_binary_to_uuids_round_trip():
+    uuids = pd.Series(UUIDS, dtype="string")
+    text = binary_to_uuids(uuids_to_binary(uuids))
+    assert text.fillna("").tolist() == [(value or "").lower() for value in UUIDS]
+
+
+def test_binary_to_uuids_of_concatenated_column():
+    first = uuids_to_binary(pd.Series(UUIDS[:2], dtype="string"))
+    second = uuids_to_binary(pd.Series(UUIDS[2:], dtype="string"))
+    column = pd.concat([first, second], ignore_index=True)
+    assert column.array._pa_array.num_chunks == 2
+    text = binary_to_uuids(column)
+    assert text.fillna("").tolist() == [(value or "").lower() for value in UUIDS]
+    assert text.index.tolist() == [0, 1, 2, 3]
+
+
+def test_binary_to_uuids_of_sliced_column():
+    column = uuids_to_binary(pd.Series(UUIDS, dtype="string")).iloc[2:]
+    assert binary_to_uuids(column).tolist() == [value.lower() for value in UUIDS[2:]]
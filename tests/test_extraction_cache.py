@@ -0,0 +1,125 @@
+import os
+
+import pandas as pd
+import pytest
+
+import extraction_cache
+from data_extraction import DataExtractor
+from extraction_cache import ExtractionCache
+
+
+class Clock:
+    """Stands in for the time module, moved on by hand."""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def time(self):
+        return(self.now)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(extraction_cache, "time", clock)
+    return(clock)
+
+
+def frame(rows):
+    return(pd.DataFrame({"index": range(rows), "code": [f"A{row}" for row in range(rows)]}))
+
+
+def test_entries_are_served_while_their_validator_matches(tmp_path):
+    cache = ExtractionCache(cache_dir=str(tmp_path))
+    source = {"method": "read_rds_table", "query": "SELECT * FROM orders_table"}
+    assert cache.get(source, "etag-1") is None
+    cache.put(source, "etag-1", frame(5))
+    pd.testing.assert_frame_equal(cache.get(source, "etag-1"), frame(5))
+    # A changed source, or another source, is a miss:
+    assert cache.get(source, "etag-2") is None
+    assert cache.get(dict(source, query="SELECT 1"), "etag-1") is None
+    assert (cache.hits, cache.misses) == (1, 3)
+    # Validators are compared as text, e.g. row counts:
+    cache.put(source, 5, frame(5))
+    assert cache.get(source, "5") is not None
+
+
+def test_frames_arrow_cannot_store_are_pickled(tmp_path):
+    cache = ExtractionCache(cache_dir=str(tmp_path))
+    mixed = pd.DataFrame({"value": [1, "a", 2.5]})
+    cache.put("mixed", None, mixed)
+    pd.testing.assert_frame_equal(cache.get("mixed"), mixed)
+
+
+def test_entries_expire_after_the_ttl(tmp_path, clock):
+    cache = ExtractionCache(cache_dir=str(tmp_path), ttl_seconds=60)
+    cache.put("stores", None, frame(3))
+    clock.now += 59
+    assert cache.get("stores") is not None
+    # Reads do not extend an entry's life:
+    clock.now += 2
+    assert cache.get("stores") is None
+    cache.put("stores", None, frame(4))
+    assert len(cache.get("stores")) == 4
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path, clock):
+    cache = ExtractionCache(cache_dir=str(tmp_path))
+    for name in ["first", "second", "third"]:
+        clock.now += 1
+        cache.put(name, None, frame(50))
+    entry_size = os.path.getsize(next(tmp_path.glob("*.data")))
+    cache.max_bytes = 3 * entry_size
+    # Reading "first" makes "second" the least recently used entry:
+    clock.now += 1
+    assert cache.get("first") is not None
+    clock.now += 1
+    cache.put("fourth", None, frame(50))
+    assert cache.get("second") is None
+    assert all(cache.get(name) is not None for name in ["first", "third", "fourth"])
+    assert len(list(tmp_path.glob("*.data"))) == 3
+    # Entries are evicted oldest first until the cache fits:
+    cache.max_bytes = entry_size
+    clock.now += 1
+    cache.put("fifth", None, frame(50))
+    assert [name for name in ["first", "third", "fourth", "fifth"]
+            if cache.get(name) is not None] == ["fifth"]
+    cache.clear()
+    assert list(tmp_path.iterdir()) == []
+
+
+@pytest.fixture
+def orders_engine(tmp_path):
+    from sqlalchemy import create_engine
+    engine = create_engine(f"sqlite:///{tmp_path / 'orders.db'}")
+    frame(5).to_sql("orders_table", engine, index=False)
+    yield engine
+    engine.dispose()
+
+
+def test_rds_tables_are_cached_until_their_row_count_changes(tmp_path, orders_engine):
+    cache = ExtractionCache(cache_dir=str(tmp_path / "cache"))
+    extractor = DataExtractor(orders_engine, cache=cache)
+    assert len(extractor.read_rds_table("orders_table")) == 5
+    assert len(extractor.read_rds_table("orders_table")) == 5
+    assert (cache.hits, cache.misses) == (1, 1)
+    frame(2).to_sql("orders_table", orders_engine, index=False, if_exists="append")
+    assert len(extractor.read_rds_table("orders_table")) == 7
+    assert (cache.hits, cache.misses) == (1, 2)
+
+
+def test_sources_without_validator_are_only_cached_with_a_ttl(tmp_path):
+    extracted = []
+
+    def extract():
+        extracted.append(1)
+        return(frame(2))
+
+    for ttl_seconds, extractions in [(None, 2), (3600, 1)]:
+        extracted.clear()
+        cache = ExtractionCache(cache_dir=str(tmp_path / str(ttl_seconds)),
+                                ttl_seconds=ttl_seconds)
+        extractor = DataExtractor(None, cache=cache)
+        for _ in range(2):
+            extractor._DataExtractor__cached("pdf", lambda: None, extract)
+        assert len(extracted) == extractions
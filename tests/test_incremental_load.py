@@ -0,0 +1,146 @@
+import json
+
+import pandas as pd
+import pytest
+
+from incremental_load import IncrementalLoader
+from star_schema import StarSchemaBuilder
+
+
+DATE_UUIDS = ["9476f17e-5d6a-4117-874d-9cdb38ca1fa5",
+              "0423a395-a04d-4e4a-bd0f-d237cbd5a295",
+              "e30a4df8-5d1c-4c1f-a1e5-3dd0d9f3b4a1"]
+
+
+class FakeExtractor:
+    """Serves orders and events, recording how they were asked for."""
+
+    def __init__(self, orders, events, version="v1"):
+        self.orders = orders
+        self.events = events
+        self.version = version
+        self.reads = []
+        self.downloads = 0
+
+    def read_rds_table(self, table_name, where=None, params=None):
+        self.reads.append((table_name, where, params))
+        if params is None:
+            return(self.orders.copy())
+        return(self.orders[self.orders["index"] > params["last_index"]].copy())
+
+    def s3_object_version(self, address):
+        return(self.version)
+
+    def extract_json_from_s3(self, address, file_path):
+        self.downloads += 1
+        return(self.events.copy())
+
+
+class PassThroughCleaner:
+    def clean_order_data(self, order_data):
+        return(order_data)
+
+    def clean_events_data(self, events_data):
+        return(events_data)
+
+
+class FakeConnector:
+    """Keeps uploads and watermarks in memory."""
+
+    schemas = {"orders_table": {
+                   "columns": {"date_uuid": "UUID", "product_quantity": "SMALLINT"},
+                   "foreign_keys": {"date_uuid": {"table": "dim_datetimes",
+                                                  "column": "date_uuid"}}},
+               "dim_datetimes": {"columns": {"date_uuid": "UUID"},
+                                 "primary_key": ["date_uuid"]}}
+
+    def __init__(self):
+        self.watermarks = {}
+        self.uploads = []
+
+    def read_watermark(self, source):
+        return(self.watermarks.get(source))
+
+    def write_watermark(self, source, watermark):
+        self.watermarks[source] = str(watermark)
+
+    def upload_to_db(self, frame, table_name, watermark=None, **kwargs):
+        self.uploads.append((table_name, frame, kwargs))
+        if watermark is not None:
+            self.write_watermark(*watermark)
+        return({"rows": len(frame)})
+
+
+def orders(rows):
+    return(pd.DataFrame({"index": range(rows),
+                         "date_uuid": [DATE_UUIDS[number % 2] for number in range(rows)],
+                         "product_quantity": [1] * rows}))
+
+
+@pytest.fixture
+def loader():
+    connector = FakeConnector()
+    builder = StarSchemaBuilder(connector)
+    builder.keys["dim_datetimes"] = pd.Index(DATE_UUIDS)
+    extractor = FakeExtractor(orders(4), pd.DataFrame({"date_uuid": DATE_UUIDS[:2]}))
+    return(IncrementalLoader(extractor, PassThroughCleaner(), connector, builder=builder))
+
+
+def test_first_orders_run_loads_everything(loader):
+    assert loader.load_orders() == 4
+
+    assert loader.extractor.reads == [("orders_table", None, None)]
+    table_name, frame, kwargs = loader.connector.uploads[0]
+    assert (table_name, len(frame), kwargs["if_exists"]) == ("orders_table", 4, "append")
+    assert loader.connector.watermarks["rds:orders_table"] == "3"
+
+
+def test_second_orders_run_reads_past_the_watermark(loader):
+    loader.load_orders()
+    loader.extractor.orders = orders(6)
+
+    assert loader.load_orders() == 2
+    assert loader.extractor.reads[1] == ("orders_table", '"index" > :last_index',
+                                         {"last_index": 3})
+    assert loader.connector.watermarks["rds:orders_table"] == "5"
+    assert loader.load_orders() == 0
+
+
+def test_orphan_orders_are_quarantined_not_loaded(loader):
+    loader.extractor.orders.loc[1, "date_uuid"] = "00000000-0000-0000-0000-000000000000"
+
+    assert loader.load_orders() == 3
+    assert loader.builder.orphan_counts["orders_table.date_uuid"] == 1
+    # The orphan is not extracted again:
+    assert loader.connector.watermarks["rds:orders_table"] == "3"
+
+
+def test_unchanged_events_are_not_downloaded(loader):
+    assert loader.load_events("https://bucket.s3.amazonaws.com/events.json",
+                              "events.json") == 2
+    assert loader.load_events("https://bucket.s3.amazonaws.com/events.json",
+                              "events.json") == 0
+    assert loader.extractor.downloads == 1
+
+
+def test_changed_events_append_past_the_index(loader):
+    address = "https://bucket.s3.amazonaws.com/events.json"
+    loader.load_events(address, "events.json")
+    loader.extractor.version = "v2"
+    loader.extractor.events = pd.DataFrame({"date_uuid": DATE_UUIDS})
+
+    assert loader.load_events(address, "events.json") == 1
+    _, frame, _ = loader.connector.uploads[-1]
+    assert frame.date_uuid.tolist() == [DATE_UUIDS[2]]
+    assert json.loads(loader.connector.watermarks[f"s3:{address}"]) == {
+        "version": "v2", "max_index": 2}
+
+
+def test_empty_events_object_loads_nothing(loader):
+    address = "https://bucket.s3.amazonaws.com/events.json"
+    loader.extractor.events = pd.DataFrame()
+
+    assert loader.load_events(address, "events.json") == 0
+    assert loader.connector.uploads == []
+    assert json.loads(loader.connector.watermarks[f"s3:{address}"]) == {
+        "version": "v1", "max_index": -1}
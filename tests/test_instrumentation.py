@@ -0,0 +1,72 @@
+import pandas as pd
+
+from benchmarks.synthetic_data import SyntheticData
+from data_cleaning import DataCleaning
+from instrumentation import PipelineInstrumentation
+from partitioned_cleaning import PartitionedCleaning
+
+
+class Counter:
+    """A pipeline object with a method, a property and a class attribute."""
+
+    frame_class = pd.DataFrame
+
+    def __init__(self):
+        self.property_reads = 0
+
+    @property
+    def lazy(self):
+        self.property_reads += 1
+        return(1)
+
+    def double(self, data):
+        return(pd.concat([data, data]))
+
+    def fail(self):
+        raise KeyError("missing")
+
+
+def test_calls_are_recorded():
+    instrumentation = PipelineInstrumentation(enabled=True)
+    counter = instrumentation.instrument(Counter())
+
+    counter.double(pd.DataFrame({"a": range(10)}))
+    try:
+        counter.fail()
+    except KeyError:
+        pass
+
+    double, fail = instrumentation.records
+    assert (double["class"], double["method"]) == ("Counter", "double")
+    assert (double["rows_in"], double["rows_out"]) == (10, 20)
+    assert double["cpu_seconds"] >= 0 and double["error"] is None
+    assert fail["error"] == "KeyError"
+    summary = instrumentation.summary()
+    assert summary.loc[("Counter", "double"), "calls"] == 1
+
+
+def test_properties_and_classes_are_not_wrapped():
+    counter = PipelineInstrumentation(enabled=True).instrument(Counter())
+
+    assert counter.property_reads == 0
+    assert counter.frame_class is pd.DataFrame
+
+
+def test_disabled_instrumentation_leaves_objects_unchanged():
+    counter = Counter()
+    double = counter.double
+    assert PipelineInstrumentation(enabled=False).instrument(counter).double == double
+
+
+def test_instrumented_partitioned_cleaning_runs_in_worker_processes():
+    instrumentation = PipelineInstrumentation(enabled=True)
+    cleaner = instrumentation.instrument(PartitionedCleaning(max_workers=2, min_rows=100))
+    events = SyntheticData(seed=1).events_data(500)
+    try:
+        partitioned = cleaner.clean_events_data(events.copy())
+    finally:
+        cleaner.close()
+
+    pd.testing.assert_frame_equal(partitioned, DataCleaning().clean_events_data(events.copy()))
+    assert cleaner.cleaner_class is DataCleaning
+    assert "clean_events_data" in [record["method"] for record in instrumentation.records]
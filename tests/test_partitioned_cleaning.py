@@ -0,0 +1,79 @@
+import pandas as pd
+import pytest
+
+from benchmarks.synthetic_data import SyntheticData
+from data_cleaning import DataCleaning
+from partitioned_cleaning import PartitionedCleaning
+from rejects import RejectsSink
+
+
+# Each cleaning method, the synthetic data it cleans and its keyword
+# arguments:
+CLEANERS = [("clean_user_data", "user_data", {}),
+            ("clean_card_data", "card_data", {}),
+            ("clean_card_data", "card_data", {"check_numbers": "flag"}),
+            ("clean_store_data", "store_data", {}),
+            ("clean_product_data", "product_data", {}),
+            ("clean_order_data", "order_data", {}),
+            ("clean_events_data", "events_data", {})]
+
+
+@pytest.fixture(scope="module")
+def partitioned():
+    # A threshold low enough for the spawned workers to clean every frame
+    # in uneven partitions:
+    cleaner = PartitionedCleaning(max_workers=3, min_rows=10)
+    yield cleaner
+    cleaner.close()
+
+
+@pytest.mark.parametrize("method_name, data_name, kwargs", CLEANERS)
+def test_partitioned_cleaning_matches_serial(partitioned, method_name, data_name,
+                                             kwargs):
+    data = getattr(SyntheticData(seed=5, dirty_fraction=0.05), data_name)(301)
+    serial = getattr(DataCleaning(), method_name)(data.copy(), **kwargs)
+    result = getattr(partitioned, method_name)(data.copy(), **kwargs)
+    pd.testing.assert_frame_equal(result, serial)
+
+
+def test_card_index_is_renumbered_over_all_partitions(partitioned):
+    data = SyntheticData(seed=6, dirty_fraction=0.2).card_data(100)
+    result = partitioned.clean_card_data(data)
+    assert result.index.tolist() == list(range(len(result)))
+    assert result.index.name == "Index"
+
+
+def test_dtypes_differing_between_partitions_are_reconciled(partitioned):
+    # convert_dtypes infers Int64 for the first partition, which only has
+    # numbers, and strings for the others, but object for the whole frame:
+    data = SyntheticData(seed=7, dirty_fraction=0.05).order_data(60)
+    data["card_type"] = list(range(20)) + ["Visa"] * 40
+    serial = DataCleaning().clean_order_data(data.copy())
+    result = partitioned.clean_order_data(data.copy())
+    assert result.card_type.dtype == serial.card_type.dtype == object
+    pd.testing.assert_frame_equal(result, serial)
+
+
+def test_frames_arrow_cannot_store_are_pickled(partitioned):
+    # Raw columns mixing numbers and strings are not Arrow columns:
+    data = SyntheticData(seed=8, dirty_fraction=0.05).order_data(60)
+    data["mixed"] = [1, "a"] * 30
+    serial = DataCleaning().clean_order_data(data.copy())
+    pd.testing.assert_frame_equal(partitioned.clean_order_data(data.copy()), serial)
+
+
+def test_partition_rejects_are_merged_in_order(tmp_path):
+    data = SyntheticData(seed=9, dirty_fraction=0.2).user_data(120)
+    serial_rejects = RejectsSink(rejects_dir=str(tmp_path / "serial"), enabled=True)
+    DataCleaning(rejects=serial_rejects).clean_user_data(data.copy())
+    rejects = RejectsSink(rejects_dir=str(tmp_path / "partitioned"), enabled=True)
+    cleaner = PartitionedCleaning(max_workers=2, min_rows=10, rejects=rejects)
+    try:
+        cleaner.clean_user_data(data.copy())
+    finally:
+        cleaner.close()
+    columns = ["checked", "rejected"]
+    pd.testing.assert_frame_equal(rejects.summary()[columns],
+                                  serial_rejects.summary()[columns])
+    pd.testing.assert_frame_equal(rejects.rejects("users"),
+                                  serial_rejects.rejects("users"))
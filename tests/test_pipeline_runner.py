@@ -0,0 +1,130 @@
+import threading
+import time
+
+import pytest
+import yaml
+
+from pipeline_runner import PipelineRunner
+
+
+class RecordingStages:
+    """Stands in for the pipeline objects, recording the stages called."""
+
+    def __init__(self, fail=(), slow=()):
+        self.fail = set(fail)
+        self.slow = set(slow)
+        self.calls = []
+        self.lock = threading.Lock()
+
+    def stage(self, data, name):
+        with self.lock:
+            self.calls.append(name)
+        if name in self.slow:
+            time.sleep(0.2)
+        if name in self.fail:
+            raise RuntimeError(f"{name} failed")
+        return((data or []) + [name])
+
+    def extract(self, name):
+        return(self.stage(None, name))
+
+
+def stage(name, first=False, after=()):
+    definition = {"call": f"Stages.{'extract' if first else 'stage'}", "args": [name]}
+    if after:
+        definition["after"] = list(after)
+    return(definition)
+
+
+def runner(tmp_path, config, fail=(), slow=()):
+    path = tmp_path / "pipeline.yaml"
+    path.write_text(yaml.safe_dump(config, sort_keys=False))
+    return(PipelineRunner({"Stages": RecordingStages(fail, slow)}, config_path=str(path),
+                          max_workers=4))
+
+
+# Products and stores load before orders, whose keys reference them:
+CONFIG = {"products": {"extract": stage("products.extract", first=True),
+                       "load": stage("products.load")},
+          "stores": {"extract": stage("stores.extract", first=True),
+                     "load": stage("stores.load")},
+          "orders": {"extract": stage("orders.extract", first=True),
+                     "clean": stage("orders.clean"),
+                     "load": stage("orders.load",
+                                   after=["products.load", "stores.load"])},
+          "events": {"extract": stage("events.extract", first=True),
+                     "load": stage("events.load")}}
+
+
+def test_tasks_run_in_dependency_order(tmp_path):
+    pipeline = runner(tmp_path, CONFIG)
+    results = pipeline.run()
+    calls = pipeline.objects["Stages"].calls
+    assert sorted(calls) == sorted(f"{table}.{stage_name}"
+                                   for table, stages in CONFIG.items()
+                                   for stage_name in stages)
+    for name, task in pipeline.tasks().items():
+        for other in task["depends_on"]:
+            assert calls.index(other) < calls.index(name)
+    # Each stage is given the output of the previous stage of its table:
+    assert results["orders"] == ["orders.extract", "orders.clean", "orders.load"]
+    assert set(pipeline.timings) == set(calls)
+
+
+def test_dependents_of_a_failed_task_are_skipped(tmp_path):
+    # products.load finishes after orders.load, which also depends on it,
+    # has been skipped:
+    pipeline = runner(tmp_path, CONFIG, fail=["stores.extract"], slow=["products.load"])
+    with pytest.raises(RuntimeError) as error:
+        pipeline.run()
+    calls = pipeline.objects["Stages"].calls
+    # The failed table and the table loaded after it are skipped, while
+    # independent tables carry on:
+    assert "stores.load" not in calls and "orders.load" not in calls
+    assert {"products.load", "events.load", "orders.clean"} <= set(calls)
+    message = str(error.value)
+    assert "stores.extract: RuntimeError('stores.extract failed')" in message
+    assert "stores.load: skipped, 'stores.extract' failed" in message
+    assert "orders.load: skipped, 'stores.load' failed" in message
+
+
+def test_selected_tables_run_alone(tmp_path):
+    pipeline = runner(tmp_path, CONFIG)
+    assert pipeline.run(["events"]) == {"events": ["events.extract", "events.load"]}
+    assert pipeline.objects["Stages"].calls == ["events.extract", "events.load"]
+
+
+@pytest.mark.parametrize("after", [["products.unload"], ["prices.load"]])
+def test_unknown_dependencies_are_rejected(tmp_path, after):
+    config = dict(CONFIG, events={"extract": stage("events.extract", first=True),
+                                  "load": stage("events.load", after=after)})
+    pipeline = runner(tmp_path, config)
+    with pytest.raises(ValueError, match="not in this run"):
+        pipeline.run()
+    assert pipeline.objects["Stages"].calls == []
+
+
+def test_dependencies_outside_the_selected_tables_are_rejected(tmp_path):
+    with pytest.raises(ValueError, match="not in this run"):
+        runner(tmp_path, CONFIG).tasks(["orders"])
+
+
+def test_cycles_are_rejected(tmp_path):
+    config = dict(CONFIG, products={
+        "extract": stage("products.extract", first=True),
+        "load": stage("products.load", after=["orders.clean"])},
+        orders={"extract": stage("orders.extract", first=True,
+                                 after=["products.load"]),
+                "clean": stage("orders.clean"),
+                "load": stage("orders.load")})
+    pipeline = runner(tmp_path, config)
+    with pytest.raises(ValueError, match="cycle") as error:
+        pipeline.run()
+    assert "'orders.clean'" in str(error.value) and "'products.load'" in str(error.value)
+    assert "'events.load'" not in str(error.value)
+    assert pipeline.objects["Stages"].calls == []
+
+
+def test_repository_pipeline_is_a_valid_dag():
+    tasks = PipelineRunner({}).tasks()
+    assert {name.split(".")[0] for name in tasks} == set(PipelineRunner({}).config)
@@ -0,0 +1,55 @@
+import numpy as np
+import pandas as pd
+
+from dtype_planner import uuids_to_binary
+from rejects import RejectsSink
+from star_schema import StarSchemaBuilder
+
+
+DATE_UUIDS = ["9476f17e-5d6a-4117-874d-9cdb38ca1fa5",
+              "0423a395-a04d-4e4a-bd0f-d237cbd5a295"]
+
+
+class UploadRecorder:
+    """Stands in for a DatabaseConnector, keeping the frames uploaded."""
+
+    schemas = {"orders_table": {
+        "columns": {"date_uuid": "UUID", "product_quantity": "SMALLINT"},
+        "foreign_keys": {"date_uuid": {"table": "dim_datetimes",
+                                       "column": "date_uuid"}}}}
+
+    def __init__(self):
+        self.uploads = {}
+
+    def upload_to_db(self, frame, table_name, **kwargs):
+        self.uploads[table_name] = frame
+        return({"rows": len(frame)})
+
+
+def test_flush_writes_binary_uuids_as_text(tmp_path):
+    rejects = RejectsSink(rejects_dir=str(tmp_path), enabled=True)
+    connector = UploadRecorder()
+    builder = StarSchemaBuilder(connector, rejects=rejects)
+    builder.keys["dim_datetimes"] = pd.Index([DATE_UUIDS[0]])
+    orders = pd.DataFrame({"date_uuid": uuids_to_binary(pd.Series(DATE_UUIDS)),
+                           "product_quantity": [1, 2]})
+
+    builder.load_fact(orders, "orders_table")
+    paths = rejects.flush()
+
+    assert len(connector.uploads["orders_table"]) == 1
+    written = pd.read_parquet(paths[0])
+    assert written["date_uuid"].tolist() == [DATE_UUIDS[1]]
+    assert written["rule"].tolist() == ["orders_table.orphan_date_uuid"]
+
+
+def test_flush_appends_to_file_of_earlier_flush(tmp_path):
+    rejects = RejectsSink(rejects_dir=str(tmp_path), enabled=True)
+    frame = pd.DataFrame({"date_uuid": uuids_to_binary(pd.Series(DATE_UUIDS))})
+    rejects.record("orders.first", frame, np.array([False, True]), 0.0)
+    rejects.flush()
+    rejects.record("orders.second", frame, np.array([True, False]), 0.0)
+    paths = rejects.flush()
+
+    written = pd.read_parquet(paths[0])
+    assert written["date_uuid"].tolist() == DATE_UUIDS